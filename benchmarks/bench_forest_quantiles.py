@@ -0,0 +1,71 @@
+"""
+SAS Material Supply Analysis - Forest Quantile Benchmark
+Measures time per row of the leaf traversal (forest_leaves) and the quantile
+regression forest intervals (forest_quantiles) as n_estimators grows, on
+synthetic C-checks: the weights of each row are accumulated over the training
+samples in its leaves only, so forest_quantiles grows with trees x leaf size,
+not with trees x training samples
+
+Usage:
+    python benchmarks/bench_forest_quantiles.py
+"""
+
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.ml_model import MODEL_PARAMS
+from utils.uncertainty import build_forest_stats, forest_leaves, forest_quantiles
+
+# Forest sizes measured
+N_ESTIMATORS = [100, 200, 300, 400, 500]
+
+# Training C-checks, predicted rows and features
+N_TRAIN = 1000
+N_ROWS = 2000
+N_FEATURES = 8
+
+# Timed calls per forest size
+REPEATS = 5
+
+
+def median_seconds(function, *args):
+    """Median wall time of function(*args) over REPEATS calls"""
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    X_train = rng.normal(size=(N_TRAIN, N_FEATURES))
+    y_train = rng.poisson(np.exp(3 + X_train[:, 0] * 0.5)).astype(float)
+    X = rng.normal(size=(N_ROWS, N_FEATURES))
+
+    print(f"{N_TRAIN} training samples, {N_ROWS} rows")
+    print(f"  {'trees':>6s} {'leaves us/row':>14s} {'quantiles us/row':>17s}")
+
+    for n_estimators in N_ESTIMATORS:
+        params = dict(MODEL_PARAMS, n_estimators=n_estimators)
+        forest = RandomForestRegressor(**params, n_jobs=-1).fit(X_train, y_train)
+        stats = build_forest_stats(forest, X_train, y_train)
+
+        leaves = forest_leaves(stats, X)
+        leaves_seconds = median_seconds(forest_leaves, stats, X)
+        quantile_seconds = median_seconds(forest_quantiles, stats, leaves)
+
+        print(f"  {n_estimators:6d} {leaves_seconds / N_ROWS * 1e6:14.1f} {quantile_seconds / N_ROWS * 1e6:17.1f}")
+
+
+if __name__ == '__main__':
+    main()
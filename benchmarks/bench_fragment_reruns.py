@@ -0,0 +1,140 @@
+"""
+SAS Material Supply Analysis - Fragment Rerun Benchmark
+Measures server CPU time (process_time) of one filter interaction on the pages
+split into st.fragment sections: a full page rerun against a rerun scoped to
+the fragment holding the filter, as Streamlit does for widgets inside a fragment.
+Filters outside any fragment (the Overview filters and the Parts Comparison
+C-check, on which every section of their page depends) are timed as full
+reruns only
+
+Usage:
+    python benchmarks/bench_fragment_reruns.py workpacks.xlsx utilization.xlsx consumption.xlsx planned.xlsx
+"""
+
+import os
+import statistics
+import sys
+import time
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData, ScriptRequests
+from streamlit.testing.v1 import AppTest, app_test, local_script_runner
+
+from utils.ingest import REQUIRED_FILES, parse_uploads
+
+# (page, label of a selectbox) timed
+FRAGMENT_FILTERS = [
+    ('1_Overview.py', 'Aircraft Type'),
+    ('4_Trend_Analysis.py', 'Time Period'),
+    ('6_Parts_Comparison.py', 'Choose C-Check'),
+    ('6_Parts_Comparison.py', 'Sort by'),
+]
+
+# Interactions timed per page and mode
+REPEATS = 5
+
+
+class FragmentScriptRunner(local_script_runner.LocalScriptRunner):
+    """
+    AppTest script runner that reruns only the given fragments
+
+    AppTest has no public API for fragment reruns, so this replaces the runner's
+    initial full rerun request with the RerunData the Streamlit server sends when
+    a widget inside a fragment changes.
+    """
+
+    fragment_ids = []
+
+    def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+        self._requests = ScriptRequests()
+        self.request_rerun(RerunData(
+            widget_states=widget_state,
+            page_script_hash=page_hash,
+            fragment_id_queue=list(self.fragment_ids),
+        ))
+        try:
+            if not self._script_thread:
+                self.start()
+            local_script_runner.require_widgets_deltas(self, timeout)
+        finally:
+            self.join()
+        return local_script_runner.parse_tree_from_messages(self.forward_msgs())
+
+
+def owning_fragment(app, label):
+    """
+    Id of the fragment the selectbox is registered in
+
+    Neither is exposed by AppTest; the session state keeps the fragment of
+    every widget in its metadata, which is what a fragment rerun is keyed on.
+    None for a widget outside any fragment.
+    """
+    selectbox = [sb for sb in app.selectbox if sb.label == label][0]
+    widget_state = app.session_state._state._state._new_widget_state
+    return widget_state.widget_metadata[selectbox.id].fragment_id
+
+
+def time_interactions(app, label, fragment_ids=None):
+    """Change the filter REPEATS times and return the median CPU seconds per rerun"""
+    timings = []
+
+    for i in range(REPEATS):
+        selectbox = [sb for sb in app.selectbox if sb.label == label][0]
+        selectbox.select(selectbox.options[(i + 1) % len(selectbox.options)])
+
+        start = time.process_time()
+        if fragment_ids is None:
+            app.run()
+        else:
+            FragmentScriptRunner.fragment_ids = fragment_ids
+            with mock.patch.object(app_test, 'LocalScriptRunner', FragmentScriptRunner):
+                app.run()
+        timings.append(time.process_time() - start)
+
+        if len(app.exception) > 0:
+            raise RuntimeError(f"{label} rerun raised: {app.exception[0].value}")
+
+    return statistics.median(timings)
+
+
+def main(paths):
+    files = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            files.append((os.path.basename(path), f.read()))
+
+    session = {}
+    for result in parse_uploads(files, max_workers=1):
+        if result['status'] != 'success':
+            print(f"{result['file']}: {result['message']}")
+            sys.exit(1)
+        session[REQUIRED_FILES[result['file_type']]['session_key']] = result['df']
+
+    for page, label in FRAGMENT_FILTERS:
+        app = AppTest.from_file(os.path.join(ROOT, 'pages', page), default_timeout=600)
+        for key, df in session.items():
+            app.session_state[key] = df
+
+        # First render builds the shared caches; time the steady state
+        app.run()
+        full = time_interactions(app, label)
+
+        fragment_id = owning_fragment(app, label)
+        if fragment_id is None:
+            print(f"  {page:28s} {label:16s} full rerun: {full * 1000:7.1f} ms  (not in a fragment)")
+            continue
+
+        fragment = time_interactions(app, label, [fragment_id])
+
+        print(f"  {page:28s} {label:16s} full rerun: {full * 1000:7.1f} ms  fragment rerun: {fragment * 1000:7.1f} ms  "
+              f"({(1 - fragment / full) * 100:.0f}% less CPU)")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1:])
@@ -0,0 +1,114 @@
+"""
+SAS Material Supply Analysis - Model Load Benchmark
+Measures cold start of the prediction model in a fresh interpreter, as a new
+worker pays it: unpickling the scikit-learn MaterialPredictor against loading
+the compiled NumPy arrays, and checks both predict the same
+
+Run after the Material Prediction page has trained and registered a model;
+the active registry version is measured.
+
+Usage:
+    python benchmarks/bench_model_load.py
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.model_registry import COMPILED_DIR, MODEL_FILE, REGISTRY_PATH, get_active_version
+
+# Fresh interpreters started per loader
+REPEATS = 5
+
+# Loader -> statement run in a fresh interpreter (its imports included in the timing;
+# NumPy, pandas and Streamlit are imported beforehand, as every page already has them)
+LOADERS = {
+    'pickle (scikit-learn)': "from utils.ml_model import MaterialPredictor; model = MaterialPredictor.load(Path({model!r}))",
+    'compiled (NumPy)': "from utils.compiled_model import CompiledPredictor; model = CompiledPredictor.load(Path({compiled!r}))",
+}
+
+_TIMER = """
+import sys, time
+from pathlib import Path
+sys.path.insert(0, {root!r})
+import numpy, pandas, streamlit
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start, 'sklearn' in sys.modules)
+"""
+
+
+def cold_start(statement):
+    """Median seconds to run statement in a fresh interpreter, and whether it imported scikit-learn"""
+    timings = []
+    for _ in range(REPEATS):
+        output = subprocess.run(
+            [sys.executable, '-c', _TIMER.format(root=ROOT, statement=statement)],
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        timings.append(float(output[-2]))
+    return statistics.median(timings), output[-1] == 'True'
+
+
+def check_predictions(version_dir):
+    """Largest difference between the two models' predict_batch on sampled inputs"""
+    import numpy as np
+    import pandas as pd
+
+    from utils.compiled_model import CompiledPredictor
+    from utils.feature_engineering import PREDICTION_DEFAULTS, prepare_batch_features
+    from utils.ml_model import MaterialPredictor
+
+    trained = MaterialPredictor.load(version_dir / MODEL_FILE)
+    compiled = CompiledPredictor.load(version_dir / COMPILED_DIR)
+
+    rng = np.random.default_rng(0)
+    n = 1000
+    checks = pd.DataFrame({
+        'ac_typ': rng.choice(list(trained.encoders['ac_typ'].classes_), n),
+        'station': rng.choice(list(trained.encoders['station'].classes_), n),
+        'aircraft_hours': rng.uniform(1000, 80000, n),
+        'aircraft_cycles': rng.uniform(500, 40000, n),
+        'is_eol': rng.random(n) < 0.2,
+        'duration_days': rng.integers(5, 40, n),
+        'planned_parts_count': rng.integers(0, 200, n),
+        'planned_cost': rng.uniform(0, 100000, n),
+    }, columns=list(PREDICTION_DEFAULTS))
+    X = prepare_batch_features(checks, trained.encoders, trained.feature_names)
+
+    expected = trained.predict_batch(X)
+    actual = compiled.predict_batch(X)
+
+    # Reference from scikit-learn itself, not the shared stacked traversal
+    sklearn_mean = trained.model.predict(trained.scaler.transform(X))
+    return (
+        (expected - actual).abs().to_numpy().max(),
+        np.abs(np.round(sklearn_mean) - actual['prediction'].to_numpy()).max()
+    )
+
+
+def main():
+    active = get_active_version()
+    if active is None:
+        print(f"No registered model: open the Material Prediction page first ({REGISTRY_PATH})")
+        sys.exit(1)
+
+    version_dir = REGISTRY_PATH / f"v{active['version']}"
+    print(f"Model version {active['version']}")
+
+    for name, statement in LOADERS.items():
+        statement = statement.format(model=str(version_dir / MODEL_FILE), compiled=str(version_dir / COMPILED_DIR))
+        seconds, sklearn_imported = cold_start(statement)
+        print(f"  {name:24s} {seconds * 1000:8.1f} ms  (scikit-learn imported: {sklearn_imported})")
+
+    difference, sklearn_difference = check_predictions(version_dir)
+    print(f"  max difference pickle vs compiled predict_batch: {difference}")
+    print(f"  max difference scikit-learn predict vs compiled prediction: {sklearn_difference}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+SAS Material Supply Analysis - Upload Parsing Benchmark
+Compares serial and process-pool parsing of the upload workbooks
+
+Usage:
+    python benchmarks/bench_upload_parsing.py workpacks.xlsx utilization.xlsx consumption.xlsx planned.xlsx
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ingest import PARSE_WORKERS, parse_uploads
+
+
+def time_parse(files, max_workers):
+    """Parse all files once and return (seconds, results)"""
+    start = time.perf_counter()
+    results = parse_uploads(files, max_workers=max_workers)
+    return time.perf_counter() - start, results
+
+
+def main(paths):
+    files = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            files.append((os.path.basename(path), f.read()))
+
+    serial_time, serial_results = time_parse(files, max_workers=1)
+    parallel_time, parallel_results = time_parse(files, max_workers=PARSE_WORKERS)
+
+    print(f"CPU cores: {os.cpu_count()}, workers: {min(PARSE_WORKERS, len(files))}")
+    for serial, parallel in zip(serial_results, parallel_results):
+        rows = len(serial['df']) if serial['df'] is not None else 0
+        same = serial['status'] == parallel['status'] and serial['message'] == parallel['message']
+        print(f"  {serial['file']}: {serial['message']} ({rows} rows, identical: {same})")
+
+    print(f"Serial:   {serial_time:.2f}s")
+    print(f"Parallel: {parallel_time:.2f}s")
+    print(f"Speedup:  {serial_time / parallel_time:.2f}x")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1:])
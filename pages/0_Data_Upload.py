@@ -13,6 +13,12 @@ if not sys.warnoptions:
     warnings.simplefilter("ignore")
 warnings.filterwarnings('ignore')
 
+# Import data loader
+from utils.data_loader import FINGERPRINTS_KEY, EXCLUSIVE_MATCHING_KEY, CACHE_MAX_ENTRIES, fingerprint_bytes, get_dataset_fingerprint, invalidate_cached_views
+from utils.ingest import REQUIRED_FILES, parse_uploads, memory_report
+from utils.display import number_column, percent_column, show_table
+from utils.upload_cache import load_cached_upload, save_cached_upload, new_session_token, save_session, find_session, load_session
+
 # Apply shared SAS styling
 from utils.styling import apply_sas_styling
 apply_sas_styling()
@@ -21,64 +27,34 @@ apply_sas_styling()
 st.title("Data Upload")
 st.markdown("Upload all 4 required Excel files at once")
 
-# Define required files and their columns
-REQUIRED_FILES = {
-    'workpacks': {
-        'name': 'Maintenance Workpacks',
-        'description': 'C-checks, EOL and bridging tasks',
-        'required_columns': ['wpno_i', 'wpno', 'ac_registr', 'ac_typ', 'station',
-                            'start_date', 'end_date', 'is_c_check'],
-        'session_key': 'uploaded_workpacks'
-    },
-    'utilization': {
-        'name': 'Aircraft Utilization',
-        'description': 'Aircraft hours and cycles',
-        'required_columns': ['ac_registr', 'date', 'tah', 'tac'],
-        'session_key': 'uploaded_utilization'
-    },
-    'consumption': {
-        'name': 'Material Consumption',
-        'description': 'Actual material consumption',
-        'required_columns': ['partno', 'qty', 'average_price', 'del_date', 'station', 'vm'],
-        'session_key': 'uploaded_consumption'
-    },
-    'planned': {
-        'name': 'Planned Material',
-        'description': 'Planned materials per workpack',
-        'required_columns': ['wpno_i', 'partno', 'qty', 'average_price'],
-        'session_key': 'uploaded_planned'
-    }
-}
-
-
-def detect_file_type(df):
-    """Auto-detect which dataset type a file is based on its columns"""
-    df_cols = set(df.columns.tolist())
-
-    # Check each file type - order matters (most specific first)
-    # Workpacks has unique columns like 'is_c_check', 'end_date'
-    if 'is_c_check' in df_cols and 'wpno' in df_cols:
-        return 'workpacks'
-
-    # Utilization has 'tah', 'tac' which are unique
-    if 'tah' in df_cols and 'tac' in df_cols:
-        return 'utilization'
-
-    # Consumption has 'vm', 'del_date' which are unique
-    if 'vm' in df_cols and 'del_date' in df_cols:
-        return 'consumption'
-
-    # Planned has 'partno' and 'wpno_i' but not 'vm' or 'del_date'
-    if 'partno' in df_cols and 'wpno_i' in df_cols and 'vm' not in df_cols:
-        return 'planned'
-
-    return None
-
-
-def validate_columns(df, required_columns):
-    """Check if dataframe has all required columns"""
-    missing = [col for col in required_columns if col not in df.columns]
-    return missing
+# URL query parameter carrying this browser session's restore token
+RESTORE_PARAM = 'session'
+RESTORE_TOKEN_KEY = 'restore_token'
+
+# Keep the token in the address when coming back from another page
+if RESTORE_TOKEN_KEY in st.session_state:
+    st.query_params[RESTORE_PARAM] = st.session_state[RESTORE_TOKEN_KEY]
+
+
+def store_datasets(datasets):
+    """Store parsed datasets (session key -> (df, fingerprint)) in the session"""
+    fingerprints = st.session_state.setdefault(FINGERPRINTS_KEY, {})
+    for key, (df, fingerprint) in datasets.items():
+        st.session_state[key] = df
+        fingerprints[key] = fingerprint
+    invalidate_cached_views()
+
+    # Restore point of this browser session only, found again through its URL
+    if RESTORE_TOKEN_KEY not in st.session_state:
+        st.session_state[RESTORE_TOKEN_KEY] = st.query_params.get(RESTORE_PARAM) or new_session_token()
+    save_session(st.session_state[RESTORE_TOKEN_KEY], fingerprints)
+    st.query_params[RESTORE_PARAM] = st.session_state[RESTORE_TOKEN_KEY]
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def get_memory_report(fingerprint, _df):
+    """Memory footprint of an uploaded dataset, cached per file fingerprint"""
+    return memory_report(_df)
 
 
 def get_upload_status():
@@ -106,9 +82,46 @@ for i, (key, config) in enumerate(REQUIRED_FILES.items()):
 
 if all_uploaded:
     st.success("All files have been uploaded. You can now use the other pages.")
+    st.caption("Reload or bookmark this page's address to restore these files in a later session.")
 else:
     st.warning("Upload all 4 files to use the application.")
 
+    # Offer the dataset this browser session loaded before (token in the page URL);
+    # only the cache entries' presence is checked until the button is clicked
+    restore_token = st.query_params.get(RESTORE_PARAM)
+    restorable = find_session(restore_token) if restore_token else {}
+    if restorable and st.button(f"Restore previous upload ({len(restorable)} files)"):
+        store_datasets(load_session(restore_token))
+        st.rerun()
+
+# Memory footprint of the loaded datasets (declared schema vs estimated untyped layout)
+if any(status.values()):
+    with st.expander("Memory footprint"):
+        st.caption("Compact is the measured size of the loaded data. Untyped is an estimate of its size "
+                   "without the declared schema (8 bytes per number, every text value as a Python string), "
+                   "and the reduction is relative to that estimate.")
+
+        report_rows = []
+        for key, config in REQUIRED_FILES.items():
+            if not status[key]:
+                continue
+            df = st.session_state[config['session_key']]
+            report = get_memory_report(get_dataset_fingerprint(config['session_key']), df)
+            report_rows.append({
+                'Dataset': config['name'],
+                'Rows': report['rows'],
+                'Untyped (est., MB)': report['before_bytes'] / 1e6,
+                'Compact (MB)': report['after_bytes'] / 1e6,
+                'Reduction': (1 - report['after_bytes'] / report['before_bytes']) * 100 if report['before_bytes'] else None,
+            })
+
+        show_table(pd.DataFrame(report_rows), {
+            'Rows': number_column(),
+            'Untyped (est., MB)': number_column(2),
+            'Compact (MB)': number_column(2),
+            'Reduction': percent_column(0),
+        })
+
 st.markdown("---")
 
 # Single multi-file uploader
@@ -127,42 +140,57 @@ if uploaded_files:
     with st.spinner("Processing files..."):
         results = []
         files_to_store = {}
+        files_to_parse = []
+        fingerprints = st.session_state.setdefault(FINGERPRINTS_KEY, {})
+        stored_fingerprints = {fp: key for key, fp in fingerprints.items() if key in st.session_state}
 
         for uploaded_file in uploaded_files:
-            try:
-                df = pd.read_excel(uploaded_file)
-                file_type = detect_file_type(df)
-
-                if file_type is None:
-                    results.append({
-                        'file': uploaded_file.name,
-                        'status': 'error',
-                        'message': 'Could not detect file type based on columns'
-                    })
-                else:
-                    config = REQUIRED_FILES[file_type]
-                    missing = validate_columns(df, config['required_columns'])
-
-                    if missing:
-                        results.append({
-                            'file': uploaded_file.name,
-                            'status': 'error',
-                            'message': f"Missing columns for {config['name']}: {', '.join(missing)}"
-                        })
-                    else:
-                        files_to_store[config['session_key']] = df
-                        results.append({
-                            'file': uploaded_file.name,
-                            'status': 'success',
-                            'message': f"Recognized as: {config['name']} ({len(df)} rows)"
-                        })
-
-            except Exception as e:
+            data = uploaded_file.getvalue()
+            fingerprint = fingerprint_bytes(data)
+
+            # Identical content is already loaded: nothing to re-parse
+            if fingerprint in stored_fingerprints:
+                config = next(c for c in REQUIRED_FILES.values() if c['session_key'] == stored_fingerprints[fingerprint])
+                results.append({
+                    'file': uploaded_file.name,
+                    'status': 'success',
+                    'message': f"Recognized as: {config['name']} (unchanged)"
+                })
+                continue
+
+            # Parsed before (this or an earlier session): load from the cache
+            cached = load_cached_upload(fingerprint)
+            if cached is not None:
+                file_type, df = cached
+                config = REQUIRED_FILES[file_type]
+                files_to_store[config['session_key']] = (df, fingerprint)
                 results.append({
                     'file': uploaded_file.name,
-                    'status': 'error',
-                    'message': f"Error loading: {str(e)}"
+                    'status': 'success',
+                    'message': f"Recognized as: {config['name']} ({len(df)} rows, cached)"
                 })
+            else:
+                files_to_parse.append((uploaded_file.name, data, fingerprint))
+
+        if files_to_parse:
+            progress = st.progress(0.0, text=f"Parsing {len(files_to_parse)} file(s)...")
+
+            def report_progress(done, total, result):
+                progress.progress(done / total, text=f"Parsed {result['file']} ({done}/{total})")
+
+            # Parse the workbooks concurrently; results come back in upload order
+            parsed = parse_uploads(
+                [(name, data) for name, data, _ in files_to_parse],
+                on_progress=report_progress
+            )
+            progress.empty()
+
+            for result, (_, _, fingerprint) in zip(parsed, files_to_parse):
+                if result['status'] == 'success':
+                    session_key = REQUIRED_FILES[result['file_type']]['session_key']
+                    files_to_store[session_key] = (result['df'], fingerprint)
+                    save_cached_upload(fingerprint, result['file_type'], result['df'])
+                results.append({key: result[key] for key in ('file', 'status', 'message')})
 
         # Show results
         st.markdown("#### Results:")
@@ -174,14 +202,26 @@ if uploaded_files:
 
         # Store all successful files at once
         if files_to_store:
-            for key, df in files_to_store.items():
-                st.session_state[key] = df
+            store_datasets(files_to_store)
 
             # Check if we have new uploads
             new_status = get_upload_status()
             if new_status != status:
                 st.rerun()
 
+# Consumption matching options (applied when the master view is built)
+st.markdown("---")
+st.markdown("### Matching Options")
+
+st.session_state[EXCLUSIVE_MATCHING_KEY] = st.toggle(
+    "Exclusive time-based matching",
+    value=st.session_state.get(EXCLUSIVE_MATCHING_KEY, False),
+    help="Consumption lines without a workpack number are matched on date, station and aircraft. "
+         "When enabled, each line goes to at most one workpack (best match on aircraft, receiver "
+         "and date) so overlapping workpacks do not both count the same parts. A workpack whose "
+         "lines all match another workpack better shows no consumption."
+)
+
 # Show what files are expected
 st.markdown("---")
 st.markdown("### Expected Files")
@@ -197,6 +237,8 @@ if st.button("Clear all data", type="secondary"):
     for config in REQUIRED_FILES.values():
         if config['session_key'] in st.session_state:
             del st.session_state[config['session_key']]
+    st.session_state.pop(FINGERPRINTS_KEY, None)
+    invalidate_cached_views()
     st.rerun()
 
 st.markdown("---")
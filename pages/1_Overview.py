@@ -17,7 +17,9 @@ if not sys.warnoptions:
 warnings.filterwarnings('ignore')
 
 # Import data loader
-from utils.data_loader import get_master_view, is_data_uploaded, show_upload_required
+from utils.data_loader import get_master_view, get_c_check_cube, get_calendar, is_data_uploaded, show_upload_required
+from utils.cube import roll_up, calendar_labels
+from utils.display import currency_column, number_column, percent_column, show_table
 from utils.plotly_utils import hide_warnings_css
 from utils import format_currency, format_number
 
@@ -39,40 +41,49 @@ if not is_data_uploaded():
 # Load data
 with st.spinner("Loading data..."):
     master_df = get_master_view()
+    cube = get_c_check_cube()
 
-if master_df is None:
+if master_df is None or cube is None:
     st.error("Could not load data")
     st.stop()
 
 # Filter to C-checks only
-c_checks = master_df[master_df['is_c_check'] == 1].copy()
+c_checks = master_df[master_df['is_c_check'] == 1]
 
 # Sidebar filters
 st.sidebar.markdown("## Filters")
 
 # Aircraft type filter
-ac_types = ['All'] + sorted(c_checks['ac_typ'].unique().tolist())
+ac_types = ['All'] + sorted(cube['ac_typ'].unique().tolist())
 selected_ac_type = st.sidebar.selectbox("Aircraft Type", ac_types)
 
 # Check type filter
-check_types = ['All'] + sorted([x for x in c_checks['check_type'].unique() if pd.notna(x)])
+check_types = ['All'] + sorted([x for x in cube['check_type'].unique() if pd.notna(x)])
 selected_check_type = st.sidebar.selectbox("Check Type", check_types)
 
 # Station filter
-stations = ['All'] + sorted(c_checks['station'].unique().tolist())
+stations = ['All'] + sorted(cube['station'].unique().tolist())
 selected_station = st.sidebar.selectbox("Station", stations)
 
-# Apply filters
-filtered_df = c_checks.copy()
+# Apply filters: counts, sums and means are rolled up from the cube, the rows are
+# only needed for medians and distributions
+selection = {}
 
 if selected_ac_type != 'All':
-    filtered_df = filtered_df[filtered_df['ac_typ'] == selected_ac_type]
+    selection['ac_typ'] = selected_ac_type
 
 if selected_check_type != 'All':
-    filtered_df = filtered_df[filtered_df['check_type'] == selected_check_type]
+    selection['check_type'] = selected_check_type
 
 if selected_station != 'All':
-    filtered_df = filtered_df[filtered_df['station'] == selected_station]
+    selection['station'] = selected_station
+
+totals = roll_up(cube, where=selection)
+total_checks = totals['checks']
+
+filtered_df = c_checks
+for column, value in selection.items():
+    filtered_df = filtered_df[filtered_df[column] == value]
 
 # KPI Cards
 st.markdown("### Key Performance Indicators")
@@ -83,12 +94,12 @@ with st.container(border=True):
     with col1:
         st.metric(
             "Total C-Checks",
-            len(filtered_df),
-            delta=f"{len(filtered_df)/len(c_checks)*100:.0f}% of total"
+            total_checks,
+            delta=f"{total_checks/len(c_checks)*100:.0f}% of total"
         )
 
     with col2:
-        avg_accuracy = filtered_df['planning_accuracy'].mean()
+        avg_accuracy = totals['planning_accuracy_mean']
         if pd.notna(avg_accuracy):
             st.metric(
                 "Avg Planning Accuracy",
@@ -99,15 +110,15 @@ with st.container(border=True):
             st.metric("Avg Planning Accuracy", "N/A")
 
     with col3:
-        with_consumption = filtered_df['consumed_parts_count'].notna().sum()
+        with_consumption = totals['consumed_parts_count_n']
         st.metric(
             "With Consumption Data",
             with_consumption,
-            delta=f"{with_consumption/len(filtered_df)*100:.1f}%"
+            delta=f"{with_consumption/total_checks*100:.1f}%"
         )
 
     with col4:
-        avg_cost = filtered_df['consumed_cost'].mean()
+        avg_cost = totals['consumed_cost_mean']
         if pd.notna(avg_cost):
             st.metric(
                 "Avg Cost per C-Check",
@@ -122,21 +133,21 @@ with st.container(border=True):
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        avg_parts = filtered_df['consumed_parts_count'].mean()
+        avg_parts = totals['consumed_parts_count_mean']
         if pd.notna(avg_parts):
             st.metric("Avg Parts per C-Check", f"{avg_parts:.0f}")
         else:
             st.metric("Avg Parts per C-Check", "N/A")
 
     with col2:
-        avg_duration = filtered_df['duration_days'].mean()
+        avg_duration = totals['duration_days_mean']
         if pd.notna(avg_duration):
             st.metric("Avg Duration", f"{avg_duration:.1f} days")
         else:
             st.metric("Avg Duration", "N/A")
 
     with col3:
-        total_cost_variance = filtered_df['cost_variance'].sum()
+        total_cost_variance = totals['cost_variance_sum']
         if pd.notna(total_cost_variance):
             st.metric(
                 "Total Cost Variance",
@@ -147,11 +158,11 @@ with st.container(border=True):
             st.metric("Total Cost Variance", "N/A")
 
     with col4:
-        with_planned = filtered_df['planned_parts_count'].notna().sum()
+        with_planned = totals['planned_parts_count_n']
         st.metric(
             "With Planned Data",
             with_planned,
-            delta=f"{with_planned/len(filtered_df)*100:.1f}%"
+            delta=f"{with_planned/total_checks*100:.1f}%"
         )
 
 st.markdown("---")
@@ -166,7 +177,8 @@ with chart_col1:
     st.markdown("#### C-Checks by Aircraft Type")
 
     # Count by aircraft type
-    ac_type_counts = filtered_df['ac_typ'].value_counts().reset_index()
+    ac_type_counts = roll_up(cube, by=['ac_typ'], where=selection)['checks']
+    ac_type_counts = ac_type_counts.sort_values(ascending=False, kind='stable').reset_index()
     ac_type_counts.columns = ['Aircraft Type', 'Count']
 
     fig_ac_type = px.bar(
@@ -190,7 +202,8 @@ with chart_col2:
     st.markdown("#### C-Checks by Check Type")
 
     # Count by check type
-    check_type_counts = filtered_df[filtered_df['check_type'].notna()]['check_type'].value_counts().reset_index()
+    check_type_counts = roll_up(cube, by=['check_type'], where=selection)['checks']
+    check_type_counts = check_type_counts.sort_values(ascending=False, kind='stable').reset_index()
     check_type_counts.columns = ['Check Type', 'Count']
 
     fig_check_type = px.pie(
@@ -207,9 +220,11 @@ with chart_col2:
 st.markdown("#### C-Checks Over Time")
 
 # Group by month
-filtered_df['year_month'] = pd.to_datetime(filtered_df['start_date']).dt.to_period('M').astype(str)
-timeline_data = filtered_df.groupby('year_month').size().reset_index()
-timeline_data.columns = ['Month', 'Count']
+timeline_data = roll_up(cube, by=['month_key'], where=selection)['checks']
+timeline_data = pd.DataFrame({
+    'Month': timeline_data.index.map(calendar_labels(get_calendar(), 'month_key')),
+    'Count': timeline_data.to_numpy()
+})
 
 fig_timeline = px.line(
     timeline_data,
@@ -231,25 +246,18 @@ st.plotly_chart(fig_timeline, width='stretch')
 st.markdown("#### Station Performance")
 
 # Group by station
-station_stats = filtered_df.groupby('station').agg({
-    'wpno_i': 'count',
-    'consumed_parts_count': 'mean',
-    'consumed_cost': 'mean',
-    'planning_accuracy': 'mean'
-}).reset_index()
+station_stats = roll_up(cube, by=['station'], where=selection)[[
+    'checks', 'consumed_parts_count_mean', 'consumed_cost_mean', 'planning_accuracy_mean'
+]].reset_index()
 
 station_stats.columns = ['Station', 'C-Checks', 'Avg Parts', 'Avg Cost', 'Planning Accuracy %']
 
-# Format and display
-station_stats['Avg Parts'] = station_stats['Avg Parts'].round(0)
-station_stats['Avg Cost'] = station_stats['Avg Cost'].apply(lambda x: f"€{x:,.0f}" if pd.notna(x) else "N/A")
-station_stats['Planning Accuracy %'] = station_stats['Planning Accuracy %'].apply(lambda x: f"{x:.1f}%" if pd.notna(x) else "N/A")
-
-st.dataframe(
-    station_stats.sort_values('C-Checks', ascending=False),
-    width='stretch',
-    hide_index=True
-)
+# Display
+show_table(station_stats.sort_values('C-Checks', ascending=False), {
+    'Avg Parts': number_column(),
+    'Avg Cost': currency_column(0),
+    'Planning Accuracy %': percent_column(),
+})
 
 # Data quality section
 st.markdown("---")
@@ -260,6 +268,14 @@ col1, col2 = st.columns(2)
 with col1:
     st.markdown("#### Data Availability")
 
+    complete = roll_up(cube, where={**selection, 'has_utilization': True, 'has_consumption': True, 'has_planned': True})
+    available = [
+        totals['aircraft_hours_n'],
+        with_consumption,
+        with_planned,
+        complete['checks']
+    ]
+
     availability_data = {
         'Data Type': [
             'Aircraft Utilization',
@@ -267,29 +283,11 @@ with col1:
             'Planned Material',
             'Complete Records (All Data)'
         ],
-        'Available': [
-            filtered_df['aircraft_hours'].notna().sum(),
-            filtered_df['consumed_parts_count'].notna().sum(),
-            filtered_df['planned_parts_count'].notna().sum(),
-            filtered_df[
-                (filtered_df['aircraft_hours'].notna()) &
-                (filtered_df['consumed_parts_count'].notna()) &
-                (filtered_df['planned_parts_count'].notna())
-            ].shape[0]
-        ],
-        'Percentage': [
-            f"{filtered_df['aircraft_hours'].notna().sum()/len(filtered_df)*100:.1f}%",
-            f"{filtered_df['consumed_parts_count'].notna().sum()/len(filtered_df)*100:.1f}%",
-            f"{filtered_df['planned_parts_count'].notna().sum()/len(filtered_df)*100:.1f}%",
-            f"{filtered_df[(filtered_df['aircraft_hours'].notna()) & (filtered_df['consumed_parts_count'].notna()) & (filtered_df['planned_parts_count'].notna())].shape[0]/len(filtered_df)*100:.1f}%"
-        ]
+        'Available': available,
+        'Percentage': [count/total_checks*100 for count in available]
     }
 
-    st.dataframe(
-        pd.DataFrame(availability_data),
-        width='stretch',
-        hide_index=True
-    )
+    show_table(pd.DataFrame(availability_data), {'Percentage': percent_column()})
 
 with col2:
     st.markdown("#### Planning Accuracy Distribution")
@@ -361,24 +359,20 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-if len(filtered_df) > 0:
-    # Material consumption analytics
-    consumption_data = filtered_df[filtered_df['consumed_parts_count'].notna()].copy()
-    planned_data = filtered_df[filtered_df['planned_parts_count'].notna()].copy()
-
+if total_checks > 0:
     col1, col2 = st.columns(2)
 
     with col1:
         with st.container(border=True):
             st.markdown("#### Material Consumption")
 
-            if len(consumption_data) > 0:
-                st.caption(f"C-Checks with data: {len(consumption_data)} / {len(filtered_df)} ({len(consumption_data)/len(filtered_df)*100:.1f}%)")
+            if with_consumption > 0:
+                st.caption(f"C-Checks with data: {with_consumption} / {total_checks} ({with_consumption/total_checks*100:.1f}%)")
 
-                # Parts statistics
-                total_parts = consumption_data['consumed_parts_count'].sum()
-                avg_parts = consumption_data['consumed_parts_count'].mean()
-                median_parts = consumption_data['consumed_parts_count'].median()
+                # Parts statistics (medians need the rows)
+                total_parts = totals['consumed_parts_count_sum']
+                avg_parts = totals['consumed_parts_count_mean']
+                median_parts = filtered_df['consumed_parts_count'].median()
 
                 st.metric("Total Parts Consumed", format_number(total_parts))
 
@@ -391,9 +385,9 @@ if len(filtered_df) > 0:
                 st.divider()
 
                 # Cost statistics
-                total_cost = consumption_data['consumed_cost'].sum()
-                avg_cost = consumption_data['consumed_cost'].mean()
-                median_cost = consumption_data['consumed_cost'].median()
+                total_cost = totals['consumed_cost_sum']
+                avg_cost = totals['consumed_cost_mean']
+                median_cost = filtered_df['consumed_cost'].median()
 
                 st.metric("Total Material Cost", format_currency(total_cost))
 
@@ -409,13 +403,13 @@ if len(filtered_df) > 0:
         with st.container(border=True):
             st.markdown("#### Planned Material")
 
-            if len(planned_data) > 0:
-                st.caption(f"C-Checks with data: {len(planned_data)} / {len(filtered_df)} ({len(planned_data)/len(filtered_df)*100:.1f}%)")
+            if with_planned > 0:
+                st.caption(f"C-Checks with data: {with_planned} / {total_checks} ({with_planned/total_checks*100:.1f}%)")
 
-                # Parts statistics
-                total_planned_parts = planned_data['planned_parts_count'].sum()
-                avg_planned_parts = planned_data['planned_parts_count'].mean()
-                median_planned_parts = planned_data['planned_parts_count'].median()
+                # Parts statistics (medians need the rows)
+                total_planned_parts = totals['planned_parts_count_sum']
+                avg_planned_parts = totals['planned_parts_count_mean']
+                median_planned_parts = filtered_df['planned_parts_count'].median()
 
                 st.metric("Total Parts Planned", format_number(total_planned_parts))
 
@@ -428,9 +422,9 @@ if len(filtered_df) > 0:
                 st.divider()
 
                 # Cost statistics
-                total_planned_cost = planned_data['planned_cost'].sum()
-                avg_planned_cost = planned_data['planned_cost'].mean()
-                median_planned_cost = planned_data['planned_cost'].median()
+                total_planned_cost = totals['planned_cost_sum']
+                avg_planned_cost = totals['planned_cost_mean']
+                median_planned_cost = filtered_df['planned_cost'].median()
 
                 st.metric("Total Planned Cost", format_currency(total_planned_cost))
 
@@ -442,34 +436,29 @@ if len(filtered_df) > 0:
             else:
                 st.info("No planned material data available for selected filters")
 
-    # Variance analysis in its own container
-    variance_data = filtered_df[
-        (filtered_df['consumed_parts_count'].notna()) &
-        (filtered_df['planned_parts_count'].notna())
-    ].copy()
-
-    if len(variance_data) > 0:
+    # Variance analysis in its own container (variances exist where both are present)
+    if totals['parts_variance_n'] > 0:
         with st.container(border=True):
             st.markdown("#### Variance Analysis (Planned vs Consumed)")
 
             col1, col2, col3 = st.columns(3)
 
             with col1:
-                avg_parts_variance = variance_data['parts_variance'].mean()
+                avg_parts_variance = totals['parts_variance_mean']
                 delta_color = "inverse" if avg_parts_variance < 0 else "normal"
                 st.metric("Avg Parts Variance", f"{avg_parts_variance:+.0f}",
                          delta="Under planned" if avg_parts_variance < 0 else "Over planned",
                          delta_color=delta_color)
 
             with col2:
-                avg_cost_variance = variance_data['cost_variance'].mean()
+                avg_cost_variance = totals['cost_variance_mean']
                 delta_color = "inverse" if avg_cost_variance < 0 else "normal"
                 st.metric("Avg Cost Variance", format_currency(avg_cost_variance),
                          delta="Under budget" if avg_cost_variance < 0 else "Over budget",
                          delta_color=delta_color)
 
             with col3:
-                avg_accuracy = variance_data['planning_accuracy'].mean()
+                avg_accuracy = totals['planning_accuracy_mean']
                 st.metric("Avg Planning Accuracy", f"{avg_accuracy:.1f}%",
                          delta=f"{avg_accuracy - 100:+.1f}pp from target")
 
@@ -479,7 +468,7 @@ if len(filtered_df) > 0:
             st.markdown("##### Parts Variance Distribution")
 
             fig_variance = px.histogram(
-                variance_data,
+                filtered_df[filtered_df['parts_variance'].notna()],
                 x='parts_variance',
                 nbins=20,
                 title="Distribution of Parts Variance (Consumed - Planned)",
@@ -17,8 +17,9 @@ if not sys.warnoptions:
 warnings.filterwarnings('ignore')
 
 # Import data loaders
-from utils.data_loader import get_master_view, load_consumption_detailed, load_planned_material_detailed, is_data_uploaded, show_upload_required
+from utils.data_loader import get_master_view, get_matched_consumption, get_planned_material_index, is_data_uploaded, show_upload_required
 from utils.plotly_utils import hide_warnings_css
+from utils.display import check_labels, currency_column, date_column, show_table
 from utils import format_currency
 
 # Hide warnings with CSS
@@ -39,15 +40,14 @@ if not is_data_uploaded():
 # Load data
 with st.spinner("Loading data..."):
     master_df = get_master_view()
-    consumption_detail = load_consumption_detailed()
-    planned_detail = load_planned_material_detailed()
+    planned_index = get_planned_material_index()
 
 if master_df is None:
     st.error("Could not load data")
     st.stop()
 
 # Filter to C-checks only
-c_checks = master_df[master_df['is_c_check'] == 1].copy()
+c_checks = master_df[master_df['is_c_check'] == 1]
 
 if len(c_checks) == 0:
     st.warning("No C-checks found in the dataset")
@@ -57,10 +57,7 @@ if len(c_checks) == 0:
 st.sidebar.markdown("## Select C-Check")
 
 # Create selector options
-c_checks['display_name'] = c_checks.apply(
-    lambda row: f"{row['wpno']} - {row['ac_registr']} ({row['ac_typ']}) - {pd.to_datetime(row['start_date']).strftime('%Y-%m-%d') if pd.notna(row['start_date']) else 'N/A'}",
-    axis=1
-)
+c_checks['display_name'] = check_labels(c_checks)
 
 selected_display = st.sidebar.selectbox(
     "Choose C-Check",
@@ -232,89 +229,68 @@ st.markdown("### Detailed Material Lists")
 tab1, tab2 = st.tabs(["Planned Material", "Consumed Material"])
 
 with tab1:
-    if planned_detail is not None and has_planned:
-        # Filter planned material for this workpack
-        planned_parts = planned_detail[planned_detail['wpno_i'] == selected_check['wpno_i']].copy()
+    if planned_index is not None and has_planned:
+        # Planned material for this workpack
+        planned_parts = planned_index.lookup(selected_check['wpno_i'])
 
         if len(planned_parts) > 0:
             st.markdown(f"**Total: {len(planned_parts)} planned parts**")
 
             # Display table
             display_cols = ['partno', 'description', 'qty', 'confirmed_qty', 'average_price']
-            planned_display = planned_parts[display_cols].copy()
+            planned_display = planned_parts[display_cols]
             planned_display.columns = ['Part Number', 'Description', 'Quantity', 'Confirmed Qty', 'Avg Price']
-            planned_display['Avg Price'] = planned_display['Avg Price'].apply(lambda x: f"€{x:,.2f}" if pd.notna(x) else "N/A")
 
             # Sort by price descending
             planned_display = planned_display.sort_values('Avg Price', ascending=False)
 
-            st.dataframe(
-                planned_display,
-                width='stretch',
-                hide_index=True
-            )
+            show_table(planned_display, {'Avg Price': currency_column()})
 
             # Top 10 by cost
             st.markdown("#### Top 10 Parts by Cost")
             top_planned = planned_parts.nlargest(10, 'average_price')[['partno', 'description', 'average_price']]
             top_planned.columns = ['Part Number', 'Description', 'Cost']
-            top_planned['Cost'] = top_planned['Cost'].apply(lambda x: f"€{x:,.2f}")
 
-            st.dataframe(
-                top_planned,
-                width='stretch',
-                hide_index=True
-            )
+            show_table(top_planned, {'Cost': currency_column()})
         else:
             st.info("No planned material details found for this C-check")
     else:
         st.info("Planned material data not available")
 
 with tab2:
-    if consumption_detail is not None and has_consumption:
-        # Filter consumption for this workpack (only negative qty = consumed/used)
-        consumed_parts = consumption_detail[
-            (consumption_detail['wpno_i'] == selected_check['wpno_i']) &
-            (consumption_detail['qty'] < 0)
-        ].copy()
+    # Consumption lines behind this workpack's totals, whichever strategy matched them
+    workpack_consumption = get_matched_consumption(selected_check['wpno_i']) if has_consumption else None
+
+    if workpack_consumption is not None:
+        # Only negative qty = consumed/used
+        consumed_parts = workpack_consumption[workpack_consumption['is_consumed']]
 
         if len(consumed_parts) > 0:
             # Calculate actual consumed quantity
-            consumed_parts['consumed_qty'] = consumed_parts['qty'].abs()
+            consumed_parts['consumed_qty'] = consumed_parts['abs_qty']
             # average_price is already the total price
             consumed_parts['consumed_cost'] = consumed_parts['average_price']
 
             st.markdown(f"**Total: {len(consumed_parts)} consumed parts**")
 
             # Display table (consumption has no 'description' column)
-            display_cols = ['partno', 'consumed_qty', 'consumed_cost', 'del_date', 'ata_chapter']
-            consumed_display = consumed_parts[display_cols].copy()
-            consumed_display.columns = ['Part Number', 'Quantity', 'Cost', 'Delivery Date', 'ATA Chapter']
-            consumed_display['Cost'] = consumed_display['Cost'].apply(lambda x: f"€{x:,.2f}" if pd.notna(x) else "N/A")
-            consumed_display['Delivery Date'] = pd.to_datetime(consumed_display['Delivery Date']).dt.strftime('%Y-%m-%d')
+            display_cols = ['partno', 'consumed_qty', 'consumed_cost', 'del_date', 'ata_chapter', 'match_strategy']
+            consumed_display = consumed_parts[display_cols]
+            consumed_display.columns = ['Part Number', 'Quantity', 'Cost', 'Delivery Date', 'ATA Chapter', 'Matched By']
             consumed_display['ATA Chapter'] = consumed_display['ATA Chapter'].fillna('N/A')
 
             # Sort by cost descending
             consumed_display = consumed_display.sort_values('Cost', ascending=False)
 
-            st.dataframe(
-                consumed_display,
-                width='stretch',
-                hide_index=True
-            )
+            show_table(consumed_display, {'Cost': currency_column(), 'Delivery Date': date_column()})
 
             # Top 10 by cost
             st.markdown("#### Top 10 Parts by Cost")
             top_consumed = consumed_parts.nlargest(10, 'consumed_cost')[['partno', 'consumed_cost', 'ata_chapter']]
             top_consumed.columns = ['Part Number', 'Cost', 'ATA Chapter']
-            top_consumed['Cost'] = top_consumed['Cost'].apply(lambda x: f"€{x:,.2f}")
             top_consumed['ATA Chapter'] = top_consumed['ATA Chapter'].fillna('N/A')
 
-            st.dataframe(
-                top_consumed,
-                width='stretch',
-                hide_index=True
-            )
+            show_table(top_consumed, {'Cost': currency_column()})
         else:
             st.info("No consumed material details found for this C-check")
     else:
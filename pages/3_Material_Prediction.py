@@ -18,8 +18,10 @@ warnings.filterwarnings('ignore')
 
 # Import utilities
 from utils.data_loader import get_master_view, is_data_uploaded, show_upload_required
-from utils.ml_model import get_trained_model, find_similar_checks
+from utils.ml_model import get_trained_model, get_training_status, find_similar_checks, retry_training
+from utils.model_registry import activate_version, list_versions, rollback
 from utils.plotly_utils import hide_warnings_css
+from utils.display import currency_column, number_column, percent_column, show_table
 from utils import format_currency
 
 # Hide warnings with CSS
@@ -50,11 +52,36 @@ if model is None:
     st.error("Could not load or train prediction model")
     st.stop()
 
+# A model for the current data is training in the background: meanwhile predictions
+# use the previous model or the planned material fallback, and the page reruns to
+# pick the new model up when it is registered
+training = get_training_status()
+
+if training is not None and training['state'] == 'failed':
+    st.error(f"Model training failed: {training['error']}")
+    st.caption("Training is retried automatically after a delay that grows with each failure")
+    st.button("Retry training", on_click=retry_training)
+elif training is not None:
+    @st.fragment(run_every=2)
+    def training_progress():
+        status = get_training_status()
+
+        if status is None or status['state'] in ('done', 'failed'):
+            st.rerun()
+
+        st.progress(status['progress'], text=f"Training a model on the current data: {status['message']}")
+        if model.forest_stats is None:
+            st.caption("Until it is ready, predictions use planned material or the historical average")
+        else:
+            st.caption("Until it is ready, predictions use the previous model version")
+
+    training_progress()
+
 # Sidebar: Input Form
 st.sidebar.markdown("## New C-Check Details")
 
 # Aircraft Selection
-c_checks = master_df[master_df['is_c_check'] == 1].copy()
+c_checks = master_df[master_df['is_c_check'] == 1]
 aircraft_list = sorted(c_checks['ac_registr'].unique().tolist())
 
 manual_input = st.sidebar.checkbox("Manual Input", value=False)
@@ -274,21 +301,14 @@ if predict_button:
             display_similar = similar_checks[[
                 'wpno', 'ac_registr', 'ac_typ', 'station',
                 'consumed_parts_count', 'consumed_cost', 'similarity_score'
-            ]].copy()
+            ]]
 
             display_similar.columns = [
                 'Workpack', 'Aircraft', 'Type', 'Station',
                 'Parts Count', 'Cost', 'Similarity %'
             ]
 
-            display_similar['Cost'] = display_similar['Cost'].apply(lambda x: f"€{x:,.0f}" if pd.notna(x) else "N/A")
-            display_similar['Similarity %'] = display_similar['Similarity %'].apply(lambda x: f"{x:.0f}%")
-
-            st.dataframe(
-                display_similar,
-                width='stretch',
-                hide_index=True
-            )
+            show_table(display_similar, {'Cost': currency_column(0), 'Similarity %': percent_column(0)})
 
             # Statistics from similar checks
             if similar_checks['consumed_parts_count'].notna().sum() > 0:
@@ -397,5 +417,44 @@ else:
         - Maximum: {model.training_stats['training_max']:.0f} parts
         """)
 
+# Model versions: every trained model is kept in the registry with the fingerprint
+# of its training data; rolling back serves an earlier one until released
+with st.expander("Model Versions"):
+    versions = list_versions()
+
+    if not versions:
+        st.info("No registered model versions yet")
+    else:
+        show_table(
+            pd.DataFrame({
+                'Version': [v['version'] for v in versions],
+                'Trained': pd.to_datetime([v['created'] for v in versions]),
+                'Training Samples': [v['metrics']['n_samples'] for v in versions],
+                'CV R²': [v['metrics']['cv_mean_r2'] for v in versions],
+                'Data Fingerprint': [v['fingerprint'][:12] for v in versions],
+                'Status': ['Active (rolled back)' if v['pinned'] else 'Active' if v['active'] else ''
+                           for v in versions],
+            }),
+            columns={
+                'Version': number_column(),
+                'Training Samples': number_column(),
+                'CV R²': number_column(decimals=2),
+            }
+        )
+
+        active = next((v for v in versions if v['active']), None)
+        col1, col2 = st.columns(2)
+
+        with col1:
+            if st.button("Roll back to previous version",
+                         disabled=active is None or active['version'] == min(v['version'] for v in versions)):
+                rollback()
+                st.rerun()
+
+        with col2:
+            if active is not None and active['pinned'] and st.button("Use model for current data"):
+                activate_version(active['version'], pinned=False)
+                st.rerun()
+
 st.markdown("---")
 st.markdown("*Use the sidebar to navigate to other analysis pages*")
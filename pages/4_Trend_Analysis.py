@@ -4,7 +4,6 @@ Analyze trends in material planning and consumption over time
 """
 
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
@@ -18,7 +17,9 @@ if not sys.warnoptions:
 warnings.filterwarnings('ignore')
 
 # Import data loader
-from utils.data_loader import get_master_view, is_data_uploaded, show_upload_required
+from utils.data_loader import get_c_check_cube, get_calendar, is_data_uploaded, show_upload_required
+from utils.cube import roll_up, calendar_labels
+from utils.display import currency_column, number_column, percent_column, show_table
 from utils.plotly_utils import hide_warnings_css
 from utils import format_currency
 
@@ -39,276 +40,273 @@ if not is_data_uploaded():
 
 # Load data
 with st.spinner("Loading data..."):
-    master_df = get_master_view()
+    # Aggregate cube over the C-checks: every trend below is a roll-up of it
+    cube = get_c_check_cube()
+    calendar = get_calendar()
 
-if master_df is None:
+if cube is None:
     st.error("Could not load data")
     st.stop()
 
-# Filter to C-checks only
-c_checks = master_df[master_df['is_c_check'] == 1].copy()
-
-# Add period columns for grouping
-c_checks['year_month'] = pd.to_datetime(c_checks['start_date']).dt.to_period('M').astype(str)
-c_checks['year'] = pd.to_datetime(c_checks['start_date']).dt.year
-c_checks['quarter'] = pd.to_datetime(c_checks['start_date']).dt.to_period('Q').astype(str)
-
 # Sidebar filters
 st.sidebar.markdown("## Filters")
 
-# Time period
-time_period = st.sidebar.selectbox(
-    "Time Period",
-    ["Monthly", "Quarterly", "Yearly"]
-)
-
 # Aircraft type filter
-ac_types = ['All'] + sorted(c_checks['ac_typ'].unique().tolist())
+ac_types = ['All'] + sorted(cube['ac_typ'].unique().tolist())
 selected_ac_type = st.sidebar.selectbox("Aircraft Type", ac_types)
 
 # Apply filters
-filtered_df = c_checks.copy()
+selection = {}
 
 if selected_ac_type != 'All':
-    filtered_df = filtered_df[filtered_df['ac_typ'] == selected_ac_type]
-
-# Planning Accuracy Trends
-st.markdown("### Planning Accuracy Trends")
-st.markdown("Track how accurately material requirements are being planned over time")
-
-accuracy_data = filtered_df[filtered_df['planning_accuracy'].notna()].copy()
+    selection['ac_typ'] = selected_ac_type
 
-if len(accuracy_data) > 0:
-    # Group by selected period
-    period_col = 'year_month' if time_period == 'Monthly' else 'quarter' if time_period == 'Quarterly' else 'year'
+totals = roll_up(cube, where=selection)
 
-    accuracy_trend = accuracy_data.groupby(period_col).agg({
-        'planning_accuracy': 'mean',
-        'wpno_i': 'count'
-    }).reset_index()
 
-    accuracy_trend.columns = ['Period', 'Average Accuracy %', 'Count']
-
-    # Create chart
-    fig_accuracy = go.Figure()
-
-    fig_accuracy.add_trace(go.Scatter(
-        x=accuracy_trend['Period'],
-        y=accuracy_trend['Average Accuracy %'],
-        mode='lines+markers',
-        name='Planning Accuracy',
-        line=dict(color='#2B3087', width=3),
-        marker=dict(size=8)
-    ))
-
-    fig_accuracy.add_hline(
-        y=100,
-        line_dash="dash",
-        line_color="green",
-        annotation_text="Perfect Accuracy (100%)"
-    )
-
-    fig_accuracy.update_layout(
-        title=f"Planning Accuracy Over Time ({time_period})",
-        xaxis_title="Period",
-        yaxis_title="Average Accuracy (%)",
-        hovermode='x unified'
+# Period trends: changing the time period reruns only this fragment, not the
+# station comparison below it
+@st.fragment
+def period_trends():
+    # Time period
+    time_period = st.selectbox(
+        "Time Period",
+        ["Monthly", "Quarterly", "Yearly"]
     )
 
-    st.plotly_chart(fig_accuracy, width='stretch')
-
-    # Statistics
-    with st.container(border=True):
-        col1, col2, col3 = st.columns(3)
-
-        with col1:
-            overall_accuracy = accuracy_data['planning_accuracy'].mean()
-            st.metric("Overall Average Accuracy", f"{overall_accuracy:.1f}%")
-
-        with col2:
-            trend_direction = "Improving" if accuracy_trend['Average Accuracy %'].iloc[-1] > accuracy_trend['Average Accuracy %'].iloc[0] else "Declining"
-            st.metric("Trend Direction", trend_direction)
-
-        with col3:
-            best_period = accuracy_trend.loc[accuracy_trend['Average Accuracy %'].idxmax(), 'Period']
-            st.metric("Best Period", f"{best_period}")
-else:
-    st.info("Insufficient data with planning accuracy for trend analysis")
-
-st.markdown("---")
+    # Integer key of the selected period and its labels from the calendar dimension
+    period_key = 'month_key' if time_period == 'Monthly' else 'quarter_key' if time_period == 'Quarterly' else 'year'
+    period_labels = calendar_labels(calendar, period_key)
+
+    def period_trend(by=()):
+        """Roll the filtered cube up per period (and any further dimensions), with a Period label column"""
+        trend = roll_up(cube, by=[period_key, *by], where=selection).reset_index()
+        trend['Period'] = trend[period_key].map(period_labels)
+        return trend
+
+    # Planning Accuracy Trends
+    st.markdown("### Planning Accuracy Trends")
+    st.markdown("Track how accurately material requirements are being planned over time")
+
+    if totals['planning_accuracy_n'] > 0:
+        # Group by selected period
+        accuracy_trend = period_trend()
+        accuracy_trend = accuracy_trend[accuracy_trend['planning_accuracy_n'] > 0]
+        accuracy_trend = accuracy_trend[['Period', 'planning_accuracy_mean', 'planning_accuracy_n']].reset_index(drop=True)
+
+        accuracy_trend.columns = ['Period', 'Average Accuracy %', 'Count']
+
+        # Create chart
+        fig_accuracy = go.Figure()
+
+        fig_accuracy.add_trace(go.Scatter(
+            x=accuracy_trend['Period'],
+            y=accuracy_trend['Average Accuracy %'],
+            mode='lines+markers',
+            name='Planning Accuracy',
+            line=dict(color='#2B3087', width=3),
+            marker=dict(size=8)
+        ))
+
+        fig_accuracy.add_hline(
+            y=100,
+            line_dash="dash",
+            line_color="green",
+            annotation_text="Perfect Accuracy (100%)"
+        )
 
-# Cost Trends
-st.markdown("### Cost Trends")
-st.markdown("Analyze how material costs are changing over time")
+        fig_accuracy.update_layout(
+            title=f"Planning Accuracy Over Time ({time_period})",
+            xaxis_title="Period",
+            yaxis_title="Average Accuracy (%)",
+            hovermode='x unified'
+        )
 
-cost_data = filtered_df[filtered_df['consumed_cost'].notna()].copy()
+        st.plotly_chart(fig_accuracy, width='stretch')
 
-if len(cost_data) > 0:
-    period_col = 'year_month' if time_period == 'Monthly' else 'quarter' if time_period == 'Quarterly' else 'year'
+        # Statistics
+        with st.container(border=True):
+            col1, col2, col3 = st.columns(3)
 
-    # Overall cost trend
-    cost_trend = cost_data.groupby(period_col).agg({
-        'consumed_cost': 'mean',
-        'wpno_i': 'count'
-    }).reset_index()
+            with col1:
+                overall_accuracy = totals['planning_accuracy_mean']
+                st.metric("Overall Average Accuracy", f"{overall_accuracy:.1f}%")
 
-    cost_trend.columns = ['Period', 'Average Cost', 'Count']
+            with col2:
+                trend_direction = "Improving" if accuracy_trend['Average Accuracy %'].iloc[-1] > accuracy_trend['Average Accuracy %'].iloc[0] else "Declining"
+                st.metric("Trend Direction", trend_direction)
 
-    fig_cost = px.line(
-        cost_trend,
-        x='Period',
-        y='Average Cost',
-        title=f"Average Cost per C-Check Over Time ({time_period})",
-        markers=True
-    )
+            with col3:
+                best_period = accuracy_trend.loc[accuracy_trend['Average Accuracy %'].idxmax(), 'Period']
+                st.metric("Best Period", f"{best_period}")
+    else:
+        st.info("Insufficient data with planning accuracy for trend analysis")
 
-    fig_cost.update_traces(line_color='#2B3087')
-    fig_cost.update_layout(
-        yaxis_title="Average Cost (EUR)",
-        xaxis_title="Period"
-    )
+    st.markdown("---")
 
-    st.plotly_chart(fig_cost, width='stretch')
+    # Cost Trends
+    st.markdown("### Cost Trends")
+    st.markdown("Analyze how material costs are changing over time")
 
-    # By aircraft type
-    if selected_ac_type == 'All':
-        st.markdown("#### Cost Trends by Aircraft Type")
+    if totals['consumed_cost_n'] > 0:
+        # Overall cost trend
+        cost_trend = period_trend()
+        cost_trend = cost_trend[cost_trend['consumed_cost_n'] > 0]
+        cost_trend = cost_trend[['Period', 'consumed_cost_mean', 'consumed_cost_n']].reset_index(drop=True)
 
-        cost_by_type = cost_data.groupby([period_col, 'ac_typ']).agg({
-            'consumed_cost': 'mean'
-        }).reset_index()
+        cost_trend.columns = ['Period', 'Average Cost', 'Count']
 
-        cost_by_type.columns = ['Period', 'Aircraft Type', 'Average Cost']
-
-        fig_cost_type = px.line(
-            cost_by_type,
+        fig_cost = px.line(
+            cost_trend,
             x='Period',
             y='Average Cost',
-            color='Aircraft Type',
-            title="Cost Trends by Aircraft Type",
+            title=f"Average Cost per C-Check Over Time ({time_period})",
             markers=True
         )
 
-        fig_cost_type.update_layout(
+        fig_cost.update_traces(line_color='#2B3087')
+        fig_cost.update_layout(
             yaxis_title="Average Cost (EUR)",
             xaxis_title="Period"
         )
 
-        st.plotly_chart(fig_cost_type, width='stretch')
-
-    # Cost statistics
-    with st.container(border=True):
-        col1, col2, col3 = st.columns(3)
-
-        with col1:
-            avg_cost = cost_data['consumed_cost'].mean()
-            st.metric("Average Cost", format_currency(avg_cost))
-
-        with col2:
-            cost_change = ((cost_trend['Average Cost'].iloc[-1] / cost_trend['Average Cost'].iloc[0]) - 1) * 100
-            st.metric("Cost Change", f"{cost_change:+.1f}%")
+        st.plotly_chart(fig_cost, width='stretch')
+
+        # By aircraft type
+        if selected_ac_type == 'All':
+            st.markdown("#### Cost Trends by Aircraft Type")
+
+            cost_by_type = period_trend(by=('ac_typ',))
+            cost_by_type = cost_by_type[cost_by_type['consumed_cost_n'] > 0]
+            cost_by_type = cost_by_type[['Period', 'ac_typ', 'consumed_cost_mean']].reset_index(drop=True)
+
+            cost_by_type.columns = ['Period', 'Aircraft Type', 'Average Cost']
+
+            fig_cost_type = px.line(
+                cost_by_type,
+                x='Period',
+                y='Average Cost',
+                color='Aircraft Type',
+                title="Cost Trends by Aircraft Type",
+                markers=True
+            )
+
+            fig_cost_type.update_layout(
+                yaxis_title="Average Cost (EUR)",
+                xaxis_title="Period"
+            )
+
+            st.plotly_chart(fig_cost_type, width='stretch')
+
+        # Cost statistics
+        with st.container(border=True):
+            col1, col2, col3 = st.columns(3)
+
+            with col1:
+                avg_cost = totals['consumed_cost_mean']
+                st.metric("Average Cost", format_currency(avg_cost))
+
+            with col2:
+                cost_change = ((cost_trend['Average Cost'].iloc[-1] / cost_trend['Average Cost'].iloc[0]) - 1) * 100
+                st.metric("Cost Change", f"{cost_change:+.1f}%")
+
+            with col3:
+                max_cost = totals['consumed_cost_max']
+                st.metric("Highest Cost", format_currency(max_cost))
+    else:
+        st.info("Insufficient cost data for trend analysis")
+
+    st.markdown("---")
+
+    # Material Usage Trends
+    st.markdown("### Material Usage Trends")
+    st.markdown("Track the number of parts used per C-check over time")
+
+    if totals['consumed_parts_count_n'] > 0:
+        parts_trend = period_trend()
+        parts_trend = parts_trend[parts_trend['consumed_parts_count_n'] > 0]
+        parts_trend = parts_trend[[
+            'Period', 'consumed_parts_count_mean', 'consumed_parts_count_min',
+            'consumed_parts_count_max', 'consumed_parts_count_n'
+        ]].reset_index(drop=True)
+
+        parts_trend.columns = ['Period', 'Average Parts', 'Min Parts', 'Max Parts', 'Count']
+
+        # Create chart with range
+        fig_parts = go.Figure()
+
+        fig_parts.add_trace(go.Scatter(
+            x=parts_trend['Period'],
+            y=parts_trend['Average Parts'],
+            mode='lines+markers',
+            name='Average',
+            line=dict(color='#2B3087', width=3),
+            marker=dict(size=8)
+        ))
+
+        fig_parts.add_trace(go.Scatter(
+            x=parts_trend['Period'],
+            y=parts_trend['Max Parts'],
+            mode='lines',
+            name='Max',
+            line=dict(color='#FFA500', width=1, dash='dash'),
+            fill=None
+        ))
+
+        fig_parts.add_trace(go.Scatter(
+            x=parts_trend['Period'],
+            y=parts_trend['Min Parts'],
+            mode='lines',
+            name='Min',
+            line=dict(color='#FFA500', width=1, dash='dash'),
+            fill='tonexty',
+            fillcolor='rgba(255, 165, 0, 0.2)'
+        ))
+
+        fig_parts.update_layout(
+            title=f"Parts Count Trends ({time_period})",
+            xaxis_title="Period",
+            yaxis_title="Number of Parts",
+            hovermode='x unified'
+        )
 
-        with col3:
-            max_cost = cost_data['consumed_cost'].max()
-            st.metric("Highest Cost", format_currency(max_cost))
-else:
-    st.info("Insufficient cost data for trend analysis")
+        st.plotly_chart(fig_parts, width='stretch')
 
-st.markdown("---")
+        # Statistics
+        with st.container(border=True):
+            col1, col2, col3 = st.columns(3)
 
-# Material Usage Trends
-st.markdown("### Material Usage Trends")
-st.markdown("Track the number of parts used per C-check over time")
-
-parts_data = filtered_df[filtered_df['consumed_parts_count'].notna()].copy()
-
-if len(parts_data) > 0:
-    period_col = 'year_month' if time_period == 'Monthly' else 'quarter' if time_period == 'Quarterly' else 'year'
-
-    parts_trend = parts_data.groupby(period_col).agg({
-        'consumed_parts_count': ['mean', 'min', 'max'],
-        'wpno_i': 'count'
-    }).reset_index()
-
-    parts_trend.columns = ['Period', 'Average Parts', 'Min Parts', 'Max Parts', 'Count']
-
-    # Create chart with range
-    fig_parts = go.Figure()
-
-    fig_parts.add_trace(go.Scatter(
-        x=parts_trend['Period'],
-        y=parts_trend['Average Parts'],
-        mode='lines+markers',
-        name='Average',
-        line=dict(color='#2B3087', width=3),
-        marker=dict(size=8)
-    ))
-
-    fig_parts.add_trace(go.Scatter(
-        x=parts_trend['Period'],
-        y=parts_trend['Max Parts'],
-        mode='lines',
-        name='Max',
-        line=dict(color='#FFA500', width=1, dash='dash'),
-        fill=None
-    ))
-
-    fig_parts.add_trace(go.Scatter(
-        x=parts_trend['Period'],
-        y=parts_trend['Min Parts'],
-        mode='lines',
-        name='Min',
-        line=dict(color='#FFA500', width=1, dash='dash'),
-        fill='tonexty',
-        fillcolor='rgba(255, 165, 0, 0.2)'
-    ))
-
-    fig_parts.update_layout(
-        title=f"Parts Count Trends ({time_period})",
-        xaxis_title="Period",
-        yaxis_title="Number of Parts",
-        hovermode='x unified'
-    )
+            with col1:
+                avg_parts = totals['consumed_parts_count_mean']
+                st.metric("Average Parts", f"{avg_parts:.0f}")
 
-    st.plotly_chart(fig_parts, width='stretch')
+            with col2:
+                parts_std = totals['consumed_parts_count_std']
+                st.metric("Standard Deviation", f"{parts_std:.0f}")
 
-    # Statistics
-    with st.container(border=True):
-        col1, col2, col3 = st.columns(3)
+            with col3:
+                parts_range = totals['consumed_parts_count_max'] - totals['consumed_parts_count_min']
+                st.metric("Range", f"{parts_range:.0f}")
+    else:
+        st.info("Insufficient parts data for trend analysis")
 
-        with col1:
-            avg_parts = parts_data['consumed_parts_count'].mean()
-            st.metric("Average Parts", f"{avg_parts:.0f}")
+    st.markdown("---")
 
-        with col2:
-            parts_std = parts_data['consumed_parts_count'].std()
-            st.metric("Standard Deviation", f"{parts_std:.0f}")
 
-        with col3:
-            parts_range = parts_data['consumed_parts_count'].max() - parts_data['consumed_parts_count'].min()
-            st.metric("Range", f"{parts_range:.0f}")
-else:
-    st.info("Insufficient parts data for trend analysis")
-
-st.markdown("---")
+period_trends()
 
 # Station Performance Comparison
 st.markdown("### Station Performance Comparison")
 st.markdown("Compare material planning performance across different stations")
 
-station_data = filtered_df[
-    (filtered_df['planning_accuracy'].notna()) |
-    (filtered_df['consumed_cost'].notna())
-].copy()
+# C-checks with consumption (planning accuracy also requires consumption)
+station_stats = roll_up(cube, by=['station'], where={**selection, 'has_consumption': True})
 
-if len(station_data) > 0:
-    station_stats = station_data.groupby('station').agg({
-        'wpno_i': 'count',
-        'planning_accuracy': 'mean',
-        'consumed_cost': 'mean',
-        'consumed_parts_count': 'mean',
-        'duration_days': 'mean'
-    }).reset_index()
+if len(station_stats) > 0:
+    station_stats = station_stats[[
+        'checks', 'planning_accuracy_mean', 'consumed_cost_mean',
+        'consumed_parts_count_mean', 'duration_days_mean'
+    ]].reset_index()
 
     station_stats.columns = [
         'Station', 'C-Checks', 'Avg Accuracy %', 'Avg Cost',
@@ -340,17 +338,12 @@ if len(station_data) > 0:
     # Table
     st.markdown("#### Station Performance Table")
 
-    display_stats = station_stats.copy()
-    display_stats['Avg Accuracy %'] = display_stats['Avg Accuracy %'].apply(lambda x: f"{x:.1f}%" if pd.notna(x) else "N/A")
-    display_stats['Avg Cost'] = display_stats['Avg Cost'].apply(lambda x: f"€{x:,.0f}" if pd.notna(x) else "N/A")
-    display_stats['Avg Parts'] = display_stats['Avg Parts'].apply(lambda x: f"{x:.0f}" if pd.notna(x) else "N/A")
-    display_stats['Avg Duration (days)'] = display_stats['Avg Duration (days)'].apply(lambda x: f"{x:.1f}" if pd.notna(x) else "N/A")
-
-    st.dataframe(
-        display_stats,
-        width='stretch',
-        hide_index=True
-    )
+    show_table(station_stats, {
+        'Avg Accuracy %': percent_column(),
+        'Avg Cost': currency_column(0),
+        'Avg Parts': number_column(),
+        'Avg Duration (days)': number_column(1),
+    })
 else:
     st.info("Insufficient data for station comparison")
 
@@ -19,7 +19,9 @@ if not sys.warnoptions:
 warnings.filterwarnings('ignore')
 
 # Import data loader
-from utils.data_loader import get_master_view, load_consumption_detailed, is_data_uploaded, show_upload_required
+from utils.data_loader import get_master_view, get_c_check_cube, get_matched_consumption_many, is_data_uploaded, show_upload_required
+from utils.cube import roll_up
+from utils.display import currency_column, number_column, percent_column, show_table
 from utils.plotly_utils import hide_warnings_css
 from utils import format_currency
 
@@ -41,23 +43,26 @@ if not is_data_uploaded():
 # Load data
 with st.spinner("Loading data..."):
     master_df = get_master_view()
-    consumption_detail = load_consumption_detailed()
+    cube = get_c_check_cube()
 
-if master_df is None:
+if master_df is None or cube is None:
     st.error("Could not load data")
     st.stop()
 
 # Filter to C-checks only
-c_checks = master_df[master_df['is_c_check'] == 1].copy()
+c_checks = master_df[master_df['is_c_check'] == 1]
 
 # Aircraft type selector
 st.sidebar.markdown("## Select Aircraft Type")
 
-aircraft_types = sorted(c_checks['ac_typ'].unique().tolist())
+aircraft_types = sorted(cube['ac_typ'].unique().tolist())
 selected_ac_type = st.sidebar.selectbox("Aircraft Type", aircraft_types)
 
-# Filter to selected aircraft type
-ac_data = c_checks[c_checks['ac_typ'] == selected_ac_type].copy()
+# Summary of the selected aircraft type from the cube; its rows are only needed
+# for the correlation scatter plots and the parts lookup
+ac_totals = roll_up(cube, where={'ac_typ': selected_ac_type})
+ac_checks = ac_totals['checks']
+ac_data = c_checks[c_checks['ac_typ'] == selected_ac_type]
 
 # Aircraft Type Summary
 st.markdown(f"### {selected_ac_type} Summary")
@@ -66,25 +71,25 @@ with st.container(border=True):
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        st.metric("Total C-Checks", len(ac_data))
+        st.metric("Total C-Checks", ac_checks)
 
     with col2:
-        with_consumption = ac_data['consumed_parts_count'].notna().sum()
+        with_consumption = ac_totals['consumed_parts_count_n']
         st.metric(
             "With Consumption Data",
             with_consumption,
-            delta=f"{with_consumption/len(ac_data)*100:.1f}%"
+            delta=f"{with_consumption/ac_checks*100:.1f}%"
         )
 
     with col3:
-        avg_util = ac_data['aircraft_hours'].mean()
+        avg_util = ac_totals['aircraft_hours_mean']
         if pd.notna(avg_util):
             st.metric("Avg Aircraft Hours", f"{avg_util:,.0f}")
         else:
             st.metric("Avg Aircraft Hours", "N/A")
 
     with col4:
-        avg_cycles = ac_data['aircraft_cycles'].mean()
+        avg_cycles = ac_totals['aircraft_cycles_mean']
         if pd.notna(avg_cycles):
             st.metric("Avg Aircraft Cycles", f"{avg_cycles:,.0f}")
         else:
@@ -96,28 +101,28 @@ with st.container(border=True):
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        avg_cost = ac_data['consumed_cost'].mean()
+        avg_cost = ac_totals['consumed_cost_mean']
         if pd.notna(avg_cost):
             st.metric("Avg Material Cost", format_currency(avg_cost))
         else:
             st.metric("Avg Material Cost", "N/A")
 
     with col2:
-        avg_parts = ac_data['consumed_parts_count'].mean()
+        avg_parts = ac_totals['consumed_parts_count_mean']
         if pd.notna(avg_parts):
             st.metric("Avg Parts per C-Check", f"{avg_parts:.0f}")
         else:
             st.metric("Avg Parts per C-Check", "N/A")
 
     with col3:
-        avg_duration = ac_data['duration_days'].mean()
+        avg_duration = ac_totals['duration_days_mean']
         if pd.notna(avg_duration):
             st.metric("Avg Duration", f"{avg_duration:.1f} days")
         else:
             st.metric("Avg Duration", "N/A")
 
     with col4:
-        avg_accuracy = ac_data['planning_accuracy'].mean()
+        avg_accuracy = ac_totals['planning_accuracy_mean']
         if pd.notna(avg_accuracy):
             st.metric("Avg Planning Accuracy", f"{avg_accuracy:.1f}%")
         else:
@@ -132,7 +137,7 @@ st.markdown("Examine the relationship between aircraft utilization and material
 util_data = ac_data[
     (ac_data['aircraft_hours'].notna()) &
     (ac_data['consumed_parts_count'].notna())
-].copy()
+]
 
 if len(util_data) > 5:
     col1, col2 = st.columns(2)
@@ -201,17 +206,16 @@ st.markdown("---")
 # Parts Analysis by Aircraft Type
 st.markdown("### Parts Analysis")
 
-if consumption_detail is not None:
+# Consumption lines behind these C-checks' totals, whichever strategy matched them
+ac_consumption = get_matched_consumption_many(ac_data['wpno_i'].unique())
+
+if ac_consumption is not None:
     # Get all parts for this aircraft type (only negative qty = consumed/used)
-    ac_wpnos = ac_data['wpno_i'].unique()
-    ac_parts = consumption_detail[
-        (consumption_detail['wpno_i'].isin(ac_wpnos)) &
-        (consumption_detail['qty'] < 0)
-    ].copy()
+    ac_parts = ac_consumption[ac_consumption['is_consumed']]
 
     if len(ac_parts) > 0:
         # Calculate consumed quantity
-        ac_parts['consumed_qty'] = ac_parts['qty'].abs()
+        ac_parts['consumed_qty'] = ac_parts['abs_qty']
         # average_price is already the total price
         ac_parts['consumed_cost'] = ac_parts['average_price']
 
@@ -223,20 +227,15 @@ if consumption_detail is not None:
         top_parts = ac_parts.groupby(['partno', 'ata_chapter']).agg({
             'consumed_qty': 'sum',
             'consumed_cost': 'sum',
-            'wpno_i': 'count'
+            'matched_wpno_i': 'count'
         }).reset_index()
 
         top_parts.columns = ['Part Number', 'ATA Chapter', 'Total Qty', 'Total Cost', 'Frequency']
         top_parts = top_parts.sort_values('Frequency', ascending=False).head(10)
 
-        top_parts['Total Cost'] = top_parts['Total Cost'].apply(lambda x: f"€{x:,.0f}" if pd.notna(x) else "N/A")
         top_parts['ATA Chapter'] = top_parts['ATA Chapter'].fillna('N/A')
 
-        st.dataframe(
-            top_parts,
-            width='stretch',
-            hide_index=True
-        )
+        show_table(top_parts, {'Total Cost': currency_column(0)})
     else:
         st.info("No detailed parts data available for this aircraft type")
 else:
@@ -249,15 +248,10 @@ st.markdown("### Aircraft Type Comparison")
 st.markdown("Compare key metrics across all aircraft types")
 
 # Create comparison dataframe
-comparison_stats = c_checks.groupby('ac_typ').agg({
-    'wpno_i': 'count',
-    'consumed_parts_count': 'mean',
-    'consumed_cost': 'mean',
-    'duration_days': 'mean',
-    'planning_accuracy': 'mean',
-    'aircraft_hours': 'mean',
-    'aircraft_cycles': 'mean'
-}).reset_index()
+comparison_stats = roll_up(cube, by=['ac_typ'])[[
+    'checks', 'consumed_parts_count_mean', 'consumed_cost_mean', 'duration_days_mean',
+    'planning_accuracy_mean', 'aircraft_hours_mean', 'aircraft_cycles_mean'
+]].reset_index()
 
 comparison_stats.columns = [
     'Aircraft Type', 'C-Checks', 'Avg Parts', 'Avg Cost',
@@ -273,27 +267,22 @@ def highlight_selected(row):
         return ['background-color: #E8F4F8'] * len(row)
     return [''] * len(row)
 
-# Format table
-display_comparison = comparison_stats.copy()
-display_comparison['Avg Parts'] = display_comparison['Avg Parts'].apply(lambda x: f"{x:.0f}" if pd.notna(x) else "N/A")
-display_comparison['Avg Cost'] = display_comparison['Avg Cost'].apply(lambda x: f"€{x:,.0f}" if pd.notna(x) else "N/A")
-display_comparison['Avg Duration (days)'] = display_comparison['Avg Duration (days)'].apply(lambda x: f"{x:.1f}" if pd.notna(x) else "N/A")
-display_comparison['Avg Accuracy %'] = display_comparison['Avg Accuracy %'].apply(lambda x: f"{x:.1f}%" if pd.notna(x) else "N/A")
-display_comparison['Avg Hours'] = display_comparison['Avg Hours'].apply(lambda x: f"{x:,.0f}" if pd.notna(x) else "N/A")
-display_comparison['Avg Cycles'] = display_comparison['Avg Cycles'].apply(lambda x: f"{x:,.0f}" if pd.notna(x) else "N/A")
-
-st.dataframe(
-    display_comparison,
-    width='stretch',
-    hide_index=True
-)
+# Display table
+show_table(comparison_stats, {
+    'Avg Parts': number_column(),
+    'Avg Cost': currency_column(0),
+    'Avg Duration (days)': number_column(1),
+    'Avg Accuracy %': percent_column(),
+    'Avg Hours': number_column(),
+    'Avg Cycles': number_column(),
+})
 
 # Visual comparison charts
 col1, col2 = st.columns(2)
 
 with col1:
     # Average cost by aircraft type
-    cost_comparison = comparison_stats[comparison_stats['Avg Cost'].notna()].copy()
+    cost_comparison = comparison_stats[comparison_stats['Avg Cost'].notna()]
 
     if len(cost_comparison) > 0:
         fig_ac_cost = px.bar(
@@ -315,7 +304,7 @@ with col1:
 
 with col2:
     # Average parts by aircraft type
-    parts_comparison = comparison_stats[comparison_stats['Avg Parts'].notna()].copy()
+    parts_comparison = comparison_stats[comparison_stats['Avg Parts'].notna()]
 
     if len(parts_comparison) > 0:
         # Convert back to numeric for plotting
@@ -17,8 +17,9 @@ if not sys.warnoptions:
 warnings.filterwarnings('ignore')
 
 # Import data loaders
-from utils.data_loader import get_master_view, load_consumption_detailed, load_planned_material_detailed, is_data_uploaded, show_upload_required
+from utils.data_loader import get_master_view, get_matched_consumption, get_planned_material_index, is_data_uploaded, show_upload_required
 from utils.plotly_utils import hide_warnings_css
+from utils.display import check_labels, currency_column, show_table
 from utils import format_currency
 
 # Hide warnings with CSS
@@ -39,8 +40,7 @@ if not is_data_uploaded():
 # Load data
 with st.spinner("Loading data..."):
     master_df = get_master_view()
-    consumption_detail = load_consumption_detailed()
-    planned_detail = load_planned_material_detailed()
+    planned_index = get_planned_material_index()
 
 if master_df is None:
     st.error("Could not load data")
@@ -51,7 +51,7 @@ c_checks = master_df[
     (master_df['is_c_check'] == 1) &
     (master_df['consumed_parts_count'].notna()) &
     (master_df['planned_parts_count'].notna())
-].copy()
+]
 
 st.markdown(f"**C-Checks with both planned and consumed data:** {len(c_checks)} out of {len(master_df[master_df['is_c_check'] == 1])} total")
 
@@ -62,10 +62,7 @@ if len(c_checks) == 0:
 # Sidebar: C-Check Selector
 st.sidebar.markdown("## Select C-Check")
 
-c_checks['display_name'] = c_checks.apply(
-    lambda row: f"{row['wpno']} - {row['ac_registr']} ({row['ac_typ']}) - {pd.to_datetime(row['start_date']).strftime('%Y-%m-%d') if pd.notna(row['start_date']) else 'N/A'}",
-    axis=1
-)
+c_checks['display_name'] = check_labels(c_checks)
 
 selected_display = st.sidebar.selectbox(
     "Choose C-Check",
@@ -117,13 +114,12 @@ st.markdown("---")
 
 # Load detailed parts data
 planned_parts = None
-consumed_parts = None
 
-if planned_detail is not None:
-    planned_parts = planned_detail[planned_detail['wpno_i'] == selected_check['wpno_i']].copy()
+if planned_index is not None:
+    planned_parts = planned_index.lookup(selected_check['wpno_i'])
 
-if consumption_detail is not None:
-    consumed_parts = consumption_detail[consumption_detail['wpno_i'] == selected_check['wpno_i']].copy()
+# Consumption lines behind this workpack's totals, whichever strategy matched them
+consumed_parts = get_matched_consumption(selected_check['wpno_i'])
 
 if planned_parts is None or consumed_parts is None or len(planned_parts) == 0 or len(consumed_parts) == 0:
     st.error("Could not load detailed parts data for this C-check")
@@ -143,8 +139,8 @@ planned_summary = planned_parts.groupby('partno').agg({
 planned_summary.columns = ['partno', 'description', 'planned_qty', 'planned_cost', 'tool', 'mat_class']
 
 # Filter only consumed parts (negative qty means consumed/used)
-consumed_used = consumed_parts[consumed_parts['qty'] < 0].copy()
-consumed_used['consumed_qty'] = consumed_used['qty'].abs()  # Make positive
+consumed_used = consumed_parts[consumed_parts['is_consumed']]
+consumed_used['consumed_qty'] = consumed_used['abs_qty']
 
 consumed_summary = consumed_used.groupby('partno').agg({
     'consumed_qty': 'sum',
@@ -287,7 +283,7 @@ with col1:
 
 with col2:
     # Variance distribution
-    variance_data = comparison[comparison['cost_variance'] != 0].copy()
+    variance_data = comparison[comparison['cost_variance'] != 0]
 
     if len(variance_data) > 0:
         fig_variance = px.histogram(
@@ -311,7 +307,7 @@ st.markdown("---")
 st.markdown("### Matching Parts Analysis")
 st.markdown("Parts that were **both planned AND actually consumed**")
 
-matching_parts = comparison[comparison['category'] == 'Both (Planned & Consumed)'].copy()
+matching_parts = comparison[comparison['category'] == 'Both (Planned & Consumed)']
 
 if len(matching_parts) > 0:
     with st.container(border=True):
@@ -335,7 +331,7 @@ if len(matching_parts) > 0:
 
     with col1:
         # Top 10 matching parts by cost
-        top_matching_chart = matching_parts.nlargest(10, 'consumed_cost').copy()
+        top_matching_chart = matching_parts.nlargest(10, 'consumed_cost')
 
         fig_top_matching = go.Figure()
 
@@ -436,23 +432,19 @@ if planned_parts is not None and len(planned_parts) > 0:
     gap_parts = planned_summary_full[planned_summary_full['confirmation_gap'] > 0].nlargest(10, 'confirmation_gap')[[
         'partno', 'description', 'qty', 'confirmed_qty', 'confirmation_gap',
         'externally_provisioned', 'average_price'
-    ]].copy()
+    ]]
 
     if len(gap_parts) > 0:
-        gap_parts['externally_provisioned'] = gap_parts['externally_provisioned'].fillna('N')
+        # Categorical columns: decode before filling with a label that may not be a category
+        gap_parts['externally_provisioned'] = gap_parts['externally_provisioned'].astype(object).fillna('N')
         gap_parts['description'] = gap_parts['description'].fillna('N/A')
-        gap_parts['average_price'] = gap_parts['average_price'].apply(lambda x: f"€{x:,.2f}")
 
         gap_parts.columns = [
             'Part Number', 'Description', 'Planned Qty', 'Confirmed Qty', 'Gap',
             'External', 'Cost'
         ]
 
-        st.dataframe(
-            gap_parts,
-            width='stretch',
-            hide_index=True
-        )
+        show_table(gap_parts, {'Cost': currency_column()})
 
         # Summary of gap
         total_gap = planned_summary_full['confirmation_gap'].sum()
@@ -467,13 +459,13 @@ if planned_parts is not None and len(planned_parts) > 0:
     if 'externally_provisioned' in planned_parts.columns:
         st.markdown("##### External vs Internal Provisioning")
 
-        external_breakdown = planned_parts.groupby('externally_provisioned').agg({
+        external_breakdown = planned_parts.groupby('externally_provisioned', observed=True).agg({
             'partno': 'count',
             'average_price': 'sum'
         }).reset_index()
 
         external_breakdown.columns = ['External', 'Part Count', 'Total Cost']
-        external_breakdown['External'] = external_breakdown['External'].fillna('N')
+        external_breakdown['External'] = external_breakdown['External'].astype(object).fillna('N')
 
         col1, col2 = st.columns(2)
 
@@ -512,7 +504,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Treemap of parts by cost
-    treemap_data = comparison.nlargest(20, 'consumed_cost').copy()
+    treemap_data = comparison.nlargest(20, 'consumed_cost')
 
     fig_treemap = px.treemap(
         treemap_data,
@@ -577,72 +569,76 @@ with col2:
     else:
         st.info("No under-consumed parts")
 
-st.markdown("#### Filter and Sort Options")
-
-# Filters
-col1, col2 = st.columns(2)
 
-with col1:
-    selected_category = st.selectbox(
-        "Filter by Category",
-        ['All'] + sorted(comparison['category'].unique().tolist())
-    )
+# The table's filter and sort rerun only this fragment, not the comparison above it
+@st.fragment
+def parts_table(comparison):
+    st.markdown("#### Filter and Sort Options")
 
-with col2:
-    sort_by = st.selectbox(
-        "Sort by",
-        ['Cost Variance (Descending)', 'Cost Variance (Ascending)',
-         'Planned Cost (Descending)', 'Consumed Cost (Descending)',
-         'Qty Variance (Absolute)']
-    )
+    # Filters
+    col1, col2 = st.columns(2)
 
-# Apply filter
-filtered_comparison = comparison.copy()
-if selected_category != 'All':
-    filtered_comparison = filtered_comparison[filtered_comparison['category'] == selected_category]
-
-# Apply sorting
-if sort_by == 'Cost Variance (Descending)':
-    filtered_comparison = filtered_comparison.sort_values('cost_variance', ascending=False)
-elif sort_by == 'Cost Variance (Ascending)':
-    filtered_comparison = filtered_comparison.sort_values('cost_variance', ascending=True)
-elif sort_by == 'Planned Cost (Descending)':
-    filtered_comparison = filtered_comparison.sort_values('planned_cost', ascending=False)
-elif sort_by == 'Consumed Cost (Descending)':
-    filtered_comparison = filtered_comparison.sort_values('consumed_cost', ascending=False)
-elif sort_by == 'Qty Variance (Absolute)':
-    filtered_comparison['abs_qty_var'] = filtered_comparison['qty_variance'].abs()
-    filtered_comparison = filtered_comparison.sort_values('abs_qty_var', ascending=False)
-
-# Format display table
-display_comparison = filtered_comparison[[
-    'partno', 'description', 'category',
-    'planned_qty', 'consumed_qty', 'qty_variance',
-    'planned_cost', 'consumed_cost', 'cost_variance',
-    'ata_chapter', 'mat_class'
-]].copy()
-
-display_comparison['planned_cost'] = display_comparison['planned_cost'].apply(lambda x: f"€{x:,.2f}")
-display_comparison['consumed_cost'] = display_comparison['consumed_cost'].apply(lambda x: f"€{x:,.2f}")
-display_comparison['cost_variance'] = display_comparison['cost_variance'].apply(lambda x: f"€{x:,.2f}")
-display_comparison['description'] = display_comparison['description'].fillna('N/A')
-display_comparison['ata_chapter'] = display_comparison['ata_chapter'].fillna('N/A')
-display_comparison['mat_class'] = display_comparison['mat_class'].fillna('N/A')
-
-display_comparison.columns = [
-    'Part Number', 'Description', 'Category',
-    'Planned Qty', 'Consumed Qty', 'Qty Variance',
-    'Planned Cost', 'Consumed Cost', 'Cost Variance',
-    'ATA Chapter', 'Material Class'
-]
+    with col1:
+        selected_category = st.selectbox(
+            "Filter by Category",
+            ['All'] + sorted(comparison['category'].unique().tolist())
+        )
 
-st.dataframe(
-    display_comparison,
-    width='stretch',
-    hide_index=True
-)
+    with col2:
+        sort_by = st.selectbox(
+            "Sort by",
+            ['Cost Variance (Descending)', 'Cost Variance (Ascending)',
+             'Planned Cost (Descending)', 'Consumed Cost (Descending)',
+             'Qty Variance (Absolute)']
+        )
 
-st.markdown(f"**Showing {len(filtered_comparison)} out of {len(comparison)} parts**")
+    # Apply filter
+    filtered_comparison = comparison.copy(deep=False)
+    if selected_category != 'All':
+        filtered_comparison = filtered_comparison[filtered_comparison['category'] == selected_category]
+
+    # Apply sorting
+    if sort_by == 'Cost Variance (Descending)':
+        filtered_comparison = filtered_comparison.sort_values('cost_variance', ascending=False)
+    elif sort_by == 'Cost Variance (Ascending)':
+        filtered_comparison = filtered_comparison.sort_values('cost_variance', ascending=True)
+    elif sort_by == 'Planned Cost (Descending)':
+        filtered_comparison = filtered_comparison.sort_values('planned_cost', ascending=False)
+    elif sort_by == 'Consumed Cost (Descending)':
+        filtered_comparison = filtered_comparison.sort_values('consumed_cost', ascending=False)
+    elif sort_by == 'Qty Variance (Absolute)':
+        filtered_comparison['abs_qty_var'] = filtered_comparison['qty_variance'].abs()
+        filtered_comparison = filtered_comparison.sort_values('abs_qty_var', ascending=False)
+
+    # Format display table
+    display_comparison = filtered_comparison[[
+        'partno', 'description', 'category',
+        'planned_qty', 'consumed_qty', 'qty_variance',
+        'planned_cost', 'consumed_cost', 'cost_variance',
+        'ata_chapter', 'mat_class'
+    ]]
+
+    display_comparison['description'] = display_comparison['description'].fillna('N/A')
+    display_comparison['ata_chapter'] = display_comparison['ata_chapter'].fillna('N/A')
+    display_comparison['mat_class'] = display_comparison['mat_class'].astype(object).fillna('N/A')
+
+    display_comparison.columns = [
+        'Part Number', 'Description', 'Category',
+        'Planned Qty', 'Consumed Qty', 'Qty Variance',
+        'Planned Cost', 'Consumed Cost', 'Cost Variance',
+        'ATA Chapter', 'Material Class'
+    ]
+
+    show_table(display_comparison, {
+        'Planned Cost': currency_column(),
+        'Consumed Cost': currency_column(),
+        'Cost Variance': currency_column(),
+    })
+
+    st.markdown(f"**Showing {len(filtered_comparison)} out of {len(comparison)} parts**")
+
+
+parts_table(comparison)
 
 st.markdown("---")
 st.markdown("*Use the sidebar to select different C-checks or navigate to other pages*")
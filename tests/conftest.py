@@ -0,0 +1,9 @@
+"""
+Shared test setup: makes the app's modules (utils, pages) importable
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
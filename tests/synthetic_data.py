@@ -0,0 +1,136 @@
+"""
+Datasets for the tests: the bundled Excel files and seeded synthetic
+consumption and planned material built around the bundled workpacks, with
+the schema ingest gives them
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import CONSUMABLE_MODES, ROTABLE_MODES
+from utils.ingest import REQUIRED_FILES, extract_registrations, read_dataset, read_header
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKPACKS_FILE = os.path.join(ROOT, 'maintenance_workpacks_final_clean.xlsx')
+UTILIZATION_FILE = os.path.join(ROOT, 'aircraft_utilization.xlsx')
+
+ATA_CHAPTERS = ['05', '12', '21', '25', '27', '29', '32', '52', '71']
+
+
+def read_bundled(path, file_type):
+    """Parse a bundled Excel file as an upload would be"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return read_dataset(data, file_type, read_header(data))
+
+
+def as_ingested(df, file_type):
+    """Apply ingest's declared schema and derived columns to an in-memory frame (see read_dataset)"""
+    config = REQUIRED_FILES[file_type]
+    df = df[[col for col in config['columns'] if col in df.columns]]
+    df = df.astype({col: dtype for col, dtype in config['dtypes'].items() if col in df.columns})
+
+    for col in config['integer_columns']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+
+    for col in config['date_columns']:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    for col, registration_col in config['registration_columns'].items():
+        if col in df.columns:
+            df[registration_col] = extract_registrations(df[col])
+
+    return df
+
+
+def receiver_texts(rng, row_registrations, registrations):
+    """
+    Free-text receivers: a registration in the forms found in the data, several
+    registrations ('OSL ROP'), or filler text; filler words never contain a
+    registration, since the original substring match would find it there and
+    the registration lookup, which takes whole words only, does not (that
+    difference is pinned by test_receiver_registration_must_be_a_whole_word)
+    """
+    fillers = [word for word in ['HANGAR 4', 'line stores', 'SHOP 12', 'bay 3', 'kit']
+               if not any(registration in word.upper() for registration in registrations)]
+    forms = [
+        lambda registration: registration,
+        lambda registration: f'SE-{registration}',
+        lambda registration: f' se-{registration.lower()} hangar',
+        lambda registration: f'{rng.choice(registrations)} {registration}',
+        lambda registration: f'SE-{registration} / se-{rng.choice(registrations).lower()}',
+        lambda registration: fillers[rng.integers(len(fillers))],
+        lambda registration: None,
+    ]
+    return pd.Series([forms[form](registration) for form, registration
+                      in zip(rng.integers(0, len(forms), len(row_registrations)), row_registrations)], dtype=object)
+
+
+def synthetic_consumption(workpacks, n, seed=0):
+    """
+    Raw consumption (before ingest's schema) around the workpacks' windows:
+    rows with a known, unknown or missing wpno_i; delivered inside, around or
+    without a date; at the workpack's or another station; for the workpack's
+    aircraft, another one or none
+    """
+    rng = np.random.default_rng(seed)
+    wp_positions = rng.integers(0, len(workpacks), n)
+    wp = workpacks.iloc[wp_positions].reset_index(drop=True)
+    registrations = np.asarray(workpacks['ac_registr'].dropna().unique(), dtype=str)
+    stations = np.asarray(workpacks['station'].dropna().unique(), dtype=str)
+
+    # Only a third of the workpacks get direct matches: the others are time matched
+    direct = (wp_positions % 3 == 0) & (rng.random(n) < 0.5)
+    wpno = np.where(direct, wp['wpno_i'].to_numpy(dtype=float), np.nan)
+    wpno = np.where(rng.random(n) < 0.05, 990000 + rng.integers(0, 100, n), wpno)
+
+    span = (wp['end_date'] - wp['start_date']).dt.days.to_numpy()
+    offset = rng.integers(-5, 5, n) + np.floor(rng.random(n) * (span + 10)).astype(int)
+    del_date = wp['start_date'] + pd.to_timedelta(offset, unit='D')
+    del_date[rng.random(n) < 0.02] = pd.NaT
+
+    station = np.where(rng.random(n) < 0.8, wp['station'].to_numpy(dtype=object), rng.choice(stations, n))
+    ac_form = rng.random(n)
+    ac_registr = np.where(ac_form < 0.4, wp['ac_registr'].to_numpy(dtype=object),
+                 np.where(ac_form < 0.6, rng.choice(registrations, n), None))
+    # Another third has no aircraft on its rows: those fall back to the receiver
+    ac_registr[wp_positions % 3 == 1] = None
+
+    # Receivers name the workpack's aircraft or, less often, another one
+    receiver_registr = np.where(rng.random(n) < 0.7, wp['ac_registr'].to_numpy(dtype=object),
+                                rng.choice(registrations, n))
+
+    modes = CONSUMABLE_MODES + ROTABLE_MODES + ['ZZ']
+    return pd.DataFrame({
+        'partno': [f'P{i}' for i in rng.integers(0, 500, n)],
+        'qty': rng.choice([-3, -2, -1, 1, 2], n).astype('float32'),
+        'average_price': rng.uniform(1, 2000, n).round(2),
+        'del_date': del_date,
+        'station': station,
+        'vm': rng.choice(modes, n),
+        'wpno_i': wpno,
+        'ac_registr': ac_registr,
+        'receiver': receiver_texts(rng, receiver_registr, registrations),
+        'ata_chapter': rng.choice(ATA_CHAPTERS, n),
+    })
+
+
+def synthetic_planned(workpacks, n, seed=0):
+    """Raw planned material (before ingest's schema) for the workpacks"""
+    rng = np.random.default_rng(seed)
+    qty = rng.integers(1, 10, n).astype(float)
+
+    return pd.DataFrame({
+        'wpno_i': rng.choice(workpacks['wpno_i'].to_numpy(dtype=float), n),
+        'partno': [f'P{i}' for i in rng.integers(0, 500, n)],
+        'qty': qty,
+        'average_price': rng.uniform(1, 2000, n).round(2),
+        'confirmed_qty': np.floor(qty * rng.random(n)),
+        'description': [f'Part {i}' for i in rng.integers(0, 500, n)],
+        'tool': rng.choice(['Y', 'N'], n),
+        'mat_class': rng.choice(['C', 'R', 'E'], n),
+        'externally_provisioned': rng.choice(['Y', 'N'], n),
+    })
@@ -0,0 +1,60 @@
+"""
+Background trainer: a failed key is trained again, on request or once its
+retry delay has passed
+"""
+
+import threading
+import time
+
+from utils import background_training
+from utils.background_training import DONE, FAILED, QUEUED, RUNNING, BackgroundTrainer
+
+
+def wait(trainer, key):
+    """Status of key once its job has finished"""
+    while trainer.status(key)['state'] in (QUEUED, RUNNING):
+        time.sleep(0.01)
+    return trainer.status(key)
+
+
+def failing(progress):
+    raise OSError('No space left on device')
+
+
+def test_failed_key_is_retried_on_request():
+    trainer = BackgroundTrainer()
+    ran = threading.Event()
+
+    trainer.submit('a', failing)
+    assert wait(trainer, 'a')['state'] == FAILED
+
+    # Within the retry delay the failure is kept, not retrained on every rerun
+    assert trainer.submit('a', lambda progress: ran.set())['state'] == FAILED
+    assert not ran.is_set()
+
+    trainer.submit('a', lambda progress: ran.set(), retry=True)
+    assert wait(trainer, 'a')['state'] == DONE
+    assert ran.is_set()
+
+
+def test_failed_key_is_retried_after_backoff(monkeypatch):
+    monkeypatch.setattr(background_training, 'RETRY_DELAY', 0.05)
+    trainer = BackgroundTrainer()
+    ran = threading.Event()
+
+    trainer.submit('a', failing)
+    trainer.submit('a', failing)
+    assert wait(trainer, 'a')['failures'] == 1
+
+    time.sleep(0.06)
+    trainer.submit('a', failing)
+    failed = wait(trainer, 'a')
+    assert failed['failures'] == 2
+
+    # The delay doubled with the second consecutive failure
+    time.sleep(0.06)
+    assert trainer.submit('a', lambda progress: ran.set())['state'] == FAILED
+    time.sleep(max(failed['retry_at'] - time.monotonic(), 0) + 0.01)
+    trainer.submit('a', lambda progress: ran.set())
+    assert wait(trainer, 'a')['state'] == DONE
+    assert ran.is_set()
@@ -0,0 +1,280 @@
+"""
+Parity of the consumption matcher with the original loop
+
+match_consumption_to_workpacks must aggregate the same rows per workpack as the
+loop it replaced (baseline_match below): on the bundled workpacks plus seeded
+synthetic consumption, serial and station-sharded, with and without provenance.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic_data import WORKPACKS_FILE, as_ingested, read_bundled, synthetic_consumption
+from utils import data_loader
+from utils.data_loader import (SCORE_AIRCRAFT, SCORE_DATE, SCORE_DIRECT, SCORE_RECEIVER, _prepare_consumption,
+                               fingerprint_dataframe, match_consumption_to_workpacks)
+
+# Synthetic consumption rows
+N_ROWS = 4000
+SEED = 7
+
+# Columns of the baseline's output, and those its rows are sorted on before comparing
+BASELINE_COLUMNS = ['wpno_i', 'consumed_parts_count', 'consumed_qty', 'consumed_cost', 'consumption_start_date',
+                    'consumption_end_date', 'consumption_station', 'consumption_matched_by',
+                    'consumable_parts_count', 'rotable_parts_count', 'consumable_cost', 'rotable_cost']
+SORT_COLUMNS = ['consumption_matched_by', 'wpno_i', 'consumed_parts_count', 'consumption_start_date']
+
+
+def baseline_match(workpacks_df, consumption_detail_df):
+    """The original row-by-row matcher, kept as the reference"""
+    if consumption_detail_df is None or len(consumption_detail_df) == 0:
+        return None
+
+    consumption = consumption_detail_df.copy()
+    consumption['del_date'] = pd.to_datetime(consumption['del_date'], errors='coerce')
+
+    matched_consumption = []
+
+    def aggregate(wpno, matches, matched_by):
+        return {
+            'wpno_i': wpno,
+            'consumed_parts_count': len(matches),
+            'consumed_qty': matches['qty'].abs().sum(),
+            'consumed_cost': matches['average_price'].sum(),
+            'consumption_start_date': matches['del_date'].min(),
+            'consumption_end_date': matches['del_date'].max(),
+            'consumption_station': matches['station'].mode()[0] if len(matches['station'].mode()) > 0 else matches['station'].iloc[0],
+            'consumption_matched_by': matched_by,
+            'consumable_parts_count': len(matches[matches['material_category'] == 'consumable']),
+            'rotable_parts_count': len(matches[matches['material_category'] == 'rotable']),
+            'consumable_cost': matches[matches['material_category'] == 'consumable']['average_price'].sum(),
+            'rotable_cost': matches[matches['material_category'] == 'rotable']['average_price'].sum(),
+        }
+
+    # Strategy 1: Direct match on wpno_i
+    consumption_with_wpno = consumption[consumption['wpno_i'].notna()].copy()
+
+    if len(consumption_with_wpno) > 0:
+        for wpno in workpacks_df['wpno_i'].unique():
+            if pd.isna(wpno):
+                continue
+
+            matches = consumption_with_wpno[consumption_with_wpno['wpno_i'] == wpno]
+            if len(matches) > 0:
+                matched_consumption.append(aggregate(wpno, matches, 'WPNO_I'))
+
+    # Strategy 2: Time-based matching for rows without wpno_i
+    consumption_no_wpno = consumption[consumption['wpno_i'].isna()].copy()
+
+    if len(consumption_no_wpno) > 0:
+        for idx, wp in workpacks_df.iterrows():
+            if pd.isna(wp['start_date']) or pd.isna(wp['end_date']):
+                continue
+
+            if any(m['wpno_i'] == wp['wpno_i'] and m['consumption_matched_by'] == 'WPNO_I' for m in matched_consumption):
+                continue
+
+            matches = consumption_no_wpno[
+                (consumption_no_wpno['del_date'] >= wp['start_date']) &
+                (consumption_no_wpno['del_date'] <= wp['end_date']) &
+                (consumption_no_wpno['station'] == wp['station'])
+            ]
+
+            if pd.notna(wp['ac_registr']) and 'ac_registr' in consumption_no_wpno.columns:
+                ac_matches = matches[matches['ac_registr'] == wp['ac_registr']]
+                if len(ac_matches) > 0:
+                    matches = ac_matches
+                elif 'receiver' in matches.columns:
+                    receiver_matches = matches[matches['receiver'].str.contains(wp['ac_registr'], na=False, case=False)]
+                    if len(receiver_matches) > 0:
+                        matches = receiver_matches
+
+            if len(matches) > 0:
+                matched_consumption.append(aggregate(wp['wpno_i'], matches, 'TIME+STATION+RECEIVER'))
+
+    if len(matched_consumption) > 0:
+        return pd.DataFrame(matched_consumption)
+    return None
+
+
+def prepare(raw):
+    """Ingest's schema and derived columns, then the app's preprocessing"""
+    raw = as_ingested(raw, 'consumption')
+    return _prepare_consumption(fingerprint_dataframe(raw), raw)
+
+
+def normalized(matched):
+    """Matcher output in a comparable form: baseline columns, sorted rows"""
+    frame = matched[BASELINE_COLUMNS].copy()
+    frame['consumption_station'] = frame['consumption_station'].astype(str)
+    for col in ['consumed_parts_count', 'consumable_parts_count', 'rotable_parts_count']:
+        frame[col] = frame[col].astype(np.int64)
+    for col in ['consumed_qty', 'consumed_cost', 'consumable_cost', 'rotable_cost']:
+        frame[col] = frame[col].astype(float)
+    for col in ['consumption_start_date', 'consumption_end_date']:
+        frame[col] = pd.to_datetime(frame[col]).astype('datetime64[ns]')
+    return frame.sort_values(SORT_COLUMNS).reset_index(drop=True)
+
+
+def assert_same_matches(actual, expected):
+    pd.testing.assert_frame_equal(normalized(actual), normalized(expected), check_exact=False, rtol=1e-9)
+
+
+@pytest.fixture(scope='module')
+def workpacks():
+    return read_bundled(WORKPACKS_FILE, 'workpacks')
+
+
+@pytest.fixture(scope='module')
+def consumption(workpacks):
+    return prepare(synthetic_consumption(workpacks, N_ROWS, SEED))
+
+
+@pytest.fixture(scope='module')
+def expected(workpacks, consumption):
+    return baseline_match(workpacks, consumption)
+
+
+def test_matches_baseline(workpacks, consumption, expected):
+    matched = match_consumption_to_workpacks(workpacks, consumption, workers=1)
+
+    # Both strategies are exercised
+    assert set(expected['consumption_matched_by']) == {'WPNO_I', 'TIME+STATION+RECEIVER'}
+    assert_same_matches(matched, expected)
+
+
+def test_matches_baseline_without_ingest_registration(workpacks, consumption, expected):
+    # Registrations extracted from the receiver at match time instead
+    matched = match_consumption_to_workpacks(workpacks, consumption.drop(columns='receiver_registr'), workers=1)
+    assert_same_matches(matched, expected)
+
+
+def test_sharded_matches_serial(workpacks, consumption, expected, monkeypatch):
+    monkeypatch.setattr(data_loader, 'PARALLEL_MATCH_MIN_ROWS', 0)
+    matched = match_consumption_to_workpacks(workpacks, consumption, workers=2)
+    assert_same_matches(matched, expected)
+
+
+def test_provenance_counts_match_totals(workpacks, consumption):
+    matched, provenance = match_consumption_to_workpacks(workpacks, consumption, workers=1,
+                                                         return_provenance=True)
+
+    # Every score level is exercised: direct, date only, receiver and aircraft
+    assert set(provenance['score']) == {SCORE_DIRECT, SCORE_DATE, SCORE_DATE + SCORE_RECEIVER,
+                                        SCORE_DATE + SCORE_AIRCRAFT}
+
+    counts = provenance.groupby('wpno_i').size()
+    totals = matched.groupby('wpno_i')['consumed_parts_count'].sum()
+    totals.index = totals.index.astype(np.int64)
+    pd.testing.assert_series_equal(counts.sort_index(), totals.sort_index().astype(counts.dtype),
+                                   check_names=False)
+
+
+def test_receiver_naming_several_registrations(workpacks):
+    # A receiver naming another aircraft first ('OSL ROP') still matches the
+    # workpack of the aircraft it names second
+    wp = workpacks[workpacks['ac_registr'].notna()].iloc[[0]]
+    registration = wp['ac_registr'].iloc[0]
+    other = next(r for r in workpacks['ac_registr'].dropna().unique() if r != registration)
+    raw = pd.DataFrame({
+        'partno': ['P1', 'P2', 'P3'],
+        'qty': np.array([-1, -1, -1], dtype='float32'),
+        'average_price': [10.0, 20.0, 40.0],
+        'del_date': [wp['start_date'].iloc[0]] * 3,
+        'station': pd.Series([wp['station'].iloc[0]] * 3, dtype='category'),
+        'vm': pd.Series(['AA'] * 3, dtype='category'),
+        'wpno_i': [np.nan] * 3,
+        'ac_registr': pd.Series([None] * 3, dtype='category'),
+        'receiver': pd.Series([f'{other} {registration}', f'se-{other.lower()}, SE-{registration}', other],
+                              dtype='str'),
+    })
+    consumption = prepare(raw)
+
+    matched = match_consumption_to_workpacks(wp, consumption, workers=1)
+    assert matched['consumed_parts_count'].tolist() == [2]
+    assert matched['consumed_cost'].tolist() == [30.0]
+    assert_same_matches(matched, baseline_match(wp, consumption))
+
+
+def test_receiver_registration_must_be_a_whole_word(workpacks):
+    # Deliberately unlike the original substring match: a registration inside a
+    # longer word ('EUROPE' for ROP, 'ROP1') is not a match, while lower-case
+    # receivers still match as the original case-insensitive search did
+    wp = workpacks[workpacks['ac_registr'].notna()].iloc[[0]]
+    registration = wp['ac_registr'].iloc[0]
+    raw = pd.DataFrame({
+        'partno': ['P1', 'P2', 'P3', 'P4'],
+        'qty': np.array([-1, -1, -1, -1], dtype='float32'),
+        'average_price': [10.0, 20.0, 40.0, 80.0],
+        'del_date': [wp['start_date'].iloc[0]] * 4,
+        'station': pd.Series([wp['station'].iloc[0]] * 4, dtype='category'),
+        'vm': pd.Series(['AA'] * 4, dtype='category'),
+        'wpno_i': [np.nan] * 4,
+        'ac_registr': pd.Series([None] * 4, dtype='category'),
+        'receiver': pd.Series([f'EU{registration}E', f'{registration}1', registration.lower(),
+                               f'se-{registration.lower()} hangar'], dtype='str'),
+    })
+    consumption = prepare(raw)
+
+    matched = match_consumption_to_workpacks(wp, consumption, workers=1)
+    assert matched['consumed_parts_count'].tolist() == [2]
+    assert matched['consumed_cost'].tolist() == [120.0]
+
+    # The original matched all four
+    assert baseline_match(wp, consumption)['consumed_parts_count'].tolist() == [4]
+
+
+def test_exclusive_assigns_each_row_to_its_best_workpack():
+    # Overlapping workpacks at one station: 1 and 2 on the same aircraft (2 nested,
+    # starting later), 3 and 4 on other aircraft, 5 on an aircraft no row names
+    day = pd.Timestamp('2024-01-01')
+    workpacks = pd.DataFrame({
+        'wpno_i': [1.0, 2.0, 3.0, 4.0, 5.0],
+        'station': ['OSL'] * 5,
+        'ac_registr': ['ABC', 'ABC', 'DEF', 'GHI', 'XYZ'],
+        'start_date': [day, day + pd.Timedelta(days=9), day, day, day],
+        'end_date': [day + pd.Timedelta(days=30)] * 5,
+    })
+    raw = pd.DataFrame({
+        'partno': ['P0', 'P1', 'P2', 'P3', 'P4'],
+        'qty': np.array([-1] * 5, dtype='float32'),
+        'average_price': [1.0, 2.0, 4.0, 8.0, 16.0],
+        'del_date': [day + pd.Timedelta(days=d) for d in (14, 14, 14, 19, 4)],
+        'station': pd.Series(['OSL'] * 5, dtype='category'),
+        'vm': pd.Series(['AA'] * 5, dtype='category'),
+        'wpno_i': [np.nan] * 5,
+        'ac_registr': pd.Series(['ABC', 'DEF', None, 'ABC', 'ABC'], dtype='category'),
+        'receiver': pd.Series([None, None, 'SE-GHI', 'GHI', None], dtype='str'),
+    })
+    consumption = prepare(raw)
+
+    shared, shared_provenance = match_consumption_to_workpacks(workpacks, consumption, workers=1,
+                                                               return_provenance=True)
+    assert shared_provenance['row'].duplicated().any()
+
+    matched, provenance = match_consumption_to_workpacks(workpacks, consumption, workers=1, exclusive=True,
+                                                         return_provenance=True)
+
+    # Every time-matched row lands on exactly one workpack
+    assert sorted(provenance['row']) == [0, 1, 2, 3, 4]
+
+    # Aircraft beats receiver (row 3 names GHI but is on ABC) and date only (workpack 5
+    # is a date-only candidate of every row); between equal scores the latest start
+    # before the delivery wins (rows 0 and 3 go to the nested workpack 2, row 4 was
+    # delivered before it started)
+    winners = provenance.set_index('row')['wpno_i'].sort_index()
+    assert winners.tolist() == [2, 3, 4, 2, 1]
+    assert provenance.set_index('row')['score'].sort_index().tolist() == [
+        SCORE_DATE + SCORE_AIRCRAFT, SCORE_DATE + SCORE_AIRCRAFT, SCORE_DATE + SCORE_RECEIVER,
+        SCORE_DATE + SCORE_AIRCRAFT, SCORE_DATE + SCORE_AIRCRAFT,
+    ]
+
+    # Workpack 5 lost all its candidates: it has no consumption at all
+    assert 5 in set(shared['wpno_i'])
+    assert sorted(matched['wpno_i']) == [1, 2, 3, 4]
+    assert matched.set_index('wpno_i')['consumed_cost'].to_dict() == {1: 16.0, 2: 9.0, 3: 2.0, 4: 4.0}
+
+
+def test_no_consumption():
+    assert match_consumption_to_workpacks(pd.DataFrame(), None) is None
@@ -0,0 +1,95 @@
+"""
+Model registry: registration, rollback and release of the active version
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import model_registry
+from utils.feature_engineering import LabelEncoder
+from utils.ml_model import MODEL_PARAMS, MaterialPredictor
+from utils.model_registry import (activate_version, find_version, get_active_version, list_versions,
+                                  load_version, register_model, rollback)
+
+
+@pytest.fixture(scope='module')
+def model():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({
+        'duration_days': rng.integers(5, 40, 40).astype(float),
+        'planned_parts_count': rng.integers(0, 200, 40).astype(float),
+        'aircraft_hours': rng.uniform(1000, 80000, 40),
+    })
+    y = X['planned_parts_count'] * 1.2 + rng.normal(0, 5, 40)
+
+    predictor = MaterialPredictor()
+    predictor.feature_names = list(X.columns)
+    predictor.encoders = {'ac_typ': LabelEncoder(['A320', 'A330'])}
+    predictor.planning_accuracy_factor = 1.2
+    predictor.train(X, y)
+    return predictor
+
+
+def test_register_activates_new_version(model, tmp_path):
+    first = register_model(model, 'a' * 64, MODEL_PARAMS, path=tmp_path)
+    second = register_model(model, 'b' * 64, MODEL_PARAMS, path=tmp_path)
+
+    assert get_active_version(tmp_path)['version'] == second['version'] > first['version']
+    assert find_version('a' * 64, model.feature_names, MODEL_PARAMS, path=tmp_path)['version'] == first['version']
+
+
+def test_register_keeps_pinned_rollback(model, tmp_path):
+    first = register_model(model, 'a' * 64, MODEL_PARAMS, path=tmp_path)
+    register_model(model, 'b' * 64, MODEL_PARAMS, path=tmp_path)
+    assert rollback(tmp_path)['version'] == first['version']
+
+    # A background job finishing after the rollback registers without activating
+    third = register_model(model, 'c' * 64, MODEL_PARAMS, path=tmp_path)
+    active = get_active_version(tmp_path)
+    assert active['version'] == first['version'] and active['pinned']
+    assert find_version('c' * 64, model.feature_names, MODEL_PARAMS, path=tmp_path)['version'] == third['version']
+
+    # Released, the next registration is activated again
+    activate_version(first['version'], pinned=False, path=tmp_path)
+    fourth = register_model(model, 'd' * 64, MODEL_PARAMS, path=tmp_path)
+    assert get_active_version(tmp_path)['version'] == fourth['version']
+    assert [v['version'] for v in list_versions(tmp_path)] == [4, 3, 2, 1]
+
+
+def test_register_skips_version_directory_of_another_writer(model, tmp_path):
+    # Another process reserved v1 and is still writing it
+    (tmp_path / 'v1').mkdir()
+    (tmp_path / 'v1' / 'partial').write_text('in progress')
+
+    record = register_model(model, 'a' * 64, MODEL_PARAMS, path=tmp_path)
+
+    assert record['version'] == 2
+    assert (tmp_path / 'v1' / 'partial').read_text() == 'in progress'
+    assert get_active_version(tmp_path)['version'] == 2
+
+
+def test_concurrent_registrations_keep_every_version(model, tmp_path):
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        records = list(pool.map(
+            lambda i: register_model(model, f'{i:064d}', MODEL_PARAMS, path=tmp_path), range(4)
+        ))
+
+    versions = sorted(record['version'] for record in records)
+    assert versions == [1, 2, 3, 4]
+    assert sorted(v['version'] for v in list_versions(tmp_path)) == versions
+    for version in versions:
+        assert load_version(version, tmp_path) is not None
+
+
+def test_lookups_search_a_read_version_list(model, tmp_path, monkeypatch):
+    first = register_model(model, 'a' * 64, MODEL_PARAMS, path=tmp_path)
+    versions = list_versions(tmp_path)
+
+    # One read of the index serves both lookups
+    monkeypatch.setattr(model_registry, '_read_index', None)
+    assert get_active_version(versions=versions)['version'] == first['version']
+    assert find_version('a' * 64, model.feature_names, MODEL_PARAMS, versions=versions)['version'] == first['version']
+    assert find_version('b' * 64, model.feature_names, MODEL_PARAMS, versions=versions) is None
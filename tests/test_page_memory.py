@@ -0,0 +1,88 @@
+"""
+Peak Python allocation (tracemalloc) of a full render of every page, checked
+against a budget relative to the size of the uploaded datasets
+
+The datasets are the bundled workpacks and utilization plus seeded synthetic
+consumption and planned material.
+"""
+
+import glob
+import os
+import time
+import tracemalloc
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from synthetic_data import (ROOT, UTILIZATION_FILE, WORKPACKS_FILE, as_ingested, read_bundled,
+                            synthetic_consumption, synthetic_planned)
+from utils import model_registry
+from utils.background_training import QUEUED, RUNNING
+from utils.ml_model import TRAINING_JOB_KEY, _get_trainer
+
+# Peak allocation allowed for one page rerun, as a multiple of the datasets' footprint
+BUDGET_FACTOR = 2.0
+
+# Synthetic rows
+CONSUMPTION_ROWS = 100_000
+PLANNED_ROWS = 25_000
+
+PAGES = [os.path.join(ROOT, 'app.py')] + sorted(
+    page for page in glob.glob(os.path.join(ROOT, 'pages', '*.py')) if 'Data_Upload' not in page
+)
+
+
+@pytest.fixture(scope='module')
+def session():
+    workpacks = read_bundled(WORKPACKS_FILE, 'workpacks')
+    return {
+        'uploaded_workpacks': workpacks,
+        'uploaded_utilization': read_bundled(UTILIZATION_FILE, 'utilization'),
+        'uploaded_consumption': as_ingested(synthetic_consumption(workpacks, CONSUMPTION_ROWS, seed=1), 'consumption'),
+        'uploaded_planned': as_ingested(synthetic_planned(workpacks, PLANNED_ROWS, seed=2), 'planned'),
+    }
+
+
+@pytest.fixture(scope='module', autouse=True)
+def registry(tmp_path_factory):
+    # Models trained by the Material Prediction page go to a scratch registry
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(model_registry, 'REGISTRY_PATH', tmp_path_factory.mktemp('registry'))
+        yield
+
+
+def render(page, session):
+    """Render a page and return (peak traced allocation in bytes, AppTest)"""
+    app = AppTest.from_file(page, default_timeout=600)
+    for key, df in session.items():
+        app.session_state[key] = df
+
+    tracemalloc.start()
+    app.run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert len(app.exception) == 0, f"{os.path.basename(page)} raised: {app.exception[0].value}"
+    return peak, app
+
+
+def wait_for_training(app):
+    """Let a training job the render started finish, so it allocates outside the measured rerun"""
+    if TRAINING_JOB_KEY not in app.session_state:
+        return
+    key = app.session_state[TRAINING_JOB_KEY]
+    while _get_trainer().status(key)['state'] in (QUEUED, RUNNING):
+        time.sleep(0.1)
+
+
+@pytest.mark.parametrize('page', PAGES, ids=os.path.basename)
+def test_page_rerun_within_budget(page, session):
+    dataset_bytes = sum(df.memory_usage(index=False, deep=True).sum() for df in session.values())
+    budget = BUDGET_FACTOR * dataset_bytes
+
+    # First render builds the shared caches; the rerun is the steady state
+    _, app = render(page, session)
+    wait_for_training(app)
+    rerun, _ = render(page, session)
+
+    assert rerun <= budget, f"rerun peak {rerun / 1e6:.1f} MB over budget {budget / 1e6:.1f} MB"
@@ -0,0 +1,31 @@
+"""
+Quantile regression forest intervals against a direct computation of the
+training sample weights
+"""
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from utils.uncertainty import QUANTILES, build_forest_stats, forest_leaves, forest_quantiles
+
+
+def test_forest_quantiles_match_weighted_training_targets():
+    rng = np.random.default_rng(0)
+    X_train = rng.normal(size=(200, 4))
+    y_train = rng.poisson(20, 200).astype(float)
+    X = rng.normal(size=(50, 4))
+
+    forest = RandomForestRegressor(n_estimators=30, min_samples_leaf=2, random_state=0).fit(X_train, y_train)
+    stats = build_forest_stats(forest, X_train, y_train)
+    quantiles = forest_quantiles(stats, forest_leaves(stats, X))
+
+    # Leaves from scikit-learn itself: weight of a training sample is its mean share of the row's leaf
+    train_leaves = forest.apply(X_train.astype(np.float32))
+    row_leaves = forest.apply(X.astype(np.float32))
+    order = np.argsort(y_train, kind='stable')
+    for row, leaves in enumerate(row_leaves):
+        shared = train_leaves == leaves
+        weights = (shared / shared.sum(axis=0)).mean(axis=1)[order]
+        cumulative = np.cumsum(weights)
+        expected = [y_train[order][np.searchsorted(cumulative, level - 1e-9)] for level in QUANTILES]
+        np.testing.assert_array_equal(quantiles[row], expected)
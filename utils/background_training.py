@@ -0,0 +1,97 @@
+"""
+SAS Material Supply Analysis - Background Training Module
+Runs model training off the page script: one worker thread per process trains
+one job per training data fingerprint, reporting progress that pages poll
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Seconds before a failed key is trained again, doubled per consecutive failure
+RETRY_DELAY = 30
+RETRY_MAX_DELAY = 600
+
+
+class BackgroundTrainer:
+    """
+    Single worker thread training models in the background
+
+    Jobs are keyed (by training data fingerprint): a key is trained once, and
+    its status stays available to every session. A failed key is trained again
+    once its retry delay has passed (RETRY_DELAY, doubled per consecutive
+    failure up to RETRY_MAX_DELAY), or at once on request. Training functions
+    publish their result themselves (e.g. by registering the model).
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-training')
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, key, train, *args, retry=False):
+        """
+        Queue train(*args, progress=callback) unless key is queued or running
+        already, or failed within its retry delay (a finished key is trained
+        again: its result is gone)
+
+        The callback takes (fraction, message), fraction between 0 and 1.
+
+        Args:
+            retry: train a failed key again without waiting for its retry delay
+
+        Returns:
+            the job's status (see status)
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            failures = 0
+
+            if job is not None and job['state'] == FAILED:
+                if not retry and time.monotonic() < job['retry_at']:
+                    return dict(job)
+                failures = job['failures']
+            elif job is not None and job['state'] != DONE:
+                return dict(job)
+
+            job = {'key': key, 'state': QUEUED, 'progress': 0.0, 'message': 'Waiting to start', 'error': None,
+                   'failures': failures, 'retry_at': None}
+            self._jobs[key] = job
+
+        self._executor.submit(self._run, job, train, args)
+        return dict(job)
+
+    def status(self, key):
+        """
+        Status of the job for key: dict with key, state (QUEUED, RUNNING, DONE
+        or FAILED), progress (0 - 1), message, error, failures (consecutive
+        failed attempts) and retry_at (time.monotonic() from which a failed key
+        is trained again), or None if there is none
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            return dict(job) if job is not None else None
+
+    def _run(self, job, train, args):
+        def progress(fraction, message):
+            with self._lock:
+                job.update(state=RUNNING, progress=fraction, message=message)
+
+        progress(0.0, 'Starting')
+        try:
+            train(*args, progress=progress)
+        except Exception as e:
+            with self._lock:
+                delay = min(RETRY_DELAY * 2 ** job['failures'], RETRY_MAX_DELAY)
+                job.update(state=FAILED, message='Training failed', error=str(e),
+                           failures=job['failures'] + 1, retry_at=time.monotonic() + delay)
+            print(f"Background training failed: {e}")
+        else:
+            with self._lock:
+                job.update(state=DONE, progress=1.0, message='Model ready')
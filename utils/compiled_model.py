@@ -0,0 +1,126 @@
+"""
+SAS Material Supply Analysis - Compiled Model Module
+Export of a trained MaterialPredictor to flat NumPy arrays (one .npy file per
+array, memory-mapped on load) plus a small JSON file, and the NumPy-only
+predictor serving them: loading needs neither scikit-learn nor unpickling
+"""
+
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from .feature_engineering import LabelEncoder
+from .predictor import ForestPredictor
+
+# Compiled model directory
+COMPILED_PATH = Path(__file__).parent.parent / 'models' / 'material_predictor'
+
+# Bumped when the exported arrays or metadata change; other versions are not loaded
+COMPILED_FORMAT = 2
+
+# Arrays of build_forest_stats stored as .npy files
+FOREST_ARRAYS = ['feature', 'threshold', 'left', 'right', 'values',
+                 'leaf_offsets', 'leaf_samples', 'inv_sizes', 'targets']
+
+# Metadata file, written last: a directory without it is incomplete
+METADATA_FILE = 'model.json'
+
+
+def export_compiled(predictor, path=None):
+    """
+    Compile a trained predictor to a model directory
+
+    Args:
+        predictor: trained MaterialPredictor (with forest_stats)
+        path: target directory (default COMPILED_PATH), replaced if it exists
+    """
+    if path is None:
+        path = COMPILED_PATH
+
+    # Write next to the target, then swap it in
+    staging = path.with_name(path.name + '.partial')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    for name in FOREST_ARRAYS:
+        np.save(staging / f'{name}.npy', np.ascontiguousarray(predictor.forest_stats[name]))
+    np.save(staging / 'scaler_mean.npy', np.asarray(predictor.scaler.mean_, dtype=float))
+    np.save(staging / 'scaler_scale.npy', np.asarray(predictor.scaler.scale_, dtype=float))
+
+    stats = dict(predictor.training_stats)
+    np.save(staging / 'feature_importance.npy', np.asarray(stats.pop('feature_importance'), dtype=float))
+
+    metadata = {
+        'format': COMPILED_FORMAT,
+        'feature_names': list(predictor.feature_names),
+        'encoders': {name: [str(c) for c in encoder.classes_] for name, encoder in predictor.encoders.items()},
+        'training_stats': {key: value.item() if isinstance(value, np.generic) else value
+                           for key, value in stats.items()},
+        'planning_accuracy_factor': float(predictor.planning_accuracy_factor),
+        'depth': int(predictor.forest_stats['depth']),
+    }
+    with open(staging / METADATA_FILE, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    staging.rename(path)
+
+    print(f"Compiled model saved to {path}")
+
+
+class CompiledPredictor(ForestPredictor):
+    """
+    Material predictor served from compiled arrays, with the same predictions
+    as the MaterialPredictor it was exported from
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.scaler_mean = None
+        self.scaler_scale = None
+
+    def scale(self, X):
+        """
+        Standardize features as StandardScaler.transform does
+        """
+        return (np.asarray(X, dtype=float) - self.scaler_mean) / self.scaler_scale
+
+    @staticmethod
+    def load(path=None):
+        """
+        Load a compiled model, memory-mapping its arrays
+
+        Returns:
+            CompiledPredictor, or None if there is no complete model of the
+            current format at path
+        """
+        if path is None:
+            path = COMPILED_PATH
+
+        metadata_file = path / METADATA_FILE
+        if not metadata_file.exists():
+            return None
+
+        with open(metadata_file) as f:
+            metadata = json.load(f)
+
+        if metadata.get('format') != COMPILED_FORMAT:
+            return None
+
+        model = CompiledPredictor()
+        model.feature_names = metadata['feature_names']
+        model.encoders = {name: LabelEncoder(classes) for name, classes in metadata['encoders'].items()}
+        model.planning_accuracy_factor = metadata['planning_accuracy_factor']
+
+        model.training_stats = dict(metadata['training_stats'])
+        model.training_stats['feature_importance'] = np.load(path / 'feature_importance.npy')
+
+        model.forest_stats = {name: np.load(path / f'{name}.npy', mmap_mode='r') for name in FOREST_ARRAYS}
+        model.forest_stats['depth'] = metadata['depth']
+        model.scaler_mean = np.load(path / 'scaler_mean.npy')
+        model.scaler_scale = np.load(path / 'scaler_scale.npy')
+
+        print(f"Compiled model loaded from {path}")
+        return model
@@ -0,0 +1,177 @@
+"""
+SAS Material Supply Analysis - Aggregate Cube Module
+Additive C-check measures over aircraft type x station x check type x month,
+rolled up to answer dashboard filters without rescanning the master view, and
+the calendar dimension its periods are labelled with
+"""
+
+import numpy as np
+import pandas as pd
+
+# Cube dimensions: the dashboard filters and groupings, plus data availability flags
+# (utilization / consumption / planned material present)
+CUBE_DIMENSIONS = ['ac_typ', 'station', 'check_type', 'month_key',
+                   'has_utilization', 'has_consumption', 'has_planned']
+
+# Integer period keys: month_key = YYYYMM, quarter_key = YYYYQ, year = YYYY
+PERIOD_KEYS = ['month_key', 'quarter_key', 'year']
+
+# Calendar column holding the display label of each period key
+PERIOD_LABELS = {'month_key': 'month_label', 'quarter_key': 'quarter_label', 'year': 'year'}
+
+# Master view columns summarized per cell
+CUBE_MEASURES = [
+    'consumed_parts_count', 'consumed_cost', 'planned_parts_count', 'planned_cost',
+    'planning_accuracy', 'parts_variance', 'cost_variance', 'duration_days',
+    'aircraft_hours', 'aircraft_cycles',
+]
+
+# Per measure: non-null count, sum, sum of squares (additive) and min / max
+# (also exact under roll-up)
+_MEASURE_AGGREGATES = {'n': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max'}
+
+
+def period_keys(dates):
+    """
+    Integer period keys (PERIOD_KEYS) of a date column, as nullable Int32 so a
+    missing date gives missing keys
+    """
+    dates = pd.to_datetime(dates)
+    month_key = dates.dt.year.astype('Int32') * 100 + dates.dt.month.astype('Int32')
+    return pd.DataFrame({key: roll_month_key(month_key, key) for key in PERIOD_KEYS}, index=dates.index)
+
+
+def roll_month_key(month_key, period_key):
+    """Map month keys (YYYYMM) to the month_key, quarter_key or year they fall in"""
+    year = month_key // 100
+    if period_key == 'year':
+        return year
+    if period_key == 'quarter_key':
+        return year * 10 + (month_key % 100 - 1) // 3 + 1
+    return month_key
+
+
+def build_calendar(month_keys):
+    """
+    Calendar dimension: one row per month from the first to the last month key,
+    with the quarter and year it rolls up to and the display labels
+
+    Returns:
+        DataFrame with PERIOD_KEYS, month_label ('2024-03') and quarter_label ('2024Q1')
+    """
+    keys = pd.Series(month_keys).dropna().astype(int)
+    if len(keys) == 0:
+        ordinals = np.array([], dtype=int)
+    else:
+        first, last = keys.min(), keys.max()
+        ordinals = np.arange((first // 100) * 12 + first % 100 - 1, (last // 100) * 12 + last % 100)
+
+    year = pd.Series(ordinals // 12, dtype='int32')
+    month = pd.Series(ordinals % 12 + 1, dtype='int32')
+    month_key = year * 100 + month
+
+    return pd.DataFrame({
+        'month_key': month_key,
+        'quarter_key': roll_month_key(month_key, 'quarter_key'),
+        'year': year,
+        'month_label': year.astype(str) + '-' + month.astype(str).str.zfill(2),
+        'quarter_label': year.astype(str) + 'Q' + ((month - 1) // 3 + 1).astype(str),
+    })
+
+
+def calendar_labels(calendar, period_key):
+    """Display label per key of one period level: Series indexed by period_key"""
+    periods = calendar.drop_duplicates(period_key)
+    return pd.Series(periods[PERIOD_LABELS[period_key]].to_numpy(), index=periods[period_key].to_numpy())
+
+
+def build_cube(checks):
+    """
+    Aggregate check rows into cube cells
+
+    Args:
+        checks: master view rows (one per check, with period keys)
+
+    Returns:
+        DataFrame with one row per non-empty cell: CUBE_DIMENSIONS, 'checks' (row
+        count) and {measure}_n / _sum / _sumsq / _min / _max for every measure
+    """
+    frame = {
+        'ac_typ': checks['ac_typ'].to_numpy(),
+        'station': checks['station'].to_numpy(),
+        'check_type': checks['check_type'].to_numpy(),
+        'month_key': checks['month_key'].to_numpy(),
+        'has_utilization': checks['aircraft_hours'].notna().to_numpy(),
+        'has_consumption': checks['consumed_parts_count'].notna().to_numpy(),
+        'has_planned': checks['planned_parts_count'].notna().to_numpy(),
+        'checks': np.ones(len(checks), dtype=np.int64),
+    }
+    aggregates = {'checks': 'sum'}
+
+    for measure in CUBE_MEASURES:
+        values = checks[measure].to_numpy(dtype=float)
+        frame[f'{measure}_n'] = (~np.isnan(values)).astype(np.int64)
+        frame[f'{measure}_sum'] = values
+        frame[f'{measure}_sumsq'] = values * values
+        frame[f'{measure}_min'] = values
+        frame[f'{measure}_max'] = values
+        for stat, func in _MEASURE_AGGREGATES.items():
+            aggregates[f'{measure}_{stat}'] = func
+
+    frame = pd.DataFrame(frame)
+    frame['month_key'] = frame['month_key'].astype('Int32')
+
+    return frame.groupby(CUBE_DIMENSIONS, dropna=False, sort=True).agg(aggregates).reset_index()
+
+
+def roll_up(cube, by=None, where=None, dropna=True):
+    """
+    Roll cube cells up to coarser groups
+
+    Args:
+        cube: output of build_cube
+        by: dimensions to group on (None = grand total); 'quarter_key' and 'year'
+            are rolled up from month_key
+        where: dict of dimension -> value; cells not matching are left out
+        dropna: drop groups with a missing key (as DataFrame.groupby)
+
+    Returns:
+        DataFrame indexed by `by` (a Series for the grand total) with 'checks' and,
+        per measure, the additive columns plus {measure}_mean and {measure}_std
+        (sample standard deviation), exactly as a groupby over the check rows
+        would give up to floating point rounding
+    """
+    cells = cube
+    for dim, value in (where or {}).items():
+        cells = cells[cells[dim] == value]
+
+    for key in ('quarter_key', 'year'):
+        if by and key in by:
+            cells = cells.assign(**{key: roll_month_key(cells['month_key'], key)})
+
+    aggregates = {col: func for col, func in
+                  [('checks', 'sum')] + [(f'{m}_{stat}', func) for m in CUBE_MEASURES
+                                         for stat, func in _MEASURE_AGGREGATES.items()]}
+
+    if by:
+        rolled = cells.groupby(by, dropna=dropna, observed=True, sort=True).agg(aggregates)
+    else:
+        rolled = pd.DataFrame({col: [cells[col].agg(func)] for col, func in aggregates.items()})
+
+    derived = {}
+    for measure in CUBE_MEASURES:
+        n = rolled[f'{measure}_n'].to_numpy(dtype=float)
+        total = rolled[f'{measure}_sum'].to_numpy(dtype=float)
+        sumsq = rolled[f'{measure}_sumsq'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            derived[f'{measure}_mean'] = np.where(n > 0, total / n, np.nan)
+            variance = np.where(n > 1, (sumsq - total * total / n) / (n - 1), np.nan)
+        derived[f'{measure}_std'] = np.sqrt(np.maximum(variance, 0))
+
+    rolled = pd.concat([rolled, pd.DataFrame(derived, index=rolled.index)], axis=1)
+
+    if by:
+        return rolled
+
+    # Grand total: keep each value's own type (counts stay integers)
+    return pd.Series({col: rolled[col].iloc[0] for col in rolled.columns}, dtype=object)
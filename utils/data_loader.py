@@ -3,20 +3,87 @@ SAS Material Supply Analysis - Data Loader Module
 Handles loading data from session state (uploaded files)
 """
 
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 
+from utils.cube import build_calendar, build_cube, period_keys
+from utils.ingest import extract_registration, extract_registrations, registration_pairs
+
+# Copy-on-Write (the default from pandas 3): filtered frames and shallow copies share
+# data with their parent until written to, so the data layer hands out views without
+# defensive copies
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Session state key holding {session_key: content fingerprint} for every uploaded dataset
+FINGERPRINTS_KEY = 'dataset_fingerprints'
+
+# Cached results are keyed on content fingerprints; keep a few data versions around
+CACHE_MAX_ENTRIES = 8
+
+# Session state keys of the four uploaded datasets
+UPLOAD_KEYS = [
+    'uploaded_workpacks',
+    'uploaded_utilization',
+    'uploaded_consumption',
+    'uploaded_planned'
+]
+
+# Session state key holding (data version, master view) for this session
+MASTER_VIEW_KEY = 'master_view'
+
+# Voucher modes kept from the consumption upload
+CONSUMABLE_MODES = ['AA', 'EA', 'AS', 'ES']
+ROTABLE_MODES = ['YA', 'YE']
+
+# Parallel time-based matching: worker processes, and the row count below which
+# the process pool start-up (~1-2 s) costs more than it saves (the serial matcher
+# handles ~2M unmatched rows per second)
+MATCH_WORKERS = min(4, os.cpu_count() or 1)
+PARALLEL_MATCH_MIN_ROWS = 3_000_000
+
+# Columns read by the time-based matcher (shipped to worker processes)
+MATCH_WORKPACK_COLUMNS = ['wpno_i', 'station', 'ac_registr', 'start_date', 'end_date']
+MATCH_ROW_COLUMNS = ['station', 'ac_registr', 'del_date', 'receiver_registr']
+
+# Match scores of time-based candidates (additive): the row's date falls in the
+# workpack window, the row is on the workpack's aircraft, or its receiver names it
+SCORE_DATE = 1
+SCORE_RECEIVER = 2
+SCORE_AIRCRAFT = 4
+
+# Score of a direct wpno_i match (outranks any time-based score)
+SCORE_DIRECT = 8
+
+# Match strategies recorded in the provenance table, and their consumption_matched_by label
+STRATEGY_DIRECT = 1
+STRATEGY_TIME = 2
+MATCH_STRATEGIES = {STRATEGY_DIRECT: 'WPNO_I', STRATEGY_TIME: 'TIME+STATION+RECEIVER'}
+
+# Columns of the match provenance table (one row per matched consumption row and workpack)
+PROVENANCE_COLUMNS = ['row', 'wpno_i', 'strategy', 'score']
+
+# Session state key of the exclusive matching setting (see match_consumption_to_workpacks)
+EXCLUSIVE_MATCHING_KEY = 'exclusive_matching'
+
+# Output columns of match_consumption_to_workpacks (one row per matched workpack)
+MATCH_COLUMNS = [
+    'wpno_i', 'consumed_parts_count', 'consumed_qty', 'consumed_cost',
+    'consumption_start_date', 'consumption_end_date', 'consumption_station',
+    'consumption_matched_by', 'consumable_parts_count', 'rotable_parts_count',
+    'consumable_cost', 'rotable_cost',
+]
+
 
 def is_data_uploaded():
     """Check if all required data files have been uploaded"""
-    required_keys = [
-        'uploaded_workpacks',
-        'uploaded_utilization',
-        'uploaded_consumption',
-        'uploaded_planned'
-    ]
-    return all(key in st.session_state and st.session_state[key] is not None for key in required_keys)
+    return all(key in st.session_state and st.session_state[key] is not None for key in UPLOAD_KEYS)
 
 
 def get_missing_uploads():
@@ -46,25 +113,67 @@ def show_upload_required():
     st.stop()
 
 
-@st.cache_data
+def fingerprint_bytes(data):
+    """Content hash of an uploaded file's raw bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def fingerprint_dataframe(df):
+    """Content hash of a DataFrame (used when no file fingerprint was recorded)"""
+    digest = hashlib.sha256()
+    digest.update(','.join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def get_uploaded_dataset(session_key):
+    """Get an uploaded DataFrame from session state, or None if it is missing"""
+    return st.session_state.get(session_key)
+
+
+def get_dataset_fingerprint(session_key):
+    """
+    Get the content fingerprint of an uploaded dataset
+    Fingerprints are recorded by the upload page; frames stored without one are hashed once here
+    """
+    fingerprints = st.session_state.setdefault(FINGERPRINTS_KEY, {})
+
+    if session_key not in fingerprints:
+        df = get_uploaded_dataset(session_key)
+        if df is None:
+            return None
+        fingerprints[session_key] = fingerprint_dataframe(df)
+
+    return fingerprints[session_key]
+
+
 def load_workpacks():
     """
     Load maintenance workpacks from session state
     Returns: DataFrame with workpacks or None
     """
-    if 'uploaded_workpacks' not in st.session_state or st.session_state['uploaded_workpacks'] is None:
+    raw = get_uploaded_dataset('uploaded_workpacks')
+    if raw is None:
         return None
 
-    try:
-        df = st.session_state['uploaded_workpacks'].copy()
+    return _process_workpacks(get_dataset_fingerprint('uploaded_workpacks'), raw)
+
 
-        # Convert dates
-        df['start_date'] = pd.to_datetime(df['start_date'], errors='coerce')
-        df['end_date'] = pd.to_datetime(df['end_date'], errors='coerce')
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def _process_workpacks(fingerprint, _raw):
+    """Cached body of load_workpacks, keyed on the uploaded file's fingerprint"""
+    try:
+        # Dates are parsed at ingest (utils/ingest.py)
+        df = _raw.copy(deep=False)
 
         # Calculate duration
         df['duration_days'] = (df['end_date'] - df['start_date']).dt.total_seconds() / (24*3600)
 
+        # Integer period keys of the start date (labels in get_calendar)
+        keys = period_keys(df['start_date'])
+        for col in keys.columns:
+            df[col] = keys[col]
+
         # Ensure required boolean columns exist
         if 'is_eol' not in df.columns:
             df['is_eol'] = 0
@@ -78,57 +187,74 @@ def load_workpacks():
         return None
 
 
-@st.cache_data
 def load_utilization():
     """
     Load aircraft utilization data from session state
     Returns: DataFrame with utilization data or None
     """
-    if 'uploaded_utilization' not in st.session_state or st.session_state['uploaded_utilization'] is None:
+    # Dates are parsed at ingest (utils/ingest.py), and Copy-on-Write keeps the
+    # upload unchanged by callers: the dataset is served as uploaded
+    return get_uploaded_dataset('uploaded_utilization')
+
+
+def get_prepared_consumption():
+    """
+    Get the preprocessed consumption records (see _prepare_consumption)
+    Returns: shared DataFrame (read-only, do not modify) or None
+    """
+    raw = get_uploaded_dataset('uploaded_consumption')
+    if raw is None:
         return None
 
+    return _prepare_consumption(get_dataset_fingerprint('uploaded_consumption'), raw)
+
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def _prepare_consumption(fingerprint, _raw):
+    """
+    Single preprocessing pass over the uploaded consumption records, shared by
+    the aggregated and detailed loaders and the workpack matcher:
+    - keeps consumables (AA, EA, AS, ES) and rotables (YA, YE)
+    - material_category: 'consumable' / 'rotable'
+    - abs_qty: absolute quantity
+    - is_consumed / is_returned: qty < 0 (used) / qty > 0 (returned)
+    del_date is already parsed at ingest (utils/ingest.py).
+    """
     try:
-        df = st.session_state['uploaded_utilization'].copy()
+        df = _raw[_raw['vm'].isin(CONSUMABLE_MODES + ROTABLE_MODES)]
 
-        # Convert date
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        qty = df['qty'].to_numpy()
+        df['material_category'] = np.where(df['vm'].isin(CONSUMABLE_MODES), 'consumable', 'rotable')
+        df['abs_qty'] = np.abs(qty)
+        df['is_consumed'] = qty < 0
+        df['is_returned'] = qty > 0
 
         return df
 
     except Exception as e:
-        st.error(f"Error processing utilization: {str(e)}")
+        st.error(f"Error processing consumption: {str(e)}")
         return None
 
 
-@st.cache_data
 def load_consumption():
     """
     Load material consumption data from session state
     Filters for consumables (AA, EA, AS, ES) and rotables (YA, YE)
     Returns: DataFrame aggregated by wpno_i with date/station validation
     """
-    if 'uploaded_consumption' not in st.session_state or st.session_state['uploaded_consumption'] is None:
+    prepared = get_prepared_consumption()
+    if prepared is None:
         return None
 
-    try:
-        df = st.session_state['uploaded_consumption'].copy()
-
-        # Convert dates
-        df['del_date'] = pd.to_datetime(df['del_date'], errors='coerce')
+    return _process_consumption(get_dataset_fingerprint('uploaded_consumption'), prepared)
 
-        # Filter for consumables (AA, EA, AS, ES) and rotables (YA, YE)
-        consumable_modes = ['AA', 'EA', 'AS', 'ES']
-        rotable_modes = ['YA', 'YE']
-
-        df_filtered = df[df['vm'].isin(consumable_modes + rotable_modes)].copy()
-
-        # Separate consumables and rotables
-        df_filtered['material_category'] = df_filtered['vm'].apply(
-            lambda x: 'consumable' if x in consumable_modes else 'rotable'
-        )
 
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def _process_consumption(fingerprint, _prepared):
+    """Cached body of load_consumption, keyed on the uploaded file's fingerprint"""
+    try:
         # Remove rows without wpno_i for direct matching
-        df_clean = df_filtered[df_filtered['wpno_i'].notna()].copy()
+        df_clean = _prepared[_prepared['wpno_i'].notna()]
 
         if len(df_clean) == 0:
             return None
@@ -136,7 +262,7 @@ def load_consumption():
         # Aggregate by workpack with date and station info
         agg_df = df_clean.groupby('wpno_i').agg({
             'partno': 'count',
-            'qty': lambda x: abs(x).sum(),
+            'abs_qty': 'sum',
             'average_price': 'sum',
             'del_date': ['min', 'max'],
             'station': lambda x: x.mode()[0] if len(x.mode()) > 0 else x.iloc[0]
@@ -155,51 +281,32 @@ def load_consumption():
         return None
 
 
-@st.cache_data
 def load_consumption_detailed():
     """
-    Load detailed material consumption from session state
-    Returns: DataFrame with all consumption records
+    Load detailed material consumption (consumables and rotables) from session state
+    Returns: shared DataFrame with all consumption records (read-only, do not modify)
     """
-    if 'uploaded_consumption' not in st.session_state or st.session_state['uploaded_consumption'] is None:
-        return None
-
-    try:
-        df = st.session_state['uploaded_consumption'].copy()
-        df['del_date'] = pd.to_datetime(df['del_date'], errors='coerce')
+    return get_prepared_consumption()
 
-        # Filter for consumables (AA, EA, AS, ES) and rotables (YA, YE)
-        consumable_modes = ['AA', 'EA', 'AS', 'ES']
-        rotable_modes = ['YA', 'YE']
-
-        df_filtered = df[df['vm'].isin(consumable_modes + rotable_modes)].copy()
-
-        # Add material category
-        df_filtered['material_category'] = df_filtered['vm'].apply(
-            lambda x: 'consumable' if x in consumable_modes else 'rotable'
-        )
-
-        return df_filtered
-
-    except Exception as e:
-        st.error(f"Error processing detailed consumption: {str(e)}")
-        return None
 
-
-@st.cache_data
 def load_planned_material():
     """
     Load planned material data from session state
     Returns: DataFrame aggregated by wpno_i
     """
-    if 'uploaded_planned' not in st.session_state or st.session_state['uploaded_planned'] is None:
+    raw = get_uploaded_dataset('uploaded_planned')
+    if raw is None:
         return None
 
-    try:
-        df = st.session_state['uploaded_planned'].copy()
+    return _process_planned_material(get_dataset_fingerprint('uploaded_planned'), raw)
 
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def _process_planned_material(fingerprint, _raw):
+    """Cached body of load_planned_material, keyed on the uploaded file's fingerprint"""
+    try:
         # Remove rows without wpno_i
-        df_clean = df[df['wpno_i'].notna()].copy()
+        df_clean = _raw[_raw['wpno_i'].notna()]
 
         # Ensure confirmed_qty exists
         if 'confirmed_qty' not in df_clean.columns:
@@ -225,17 +332,23 @@ def load_planned_material():
         return None
 
 
-@st.cache_data
 def load_planned_material_detailed():
     """
     Load detailed planned material from session state
     Returns: DataFrame with all planned material records
     """
-    if 'uploaded_planned' not in st.session_state or st.session_state['uploaded_planned'] is None:
+    raw = get_uploaded_dataset('uploaded_planned')
+    if raw is None:
         return None
 
+    return _process_planned_material_detailed(get_dataset_fingerprint('uploaded_planned'), raw)
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def _process_planned_material_detailed(fingerprint, _raw):
+    """Cached body of load_planned_material_detailed, keyed on the uploaded file's fingerprint"""
     try:
-        df = st.session_state['uploaded_planned'].copy()
+        df = _raw.copy(deep=False)
 
         # Ensure optional columns exist
         if 'description' not in df.columns:
@@ -256,109 +369,501 @@ def load_planned_material_detailed():
         return None
 
 
-def match_consumption_to_workpacks(workpacks_df, consumption_detail_df):
+class WorkpackIndex:
+    """
+    Rows of a detail table sorted by wpno_i plus an offsets table, so the lines of
+    one workpack come back as a slice instead of a boolean scan over the full table
+    """
+
+    def __init__(self, df):
+        keyed = df[df['wpno_i'].notna()]
+        order = np.argsort(keyed['wpno_i'].to_numpy(), kind='stable')
+        self.rows = keyed.iloc[order]
+
+        keys, starts, counts = np.unique(
+            self.rows['wpno_i'].to_numpy(), return_index=True, return_counts=True
+        )
+        self.offsets = {key: (start, start + count) for key, start, count in zip(keys.tolist(), starts, counts)}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lookup(self, wpno_i):
+        """Get all rows for one workpack (empty frame if it has none)"""
+        start, stop = self.offsets.get(wpno_i, (0, 0))
+        return self.rows.iloc[start:stop]
+
+    def lookup_many(self, wpnos):
+        """Get all rows for several workpacks"""
+        bounds = [self.offsets[w] for w in pd.unique(pd.Series(wpnos).dropna()) if w in self.offsets]
+        if len(bounds) == 0:
+            return self.rows.iloc[0:0]
+        positions = np.concatenate([np.arange(start, stop) for start, stop in bounds])
+        return self.rows.iloc[positions]
+
+
+def get_planned_material_index():
+    """
+    Get the per-workpack index over detailed planned material (built once per upload)
+    Returns: WorkpackIndex or None
+    """
+    if get_uploaded_dataset('uploaded_planned') is None:
+        return None
+
+    return _build_planned_material_index(get_dataset_fingerprint('uploaded_planned'))
+
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def _build_planned_material_index(fingerprint):
+    """Cached body of get_planned_material_index, keyed on the upload fingerprint"""
+    planned_detail = load_planned_material_detailed()
+    if planned_detail is None:
+        return None
+    return WorkpackIndex(planned_detail)
+
+
+def match_consumption_to_workpacks(workpacks_df, consumption_detail_df, workers=None, exclusive=False,
+                                   return_provenance=False):
     """
     Match consumption to workpacks using two strategies:
     1. Direct match on wpno_i (when available)
     2. Time-based match on del_date + station + receiver/aircraft (when wpno_i is missing)
+
+    workers: processes for the station-sharded time-based match (default MATCH_WORKERS)
+    exclusive: assign each time-matched row to at most one workpack (the best scoring
+        candidate, see assign_exclusive) instead of to every overlapping workpack;
+        a workpack that loses all its rows has no time-based consumption
+    return_provenance: also return the row-level provenance table (see
+        build_match_provenance) as a second value
     """
     if consumption_detail_df is None or len(consumption_detail_df) == 0:
-        return None
-
-    # Prepare consumption data
-    consumption = consumption_detail_df.copy()
-    consumption['del_date'] = pd.to_datetime(consumption['del_date'], errors='coerce')
+        return (None, build_match_provenance([])) if return_provenance else None
 
-    matched_consumption = []
+    # Preprocessed once (dates, abs_qty, material_category): read, never modified
+    consumption = consumption_detail_df
 
     # Strategy 1: Direct match on wpno_i (for rows that have wpno_i)
-    consumption_with_wpno = consumption[consumption['wpno_i'].notna()].copy()
-
-    if len(consumption_with_wpno) > 0:
-        for wpno in workpacks_df['wpno_i'].unique():
-            if pd.isna(wpno):
-                continue
-
-            matches = consumption_with_wpno[consumption_with_wpno['wpno_i'] == wpno]
-
-            if len(matches) > 0:
-                agg = {
-                    'wpno_i': wpno,
-                    'consumed_parts_count': len(matches),
-                    'consumed_qty': matches['qty'].abs().sum(),
-                    'consumed_cost': matches['average_price'].sum(),
-                    'consumption_start_date': matches['del_date'].min(),
-                    'consumption_end_date': matches['del_date'].max(),
-                    'consumption_station': matches['station'].mode()[0] if len(matches['station'].mode()) > 0 else matches['station'].iloc[0],
-                    'consumption_matched_by': 'WPNO_I',
-                    'consumable_parts_count': len(matches[matches['material_category'] == 'consumable']),
-                    'rotable_parts_count': len(matches[matches['material_category'] == 'rotable']),
-                    'consumable_cost': matches[matches['material_category'] == 'consumable']['average_price'].sum(),
-                    'rotable_cost': matches[matches['material_category'] == 'rotable']['average_price'].sum(),
-                }
-                matched_consumption.append(agg)
+    direct_positions, direct_codes, wpno_index = direct_match_positions(workpacks_df, consumption)
+    direct_matched = _aggregate_matches(consumption, direct_positions, direct_codes, wpno_index,
+                                        MATCH_STRATEGIES[STRATEGY_DIRECT])
 
     # Strategy 2: Time-based matching for rows without wpno_i
-    consumption_no_wpno = consumption[consumption['wpno_i'].isna()].copy()
-
-    if len(consumption_no_wpno) > 0:
-        for idx, wp in workpacks_df.iterrows():
-            if pd.isna(wp['start_date']) or pd.isna(wp['end_date']):
-                continue
-
-            # Skip if already matched by wpno_i
-            if any(m['wpno_i'] == wp['wpno_i'] and m['consumption_matched_by'] == 'WPNO_I' for m in matched_consumption):
-                continue
-
-            # Find consumption that matches this workpack by time + station + receiver/aircraft
-            matches = consumption_no_wpno[
-                (consumption_no_wpno['del_date'] >= wp['start_date']) &
-                (consumption_no_wpno['del_date'] <= wp['end_date']) &
-                (consumption_no_wpno['station'] == wp['station'])
-            ]
-
-            # Additional filters by receiver or aircraft
-            if pd.notna(wp['ac_registr']) and 'ac_registr' in consumption_no_wpno.columns:
-                ac_matches = matches[matches['ac_registr'] == wp['ac_registr']]
-                if len(ac_matches) > 0:
-                    matches = ac_matches
-                elif 'receiver' in matches.columns:
-                    receiver_matches = matches[matches['receiver'].str.contains(wp['ac_registr'], na=False, case=False)]
-                    if len(receiver_matches) > 0:
-                        matches = receiver_matches
-
-            if len(matches) > 0:
-                agg = {
-                    'wpno_i': wp['wpno_i'],
-                    'consumed_parts_count': len(matches),
-                    'consumed_qty': matches['qty'].abs().sum(),
-                    'consumed_cost': matches['average_price'].sum(),
-                    'consumption_start_date': matches['del_date'].min(),
-                    'consumption_end_date': matches['del_date'].max(),
-                    'consumption_station': matches['station'].mode()[0] if len(matches['station'].mode()) > 0 else matches['station'].iloc[0],
-                    'consumption_matched_by': 'TIME+STATION+RECEIVER',
-                    'consumable_parts_count': len(matches[matches['material_category'] == 'consumable']),
-                    'rotable_parts_count': len(matches[matches['material_category'] == 'rotable']),
-                    'consumable_cost': matches[matches['material_category'] == 'consumable']['average_price'].sum(),
-                    'rotable_cost': matches[matches['material_category'] == 'rotable']['average_price'].sum(),
-                }
-                matched_consumption.append(agg)
-
-    if len(matched_consumption) > 0:
-        return pd.DataFrame(matched_consumption)
-    else:
+    no_wpno = np.flatnonzero(consumption['wpno_i'].isna().to_numpy())
+    consumption_no_wpno = consumption.iloc[no_wpno]
+    time_positions, time_codes, time_scores = time_match_positions(
+        workpacks_df, consumption_no_wpno, skip_wpnos=set(direct_matched['wpno_i']), workers=workers
+    )
+
+    if exclusive:
+        keep = assign_exclusive(time_positions, time_codes, time_scores, workpacks_df['start_date'])
+        time_positions, time_codes, time_scores = time_positions[keep], time_codes[keep], time_scores[keep]
+
+    time_matched = _aggregate_matches(consumption_no_wpno, time_positions, time_codes, workpacks_df['wpno_i'],
+                                      MATCH_STRATEGIES[STRATEGY_TIME])
+
+    matched = [df for df in (direct_matched, time_matched) if len(df) > 0]
+    matched = pd.concat(matched, ignore_index=True) if len(matched) > 0 else None
+
+    if not return_provenance:
+        return matched
+
+    provenance = build_match_provenance([
+        (direct_positions, np.asarray(wpno_index)[direct_codes], STRATEGY_DIRECT,
+         np.full(len(direct_positions), SCORE_DIRECT, dtype=np.int8)),
+        (no_wpno[time_positions], workpacks_df['wpno_i'].to_numpy()[time_codes], STRATEGY_TIME, time_scores),
+    ])
+    return matched, provenance
+
+
+def direct_match_positions(workpacks_df, consumption):
+    """
+    Find the consumption rows that carry the wpno_i of a known workpack
+
+    Returns:
+        (positions, codes, wpno_index): positional row index into consumption and
+        position of its wpno_i in wpno_index for every match
+    """
+    # Position of each consumption row's wpno_i in the workpack list (-1 = no match)
+    wpno_index = pd.Index(workpacks_df['wpno_i'].dropna().unique())
+    codes = wpno_index.get_indexer(consumption['wpno_i'])
+    positions = np.flatnonzero(codes >= 0)
+
+    return positions, codes[positions], wpno_index
+
+
+def build_match_provenance(parts):
+    """
+    Build the row-level provenance table of a matching run
+
+    Args:
+        parts: (rows, wpnos, strategy, scores) per strategy, where rows are positions
+            into the detailed consumption and wpnos the matched workpack per row
+
+    Returns:
+        DataFrame with PROVENANCE_COLUMNS (integer columns only), one row per
+        matched (consumption row, workpack) pair, ordered by wpno_i
+    """
+    frames = []
+    for rows, wpnos, strategy, scores in parts:
+        wpnos = np.asarray(wpnos, dtype=float)
+        # Workpacks without a wpno_i cannot be looked up, so leave them out
+        keep = ~np.isnan(wpnos)
+        frames.append(pd.DataFrame({
+            'row': np.asarray(rows, dtype=np.int64)[keep],
+            'wpno_i': wpnos[keep].astype(np.int64),
+            'strategy': np.full(int(keep.sum()), strategy, dtype=np.int8),
+            'score': np.asarray(scores, dtype=np.int8)[keep],
+        }))
+
+    if len(frames) == 0:
+        return pd.DataFrame({
+            'row': np.array([], dtype=np.int64),
+            'wpno_i': np.array([], dtype=np.int64),
+            'strategy': np.array([], dtype=np.int8),
+            'score': np.array([], dtype=np.int8),
+        })
+
+    provenance = pd.concat(frames, ignore_index=True)
+    order = np.argsort(provenance['wpno_i'].to_numpy(), kind='stable')
+    return provenance.iloc[order].reset_index(drop=True)
+
+
+def time_match_positions(workpacks_df, rows, skip_wpnos=(), workers=None):
+    """
+    Find the time-based matches between workpacks and consumption rows
+
+    Matching only ever pairs rows and workpacks at the same station, so large
+    inputs are sharded by station across a process pool (workers, default
+    MATCH_WORKERS). Small inputs, a single worker or a single station run serially.
+
+    Returns:
+        (positions, codes, scores): positional row index into rows, workpack position
+        and match score (SCORE_*) for every match, ordered by workpack position
+    """
+    if workers is None:
+        workers = MATCH_WORKERS
+
+    if workers <= 1 or len(rows) < PARALLEL_MATCH_MIN_ROWS:
+        return _time_match_serial(workpacks_df, rows, skip_wpnos)
+
+    # Group row and workpack positions by station
+    row_station, stations = pd.factorize(rows['station'])
+    wp_station = stations.get_indexer(workpacks_df['station'])
+
+    row_order = np.argsort(row_station, kind='stable')
+    row_bounds = np.searchsorted(row_station[row_order], np.arange(len(stations) + 1))
+    wp_order = np.argsort(wp_station, kind='stable')
+    wp_bounds = np.searchsorted(wp_station[wp_order], np.arange(len(stations) + 1))
+
+    shards = []
+    for k in range(len(stations)):
+        row_positions = row_order[row_bounds[k]:row_bounds[k + 1]]
+        wp_positions = wp_order[wp_bounds[k]:wp_bounds[k + 1]]
+        if len(row_positions) > 0 and len(wp_positions) > 0:
+            shards.append((wp_positions, row_positions))
+
+    if len(shards) <= 1:
+        return _time_match_serial(workpacks_df, rows, skip_wpnos)
+
+    # Largest shards first so workers finish close together
+    shards.sort(key=lambda shard: len(shard[1]), reverse=True)
+
+    # Ship only the columns the matcher reads
+    wp_columns = [col for col in MATCH_WORKPACK_COLUMNS if col in workpacks_df.columns]
+    row_columns = [col for col in MATCH_ROW_COLUMNS if col in rows.columns]
+    workpack_data = workpacks_df[wp_columns]
+    row_data = rows[row_columns]
+    if 'receiver_registr' not in row_data.columns and 'receiver' in rows.columns:
+        row_data = row_data.assign(receiver_registr=extract_registrations(rows['receiver']).to_numpy())
+
+    context = multiprocessing.get_context('spawn')
+    results = [None] * len(shards)
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=context) as pool:
+        futures = {
+            pool.submit(_time_match_serial, workpack_data.iloc[wp_positions],
+                        row_data.iloc[row_positions], skip_wpnos): i
+            for i, (wp_positions, row_positions) in enumerate(shards)
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    # Map shard-local positions back and restore workpack order (stable, so the
+    # rows of each workpack keep the order of the serial matcher)
+    positions = np.concatenate([shard[1][result[0]] for shard, result in zip(shards, results)])
+    codes = np.concatenate([shard[0][result[1]] for shard, result in zip(shards, results)])
+    scores = np.concatenate([result[2] for result in results])
+    order = np.argsort(codes, kind='stable')
+
+    return positions[order], codes[order], scores[order]
+
+
+def _time_match_serial(workpacks_df, rows, skip_wpnos=()):
+    """
+    Serial time-based matcher (see time_match_positions)
+
+    Rows are sorted once per station and per station + aircraft; each workpack's
+    date window is then found with a binary search instead of a full scan.
+    """
+    valid_wp = (
+        workpacks_df['start_date'].notna().to_numpy() &
+        workpacks_df['end_date'].notna().to_numpy() &
+        ~workpacks_df['wpno_i'].isin(skip_wpnos).to_numpy()
+    )
+
+    if len(rows) == 0 or not valid_wp.any():
+        return _no_matches()
+
+    wp_start = workpacks_df['start_date'].to_numpy(dtype='datetime64[ns]')
+    wp_end = workpacks_df['end_date'].to_numpy(dtype='datetime64[ns]')
+    row_dates = rows['del_date'].to_numpy(dtype='datetime64[ns]')
+
+    # Windows on the same station
+    station_codes, station_index = pd.factorize(rows['station'])
+    wp_station = station_index.get_indexer(workpacks_df['station'])
+    station_order, station_lo, station_hi = _date_windows(
+        station_codes, row_dates, wp_station, wp_start, wp_end
+    )
+
+    # Windows on the same station and aircraft
+    has_ac_column = 'ac_registr' in rows.columns
+    if has_ac_column:
+        ac_codes, ac_index = pd.factorize(rows['ac_registr'])
+        pair_codes = np.where((station_codes >= 0) & (ac_codes >= 0),
+                              station_codes * len(ac_index) + ac_codes, -1)
+        wp_ac = ac_index.get_indexer(workpacks_df['ac_registr'])
+        wp_pair = np.where((wp_station >= 0) & (wp_ac >= 0), wp_station * len(ac_index) + wp_ac, -1)
+        ac_order, ac_lo, ac_hi = _date_windows(pair_codes, row_dates, wp_pair, wp_start, wp_end)
+
+    # Windows on the same station and receiver registration: every registration a
+    # receiver names is hashed to a code once, giving one (row, registration) pair
+    # each, so the receiver fallback is a lookup, not a text scan
+    registrations = _receiver_registrations(rows)
+    has_receiver = registrations is not None
+    if has_receiver:
+        recv_rows, recv_names = registration_pairs(registrations)
+        recv_codes, recv_index = pd.factorize(pd.Series(recv_names))
+        recv_station = station_codes[recv_rows]
+        recv_pair = np.where(recv_station >= 0, recv_station * len(recv_index) + recv_codes, -1)
+        wp_recv = recv_index.get_indexer(extract_registration(workpacks_df['ac_registr']).to_numpy())
+        wp_recv_pair = np.where((wp_station >= 0) & (wp_recv >= 0), wp_station * len(recv_index) + wp_recv, -1)
+        recv_order, recv_lo, recv_hi = _date_windows(recv_pair, row_dates[recv_rows], wp_recv_pair,
+                                                     wp_start, wp_end)
+        # Pair positions back to row positions
+        recv_order = recv_rows[recv_order]
+
+    wp_registr = workpacks_df['ac_registr'].to_numpy()
+
+    matched_rows = []
+    matched_wps = []
+    matched_scores = []
+
+    for i in np.flatnonzero(valid_wp):
+        matches = station_order[station_lo[i]:station_hi[i]]
+        score = SCORE_DATE
+
+        # Additional filters by receiver or aircraft
+        if has_ac_column and pd.notna(wp_registr[i]):
+            ac_matches = ac_order[ac_lo[i]:ac_hi[i]]
+            if len(ac_matches) > 0:
+                matches = ac_matches
+                score = SCORE_DATE + SCORE_AIRCRAFT
+            elif has_receiver:
+                receiver_matches = recv_order[recv_lo[i]:recv_hi[i]]
+                if len(receiver_matches) > 0:
+                    matches = receiver_matches
+                    score = SCORE_DATE + SCORE_RECEIVER
+
+        if len(matches) > 0:
+            matched_rows.append(matches)
+            matched_wps.append(np.full(len(matches), i))
+            matched_scores.append(np.full(len(matches), score, dtype=np.int8))
+
+    if len(matched_rows) == 0:
+        return _no_matches()
+
+    return np.concatenate(matched_rows), np.concatenate(matched_wps), np.concatenate(matched_scores)
+
+
+def _receiver_registrations(rows):
+    """Text naming each row's receiver registrations (extracted at ingest when available)"""
+    if 'receiver_registr' in rows.columns:
+        return rows['receiver_registr']
+    if 'receiver' in rows.columns:
+        return rows['receiver']
+    return None
+
+
+def _no_matches():
+    return np.array([], dtype=np.intp), np.array([], dtype=np.intp), np.array([], dtype=np.int8)
+
+
+def assign_exclusive(positions, codes, scores, wp_start):
+    """
+    Keep one workpack per consumption row among its time-based candidates
+
+    The best candidate has the highest score (aircraft > receiver > date only);
+    ties go to the workpack that started most recently before the delivery
+    (the most specific of nested or overlapping packages), then to the first
+    workpack. One sort over the candidate pairs, so it stays O(m log m).
+
+    A workpack whose every candidate goes to a better workpack keeps no rows:
+    it ends up with no time-based consumption at all.
+
+    Args:
+        positions, codes, scores: candidate pairs from time_match_positions
+        wp_start: start_date per workpack position
+
+    Returns:
+        indices of the kept pairs, in their original (workpack) order
+    """
+    if len(positions) == 0:
+        return np.array([], dtype=np.intp)
+
+    start = np.asarray(wp_start, dtype='datetime64[ns]').astype(np.int64)[codes]
+    order = np.lexsort((codes, -start, -scores.astype(np.int64), positions))
+
+    sorted_positions = positions[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_positions[1:] != sorted_positions[:-1]
+
+    return np.sort(order[first])
+
+
+def _date_windows(row_keys, row_dates, wp_keys, wp_start, wp_end):
+    """
+    Sort rows by (key, date) and find, for every workpack, the slice of rows with the
+    same key and start <= date <= end. Rows with key -1 or a missing date never match.
+    Returns: (order, lo, hi) so that order[lo[i]:hi[i]] are the row positions for workpack i
+    """
+    usable = np.flatnonzero((row_keys >= 0) & ~np.isnat(row_dates))
+    order = usable[np.lexsort((row_dates[usable], row_keys[usable]))]
+    sorted_keys = row_keys[order]
+    sorted_dates = row_dates[order]
+
+    lo = np.zeros(len(wp_keys), dtype=np.intp)
+    hi = np.zeros(len(wp_keys), dtype=np.intp)
+
+    for key in np.unique(wp_keys[wp_keys >= 0]):
+        block_start = np.searchsorted(sorted_keys, key, side='left')
+        block_end = np.searchsorted(sorted_keys, key, side='right')
+        block = sorted_dates[block_start:block_end]
+        wp = np.flatnonzero(wp_keys == key)
+        lo[wp] = block_start + np.searchsorted(block, wp_start[wp], side='left')
+        hi[wp] = block_start + np.searchsorted(block, wp_end[wp], side='right')
+
+    # Workpacks with missing dates get an empty window
+    hi = np.where(np.isnat(wp_start) | np.isnat(wp_end), lo, np.maximum(hi, lo))
+
+    return order, lo, hi
+
+
+def _aggregate_matches(consumption, positions, codes, wpno_values, matched_by):
+    """
+    Aggregate matched consumption rows per workpack in one grouped pass
+
+    Args:
+        consumption: consumption rows
+        positions: positional row index into consumption for every match
+        codes: workpack position (into wpno_values) for every match
+        wpno_values: wpno_i per workpack position
+        matched_by: value for the consumption_matched_by column
+
+    Returns: DataFrame with MATCH_COLUMNS, ordered by workpack position
+    """
+    if len(positions) == 0:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+
+    # Gather only the needed columns for the matched rows
+    is_consumable = (consumption['material_category'] == 'consumable').to_numpy()[positions]
+    is_rotable = ~is_consumable
+    price = consumption['average_price'].to_numpy(dtype=float)[positions]
+
+    frame = pd.DataFrame({
+        'code': codes,
+        'qty': consumption['abs_qty'].to_numpy()[positions],
+        'cost': price,
+        'del_date': consumption['del_date'].to_numpy()[positions],
+        'consumable': is_consumable,
+        'rotable': is_rotable,
+        'consumable_cost': np.where(is_consumable, price, 0.0),
+        'rotable_cost': np.where(is_rotable, price, 0.0),
+    })
+
+    agg = frame.groupby('code').agg(
+        consumed_parts_count=('qty', 'size'),
+        consumed_qty=('qty', 'sum'),
+        consumed_cost=('cost', 'sum'),
+        consumption_start_date=('del_date', 'min'),
+        consumption_end_date=('del_date', 'max'),
+        consumable_parts_count=('consumable', 'sum'),
+        rotable_parts_count=('rotable', 'sum'),
+        consumable_cost=('consumable_cost', 'sum'),
+        rotable_cost=('rotable_cost', 'sum'),
+    )
+
+    # Most frequent station per workpack (ties resolved like Series.mode: smallest value)
+    stations = pd.DataFrame({'code': codes, 'station': consumption['station'].to_numpy()[positions]}).dropna()
+    station_counts = stations.groupby(['code', 'station'], observed=True).size().reset_index(name='n')
+    station_counts = station_counts.sort_values(['code', 'n', 'station'], ascending=[True, False, True])
+    agg['consumption_station'] = station_counts.drop_duplicates('code').set_index('code')['station']
+
+    agg['wpno_i'] = np.asarray(wpno_values)[agg.index]
+    agg['consumption_matched_by'] = matched_by
+
+    return agg[MATCH_COLUMNS].reset_index(drop=True)
+
+
+def get_data_version():
+    """
+    Identify the current data version: the fingerprints of all uploaded datasets
+    Returns: tuple of fingerprints or None if data not uploaded
+    """
+    if not is_data_uploaded():
         return None
 
+    return tuple(get_dataset_fingerprint(key) for key in UPLOAD_KEYS)
+
 
 def get_master_view():
     """
-    Create a master view by joining all datasets
+    Get the master view for the uploaded data (computed once per data version)
     Returns: DataFrame with workpacks + utilization + consumption + planned
+
+    The frame is shared between reruns, pages and sessions with the same data:
+    treat it as read-only. Under Copy-on-Write, filtered subsets of it can be
+    modified without a defensive copy.
     """
-    # Check if data is uploaded
-    if not is_data_uploaded():
+    version = get_data_version()
+
+    if version is None:
         return None
 
+    exclusive = st.session_state.get(EXCLUSIVE_MATCHING_KEY, False)
+
+    # Per-session memo avoids even the cache lookup on every rerun
+    memo = st.session_state.get(MASTER_VIEW_KEY)
+    if memo is not None and memo[0] == (version, exclusive):
+        return memo[1]
+
+    master = _build_master_view(version, exclusive)
+    st.session_state[MASTER_VIEW_KEY] = ((version, exclusive), master)
+
+    return master
+
+
+def invalidate_cached_views():
+    """Drop this session's materialized views (call after uploads change)"""
+    st.session_state.pop(MASTER_VIEW_KEY, None)
+
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def _build_master_view(version, exclusive=False):
+    """
+    Create a master view by joining all datasets
+    Cached on the data version and matching mode so the matching and merges run
+    once per upload
+    """
     # Load all datasets
     workpacks = load_workpacks()
     utilization = load_utilization()
@@ -369,7 +874,7 @@ def get_master_view():
         return None
 
     # Start with workpacks
-    master = workpacks.copy()
+    master = workpacks
 
     # Add latest utilization data
     if utilization is not None:
@@ -377,7 +882,7 @@ def get_master_view():
 
     # Add consumption data - MATCHED BY TIME + STATION
     if consumption_detail is not None:
-        consumption_matched = match_consumption_to_workpacks(master, consumption_detail)
+        consumption_matched = _build_consumption_matches(version, exclusive)[0]
 
         if consumption_matched is not None:
             master = master.merge(consumption_matched, on='wpno_i', how='left')
@@ -407,38 +912,179 @@ def get_master_view():
     return master
 
 
-def add_utilization_data(workpacks_df, utilization_df):
+def get_calendar():
     """
-    Add latest utilization data (hours, cycles) to workpacks
+    Get the calendar dimension over the workpack start months (built once per upload)
+    Returns: DataFrame with one row per month (see utils.cube.build_calendar) or None
+    """
+    if get_uploaded_dataset('uploaded_workpacks') is None:
+        return None
+
+    return _build_calendar(get_dataset_fingerprint('uploaded_workpacks'))
+
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def _build_calendar(fingerprint):
+    """Cached body of get_calendar, keyed on the upload fingerprint"""
+    workpacks = load_workpacks()
+    if workpacks is None:
+        return None
+    return build_calendar(workpacks['month_key'])
+
+
+def get_c_check_cube():
+    """
+    Get the aggregate cube over the master view's C-checks (built once per data
+    version and matching mode); roll it up with utils.cube.roll_up
+    Returns: DataFrame of cube cells or None if data not uploaded
     """
-    def get_latest_util(row):
-        ac_registr = row['ac_registr']
-        start_date = row['start_date']
+    version = get_data_version()
 
-        if pd.isna(ac_registr) or pd.isna(start_date):
-            return pd.Series({'aircraft_hours': np.nan, 'aircraft_cycles': np.nan})
+    if version is None:
+        return None
 
-        ac_util = utilization_df[utilization_df['ac_registr'] == ac_registr].copy()
+    exclusive = st.session_state.get(EXCLUSIVE_MATCHING_KEY, False)
+    return _build_c_check_cube(version, exclusive)
 
-        if len(ac_util) == 0:
-            return pd.Series({'aircraft_hours': np.nan, 'aircraft_cycles': np.nan})
 
-        ac_util = ac_util[ac_util['date'] <= start_date]
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def _build_c_check_cube(version, exclusive=False):
+    """Cached body of get_c_check_cube"""
+    master = _build_master_view(version, exclusive)
+    if master is None:
+        return None
+    return build_cube(master[master['is_c_check'] == 1])
+
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def _build_consumption_matches(version, exclusive=False):
+    """
+    Match consumption to workpacks once per data version and matching mode
+    Returns: (per-workpack aggregates or None, provenance table)
+    """
+    workpacks = load_workpacks()
+    consumption_detail = load_consumption_detailed()
 
-        if len(ac_util) == 0:
-            ac_util = utilization_df[utilization_df['ac_registr'] == ac_registr].copy()
-            ac_util = ac_util.sort_values('date')
-            if len(ac_util) > 0:
-                latest = ac_util.iloc[0]
-                return pd.Series({'aircraft_hours': latest['tah'], 'aircraft_cycles': latest['tac']})
-            return pd.Series({'aircraft_hours': np.nan, 'aircraft_cycles': np.nan})
+    if workpacks is None:
+        return None, build_match_provenance([])
+
+    return match_consumption_to_workpacks(workpacks, consumption_detail, exclusive=exclusive,
+                                          return_provenance=True)
+
+
+def get_match_provenance():
+    """
+    Get the row-level provenance of the consumption matching behind the master view
+    Returns: DataFrame with PROVENANCE_COLUMNS or None if data not uploaded
+
+    'row' is the position of the line in load_consumption_detailed(); the table is
+    shared between sessions, treat it as read-only.
+    """
+    version = get_data_version()
+
+    if version is None:
+        return None
+
+    exclusive = st.session_state.get(EXCLUSIVE_MATCHING_KEY, False)
+    return _build_consumption_matches(version, exclusive)[1]
+
+
+def get_matched_consumption(wpno_i):
+    """
+    Get the consumption lines matched to one workpack by either strategy, i.e. the
+    exact lines behind its consumed_* aggregates in the master view
+    Returns: DataFrame of detailed consumption plus matched_wpno_i, match_strategy
+    and match_score columns, or None if data not uploaded
+    """
+    return _get_matched_lines(lambda index: index.lookup(wpno_i))
 
-        latest = ac_util.sort_values('date', ascending=False).iloc[0]
-        return pd.Series({'aircraft_hours': latest['tah'], 'aircraft_cycles': latest['tac']})
 
-    util_data = workpacks_df.apply(get_latest_util, axis=1)
-    workpacks_df['aircraft_hours'] = util_data['aircraft_hours']
-    workpacks_df['aircraft_cycles'] = util_data['aircraft_cycles']
+def get_matched_consumption_many(wpnos):
+    """
+    Get the consumption lines matched to several workpacks (see get_matched_consumption);
+    a line matched to more than one of them is returned once per workpack, as it
+    counts towards each one's aggregates
+    Returns: DataFrame or None if data not uploaded
+    """
+    return _get_matched_lines(lambda index: index.lookup_many(wpnos))
+
+
+def _get_matched_lines(lookup):
+    """Detailed consumption lines of the provenance rows lookup(index) selects"""
+    version = get_data_version()
+
+    if version is None:
+        return None
+
+    consumption_detail = load_consumption_detailed()
+    if consumption_detail is None:
+        return None
+
+    exclusive = st.session_state.get(EXCLUSIVE_MATCHING_KEY, False)
+    matches = lookup(_build_provenance_index(version, exclusive))
+
+    lines = consumption_detail.iloc[matches['row'].to_numpy()]
+    lines['matched_wpno_i'] = matches['wpno_i'].to_numpy()
+    lines['match_strategy'] = matches['strategy'].map(MATCH_STRATEGIES).to_numpy()
+    lines['match_score'] = matches['score'].to_numpy()
+
+    return lines
+
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def _build_provenance_index(version, exclusive=False):
+    """Per-workpack index over the match provenance table"""
+    return WorkpackIndex(_build_consumption_matches(version, exclusive)[1])
+
+
+def add_utilization_data(workpacks_df, utilization_df):
+    """
+    Add latest utilization data (hours, cycles) to workpacks
+
+    Uses an as-of join per aircraft: the latest record on or before start_date,
+    falling back to the aircraft's earliest record when none precede it.
+    """
+    hours = np.full(len(workpacks_df), np.nan)
+    cycles = np.full(len(workpacks_df), np.nan)
+
+    util = utilization_df[utilization_df['ac_registr'].notna()]
+    util = util.sort_values('date', kind='stable')
+
+    left = pd.DataFrame({
+        'pos': np.arange(len(workpacks_df)),
+        'ac_registr': workpacks_df['ac_registr'].to_numpy(),
+        'start_date': workpacks_df['start_date'].to_numpy(dtype='datetime64[ns]'),
+    })
+    left = left[left['ac_registr'].notna() & left['start_date'].notna()]
+    left = left[left['ac_registr'].isin(util['ac_registr'])].sort_values('start_date', kind='stable')
+
+    right = pd.DataFrame({
+        'ac_registr': util['ac_registr'].to_numpy(),
+        'date': util['date'].to_numpy(dtype='datetime64[ns]'),
+        'tah': util['tah'].to_numpy(),
+        'tac': util['tac'].to_numpy(),
+    })
+    right['ac_registr'] = right['ac_registr'].astype(left['ac_registr'].dtype)
+
+    if len(left) > 0:
+        # Latest record on or before start_date
+        latest = pd.merge_asof(
+            left, right[right['date'].notna()],
+            left_on='start_date', right_on='date', by='ac_registr', direction='backward'
+        )
+
+        # No record before start_date: use the aircraft's earliest record
+        earliest = right.drop_duplicates('ac_registr').set_index('ac_registr')
+        before_first = latest['date'].isna().to_numpy()
+        fallback = earliest.loc[latest.loc[before_first, 'ac_registr']]
+        latest.loc[before_first, 'tah'] = fallback['tah'].to_numpy()
+        latest.loc[before_first, 'tac'] = fallback['tac'].to_numpy()
+
+        hours[latest['pos'].to_numpy()] = latest['tah'].to_numpy(dtype=float)
+        cycles[latest['pos'].to_numpy()] = latest['tac'].to_numpy(dtype=float)
+
+    workpacks_df['aircraft_hours'] = hours
+    workpacks_df['aircraft_cycles'] = cycles
     workpacks_df['hours_per_cycle'] = workpacks_df['aircraft_hours'] / workpacks_df['aircraft_cycles']
 
     return workpacks_df
@@ -449,9 +1095,6 @@ def get_data_completeness():
     Get statistics about data completeness
     Returns: dict with completeness metrics or None if data not uploaded
     """
-    if not is_data_uploaded():
-        return None
-
     master = get_master_view()
 
     if master is None:
@@ -487,7 +1130,9 @@ def get_consumption_by_category():
     consumables = consumption_detail[consumption_detail['material_category'] == 'consumable']
     rotables = consumption_detail[consumption_detail['material_category'] == 'rotable']
 
-    vm_counts = consumption_detail['vm'].value_counts().to_dict()
+    # vm is categorical: drop voucher modes filtered out above
+    vm_counts = consumption_detail['vm'].value_counts()
+    vm_counts = vm_counts[vm_counts > 0].to_dict()
 
     return {
         'total_records': len(consumption_detail),
@@ -0,0 +1,58 @@
+"""
+SAS Material Supply Analysis - Table Display Module
+Shared table rendering: numeric columns stay numeric and are formatted by
+st.column_config in the browser, so they sort by value; text that is really
+needed (selector labels) is built with vectorized string operations
+"""
+
+import pandas as pd
+import streamlit as st
+
+
+def currency_column(decimals=2, **kwargs):
+    """Euro amount column, e.g. '€1,234.57'"""
+    return st.column_config.NumberColumn(format=f"€%,.{decimals}f", **kwargs)
+
+
+def number_column(decimals=0, **kwargs):
+    """Number column with thousand separators, e.g. '1,234'"""
+    return st.column_config.NumberColumn(format=f"%,.{decimals}f", **kwargs)
+
+
+def percent_column(decimals=1, **kwargs):
+    """Column of values already in percent, e.g. 87.5 -> '87.5%'"""
+    return st.column_config.NumberColumn(format=f"%.{decimals}f%%", **kwargs)
+
+
+def date_column(**kwargs):
+    """Date column shown as '2024-03-01'"""
+    return st.column_config.DateColumn(format="YYYY-MM-DD", **kwargs)
+
+
+def show_table(df, columns=None):
+    """
+    Display a table at full width without the index
+
+    Args:
+        df: DataFrame to show, with numeric columns left numeric
+        columns: dict of column name -> column config (e.g. currency_column())
+    """
+    st.dataframe(
+        df,
+        width='stretch',
+        hide_index=True,
+        column_config=columns
+    )
+
+
+def format_dates(dates, missing='N/A'):
+    """Format a date column as 'YYYY-MM-DD' strings, missing dates as `missing`"""
+    return pd.to_datetime(dates).dt.strftime('%Y-%m-%d').fillna(missing)
+
+
+def check_labels(checks):
+    """Selector label per check: 'wpno - registration (type) - start date'"""
+    return (
+        checks['wpno'].astype(str) + ' - ' + checks['ac_registr'].astype(str)
+        + ' (' + checks['ac_typ'].astype(str) + ') - ' + format_dates(checks['start_date'])
+    )
@@ -5,7 +5,22 @@ Creates features for ML model training
 
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import LabelEncoder
+
+
+class LabelEncoder:
+    """
+    Label encoding as scikit-learn's LabelEncoder (codes are positions in the
+    sorted classes_), without importing scikit-learn: features, and so the
+    training data fingerprint, are computed on every cold start
+    """
+
+    def __init__(self, classes=()):
+        self.classes_ = np.asarray(classes, dtype=object)
+
+    def fit_transform(self, values):
+        """Fit the classes to values and return their codes"""
+        self.classes_, codes = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+        return codes
 
 
 def create_ml_features(master_df):
@@ -21,7 +36,7 @@ def create_ml_features(master_df):
         feature_names: List of feature names
     """
     # Filter to rows with consumption data (for training)
-    df = master_df[master_df['consumed_parts_count'].notna()].copy()
+    df = master_df[master_df['consumed_parts_count'].notna()]
 
     if len(df) == 0:
         return None, None, None
@@ -92,6 +107,19 @@ def categorize_check_type(check_type_str):
         return 'Other'
 
 
+# Defaults for prediction inputs that are not given
+PREDICTION_DEFAULTS = {
+    'ac_typ': 'A320S',
+    'aircraft_hours': 10000,
+    'aircraft_cycles': 5000,
+    'is_eol': False,
+    'station': 'TLLM',
+    'duration_days': 18,
+    'planned_parts_count': 0,
+    'planned_cost': 0,
+}
+
+
 def prepare_prediction_features(input_data, encoders, feature_names):
     """
     Prepare features for prediction from user input
@@ -104,39 +132,47 @@ def prepare_prediction_features(input_data, encoders, feature_names):
     Returns:
         DataFrame with features ready for prediction
     """
-    # Create empty dataframe with correct columns
-    X_new = pd.DataFrame(columns=feature_names)
-
-    # Aircraft type
-    try:
-        ac_typ_encoded = encoders['ac_typ'].transform([input_data.get('ac_typ', 'A320S')])[0]
-    except:
-        ac_typ_encoded = 0
-    X_new.loc[0, 'ac_typ_encoded'] = ac_typ_encoded
-
-    # Utilization
-    X_new.loc[0, 'aircraft_hours_filled'] = input_data.get('aircraft_hours', 10000)
-    X_new.loc[0, 'aircraft_cycles_filled'] = input_data.get('aircraft_cycles', 5000)
-    X_new.loc[0, 'hours_per_cycle_filled'] = input_data.get('aircraft_hours', 10000) / max(input_data.get('aircraft_cycles', 5000), 1)
-
-    # EOL
-    X_new.loc[0, 'is_eol_filled'] = 1 if input_data.get('is_eol', False) else 0
-
-    # Station
-    try:
-        station_encoded = encoders['station'].transform([input_data.get('station', 'TLLM')])[0]
-    except:
-        station_encoded = 0
-    X_new.loc[0, 'station_encoded'] = station_encoded
-
-    # Duration (use input or default to median)
-    X_new.loc[0, 'duration_days_filled'] = input_data.get('duration_days', 18)
-
-    # Planned material (use 0 for prediction if not provided)
-    X_new.loc[0, 'planned_parts_count_filled'] = input_data.get('planned_parts_count', 0)
-    X_new.loc[0, 'planned_cost_filled'] = input_data.get('planned_cost', 0)
-
-    return X_new
+    return prepare_batch_features(pd.DataFrame([input_data]), encoders, feature_names)
+
+
+def prepare_batch_features(checks, encoders, feature_names):
+    """
+    Prepare features for prediction for many C-checks at once
+
+    Args:
+        checks: DataFrame with one row per C-check and the input columns of
+            PREDICTION_DEFAULTS; missing columns or values take the default
+        encoders: dict of label encoders
+        feature_names: list of feature names
+
+    Returns:
+        DataFrame with features ready for prediction, indexed like checks
+    """
+    inputs = {}
+    for column, default in PREDICTION_DEFAULTS.items():
+        values = checks[column] if column in checks.columns else pd.Series(default, index=checks.index)
+        inputs[column] = values.where(values.notna(), default)
+
+    features = {
+        # Categories the encoder has not seen are encoded as 0
+        'ac_typ_encoded': _encode(encoders['ac_typ'], inputs['ac_typ']),
+        'aircraft_hours_filled': inputs['aircraft_hours'].astype(float),
+        'aircraft_cycles_filled': inputs['aircraft_cycles'].astype(float),
+        'hours_per_cycle_filled': inputs['aircraft_hours'].astype(float) / np.maximum(inputs['aircraft_cycles'].astype(float), 1),
+        'is_eol_filled': inputs['is_eol'].astype(bool).astype(int),
+        'station_encoded': _encode(encoders['station'], inputs['station']),
+        'duration_days_filled': inputs['duration_days'].astype(float),
+        'planned_parts_count_filled': inputs['planned_parts_count'].astype(float),
+        'planned_cost_filled': inputs['planned_cost'].astype(float),
+    }
+
+    return pd.DataFrame(features, index=checks.index)[feature_names]
+
+
+def _encode(encoder, values):
+    """Label codes of values, 0 for labels the encoder was not fitted on"""
+    codes = pd.Index(encoder.classes_).get_indexer(values.to_numpy(dtype=object))
+    return np.where(codes >= 0, codes, 0)
 
 
 def get_feature_importance_names(feature_names, encoders):
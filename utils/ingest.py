@@ -0,0 +1,344 @@
+"""
+SAS Material Supply Analysis - Ingest Module
+Detects and parses uploaded Excel files
+"""
+
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+# Worker processes used to parse uploads in parallel (openpyxl parsing is CPU-bound)
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Define required files, their columns and how to parse them
+# - required_columns: must be present for the file to be accepted
+# - columns: every column the app uses (anything else in the file is not parsed)
+# - dtypes: declared schema applied while reading
+#     str         identifiers and free text (Arrow-backed strings on pandas 3)
+#     category    low-cardinality codes that are only compared, filtered or grouped on
+#     float32     quantities (whole numbers, exact in float32)
+#     float64     prices, hours/cycles and keys that may be missing
+# - integer_columns: 0/1 flags, downcast to the smallest integer type after reading
+# - date_columns: parsed to datetime once, at read time
+# - registration_columns: free-text column -> derived column holding the aircraft
+#     registrations found in it (see extract_registrations)
+REQUIRED_FILES = {
+    'workpacks': {
+        'name': 'Maintenance Workpacks',
+        'description': 'C-checks, EOL and bridging tasks',
+        'required_columns': ['wpno_i', 'wpno', 'ac_registr', 'ac_typ', 'station',
+                            'start_date', 'end_date', 'is_c_check'],
+        'columns': ['wpno_i', 'wpno', 'ac_registr', 'ac_typ', 'station', 'start_date',
+                    'end_date', 'is_c_check', 'is_eol', 'is_bridging_task', 'check_type'],
+        'dtypes': {'wpno': str, 'ac_registr': str, 'ac_typ': str, 'station': str, 'check_type': str},
+        'integer_columns': ['is_c_check', 'is_eol', 'is_bridging_task'],
+        'date_columns': ['start_date', 'end_date'],
+        'registration_columns': {},
+        'session_key': 'uploaded_workpacks'
+    },
+    'utilization': {
+        'name': 'Aircraft Utilization',
+        'description': 'Aircraft hours and cycles',
+        'required_columns': ['ac_registr', 'date', 'tah', 'tac'],
+        'columns': ['ac_registr', 'date', 'tah', 'tac'],
+        'dtypes': {'ac_registr': str, 'tah': 'float64', 'tac': 'float64'},
+        'integer_columns': [],
+        'date_columns': ['date'],
+        'registration_columns': {},
+        'session_key': 'uploaded_utilization'
+    },
+    'consumption': {
+        'name': 'Material Consumption',
+        'description': 'Actual material consumption',
+        'required_columns': ['partno', 'qty', 'average_price', 'del_date', 'station', 'vm'],
+        'columns': ['partno', 'qty', 'average_price', 'del_date', 'station', 'vm',
+                    'wpno_i', 'ac_registr', 'receiver', 'ata_chapter'],
+        'dtypes': {'partno': str, 'qty': 'float32', 'average_price': 'float64', 'station': 'category',
+                   'vm': 'category', 'wpno_i': 'float64', 'ac_registr': 'category', 'receiver': str,
+                   'ata_chapter': str},
+        'integer_columns': [],
+        'date_columns': ['del_date'],
+        'registration_columns': {'receiver': 'receiver_registr'},
+        'session_key': 'uploaded_consumption'
+    },
+    'planned': {
+        'name': 'Planned Material',
+        'description': 'Planned materials per workpack',
+        'required_columns': ['wpno_i', 'partno', 'qty', 'average_price'],
+        'columns': ['wpno_i', 'partno', 'qty', 'average_price', 'confirmed_qty', 'description',
+                    'tool', 'mat_class', 'externally_provisioned'],
+        'dtypes': {'wpno_i': 'float64', 'partno': str, 'qty': 'float32', 'average_price': 'float64',
+                   'confirmed_qty': 'float32', 'description': str, 'tool': 'category',
+                   'mat_class': 'category', 'externally_provisioned': 'category'},
+        'integer_columns': [],
+        'date_columns': [],
+        'registration_columns': {},
+        'session_key': 'uploaded_planned'
+    }
+}
+
+
+def detect_file_type(columns):
+    """Auto-detect which dataset type a file is based on its column names"""
+    df_cols = set(columns)
+
+    # Check each file type - order matters (most specific first)
+    # Workpacks has unique columns like 'is_c_check', 'end_date'
+    if 'is_c_check' in df_cols and 'wpno' in df_cols:
+        return 'workpacks'
+
+    # Utilization has 'tah', 'tac' which are unique
+    if 'tah' in df_cols and 'tac' in df_cols:
+        return 'utilization'
+
+    # Consumption has 'vm', 'del_date' which are unique
+    if 'vm' in df_cols and 'del_date' in df_cols:
+        return 'consumption'
+
+    # Planned has 'partno' and 'wpno_i' but not 'vm' or 'del_date'
+    if 'partno' in df_cols and 'wpno_i' in df_cols and 'vm' not in df_cols:
+        return 'planned'
+
+    return None
+
+
+def validate_columns(columns, required_columns):
+    """Check if a file has all required columns"""
+    return [col for col in required_columns if col not in columns]
+
+
+def read_header(data):
+    """
+    Read only the header row of an Excel file
+    Returns: list of column names
+    """
+    return pd.read_excel(io.BytesIO(data), nrows=0).columns.tolist()
+
+
+# Registration mark in free text: three letters, optionally after a nationality
+# prefix ('SE-ROP', 'se-rop hangar' and 'ROP' all give 'ROP')
+REGISTRATION_PATTERN = r'\b(?:[A-Z]{1,2}-)?([A-Z]{3})\b'
+
+
+def extract_registration(values):
+    """
+    Normalize free-text values (trimmed, upper case) and extract the aircraft
+    registration from each in one vectorized regex pass
+
+    Returns:
+        categorical Series, NaN where no registration is found
+    """
+    normalized = pd.Series(values).astype('string').str.strip().str.upper()
+    return normalized.str.extract(REGISTRATION_PATTERN, expand=False).astype('category')
+
+
+def _registration_matches(values):
+    """
+    Every registration in each distinct value, found in one extractall pass
+    over the distinct values only
+
+    Returns:
+        (codes, uniques, pairs): position of each value in uniques (-1 if
+        missing), and a DataFrame of distinct (value, registration) pairs,
+        value being a position in uniques, in order of appearance
+    """
+    codes, uniques = pd.factorize(pd.Series(values))
+    normalized = pd.Series(uniques).astype('string').str.strip().str.upper()
+    found = normalized.str.extractall(REGISTRATION_PATTERN)[0]
+
+    pairs = pd.DataFrame({
+        'value': found.index.get_level_values(0).to_numpy(dtype=np.intp),
+        'registration': found.to_numpy(dtype=object),
+    }).drop_duplicates(ignore_index=True)
+    return codes, uniques, pairs
+
+
+def extract_registrations(values):
+    """
+    Extract every aircraft registration named in free-text values ('OSL ROP'
+    names two), normalized as in extract_registration
+
+    Returns:
+        categorical Series of the registrations of each value, space separated
+        in order of appearance, NaN where none is found
+    """
+    codes, uniques, pairs = _registration_matches(values)
+    joined = pairs.groupby('value', sort=True)['registration'].agg(' '.join)
+
+    labels = np.full(len(uniques), None, dtype=object)
+    labels[joined.index.to_numpy()] = joined.to_numpy()
+    registrations = np.where(codes >= 0, labels[codes], None)
+    return pd.Series(registrations, index=pd.Series(values).index, dtype='category')
+
+
+def registration_pairs(values):
+    """
+    (row, registration) pairs of every aircraft registration named in
+    free-text values: a value naming several registrations gives a pair for each
+
+    Returns:
+        (rows, registrations): positional row index into values and the
+        registration, ordered by row
+    """
+    codes, uniques, pairs = _registration_matches(values)
+
+    # Pairs of each distinct value, repeated for every row holding it
+    counts = np.bincount(pairs['value'].to_numpy(), minlength=len(uniques))
+    starts = np.cumsum(counts) - counts
+    row_counts = np.where(codes >= 0, counts[codes], 0)
+
+    rows = np.repeat(np.arange(len(codes)), row_counts)
+    within = np.arange(len(rows)) - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+    registrations = pairs['registration'].to_numpy()[starts[codes[rows]] + within]
+    return rows, registrations
+
+
+def read_dataset(data, file_type, header):
+    """
+    Parse an Excel file, reading only the columns the app uses
+
+    Args:
+        data: raw file bytes
+        file_type: key in REQUIRED_FILES
+        header: column names from read_header
+
+    Returns:
+        DataFrame with explicit dtypes and parsed dates
+    """
+    config = REQUIRED_FILES[file_type]
+    usecols = [col for col in config['columns'] if col in header]
+    dtypes = {col: dtype for col, dtype in config['dtypes'].items() if col in usecols}
+
+    df = pd.read_excel(io.BytesIO(data), usecols=usecols, dtype=dtypes)
+
+    for col in config['integer_columns']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+
+    for col in config['date_columns']:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    for col, registration_col in config['registration_columns'].items():
+        if col in df.columns:
+            df[registration_col] = extract_registrations(df[col])
+
+    return df
+
+
+def memory_report(df):
+    """
+    Compare a parsed frame's measured memory footprint with an estimate of the
+    untyped layout (object strings, 64-bit numerics) it would have without the
+    declared schema: not measured, which would need a second, untyped parse
+
+    Returns:
+        dict with rows, before_bytes (estimated: 8 bytes per numeric value,
+        categorical and string columns at their object size) and after_bytes
+        (measured)
+    """
+    before = 0
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(series.dtype):
+            before += series.astype(object).memory_usage(index=False, deep=True)
+        else:
+            before += len(series) * 8
+
+    return {
+        'rows': len(df),
+        'before_bytes': int(before),
+        'after_bytes': int(df.memory_usage(index=False, deep=True).sum()),
+    }
+
+
+def parse_upload(name, data):
+    """
+    Detect, validate and parse one uploaded file (runs in a worker process)
+
+    Args:
+        name: file name (for reporting)
+        data: raw file bytes
+
+    Returns:
+        dict with file, status ('success'/'error'), message, file_type and df
+    """
+    result = {'file': name, 'status': 'error', 'file_type': None, 'df': None}
+
+    try:
+        # Phase 1: classify the file from its header row only
+        header = read_header(data)
+        file_type = detect_file_type(header)
+
+        if file_type is None:
+            result['message'] = 'Could not detect file type based on columns'
+            return result
+
+        config = REQUIRED_FILES[file_type]
+        missing = validate_columns(header, config['required_columns'])
+
+        if missing:
+            result['message'] = f"Missing columns for {config['name']}: {', '.join(missing)}"
+            return result
+
+        # Phase 2: parse only the columns the app uses
+        df = read_dataset(data, file_type, header)
+
+        result.update({
+            'status': 'success',
+            'message': f"Recognized as: {config['name']} ({len(df)} rows)",
+            'file_type': file_type,
+            'df': df,
+        })
+        return result
+
+    except Exception as e:
+        result['message'] = f"Error loading: {str(e)}"
+        return result
+
+
+def parse_uploads(files, max_workers=None, on_progress=None):
+    """
+    Parse several uploaded files concurrently in a process pool
+
+    Args:
+        files: list of (name, bytes)
+        max_workers: worker processes (default PARSE_WORKERS); 1 parses serially
+        on_progress: optional callback(done, total, result) called as each file finishes
+
+    Returns:
+        list of parse_upload results, in the order of files
+    """
+    if max_workers is None:
+        max_workers = PARSE_WORKERS
+    max_workers = min(max_workers, len(files))
+
+    results = [None] * len(files)
+
+    if max_workers <= 1:
+        for i, (name, data) in enumerate(files):
+            results[i] = parse_upload(name, data)
+            if on_progress is not None:
+                on_progress(i + 1, len(files), results[i])
+        return results
+
+    # Spawned workers do not inherit the Streamlit server's threads and state
+    context = multiprocessing.get_context('spawn')
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        futures = {pool.submit(parse_upload, name, data): i for i, (name, data) in enumerate(files)}
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = {'file': files[i][0], 'status': 'error', 'file_type': None, 'df': None,
+                              'message': f"Error loading: {str(e)}"}
+            if on_progress is not None:
+                on_progress(done, len(files), results[i])
+
+    return results
@@ -4,35 +4,49 @@ Train and use Random Forest model for material prediction
 """
 
 import streamlit as st
-import pandas as pd
-import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import cross_val_score
-from sklearn.preprocessing import StandardScaler
 import pickle
 from pathlib import Path
 
-from .feature_engineering import create_ml_features, prepare_prediction_features, get_feature_importance_names
-from .data_loader import get_master_view
+from .feature_engineering import create_ml_features
+from .data_loader import CACHE_MAX_ENTRIES, EXCLUSIVE_MATCHING_KEY, get_data_version, get_master_view
+from .uncertainty import build_forest_stats
+from .predictor import BaselinePredictor, ForestPredictor, target_stats
+from .background_training import BackgroundTrainer
+from .model_registry import (find_version, get_active_version, list_versions, load_version, register_model,
+                             training_fingerprint)
 
-# Model path
+# Model path (default of save / load; get_trained_model stores models in the registry)
 MODEL_PATH = Path(__file__).parent.parent / 'models' / 'material_predictor.pkl'
 
+# Session state key holding the fingerprint of the training data this session's
+# model is being trained on in the background
+TRAINING_JOB_KEY = 'model_training_job'
 
-class MaterialPredictor:
+# Session state flag set by retry_training: the next get_trained_model call
+# trains a failed job again without waiting for its retry delay
+RETRY_TRAINING_KEY = 'model_training_retry'
+
+# Random Forest hyperparameters, recorded with every registered version
+MODEL_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 10,
+    'min_samples_split': 5,
+    'min_samples_leaf': 2,
+    'random_state': 42,
+}
+
+
+class MaterialPredictor(ForestPredictor):
     """
     Material prediction model using Random Forest
     """
 
     def __init__(self):
+        super().__init__()
         self.model = None
         self.scaler = None
-        self.feature_names = []
-        self.encoders = None
-        self.training_stats = {}
-        self.planning_accuracy_factor = 1.0
 
-    def train(self, X, y, cv_folds=5):
+    def train(self, X, y, cv_folds=5, progress=None):
         """
         Train Random Forest model on available data
 
@@ -40,24 +54,31 @@ class MaterialPredictor:
             X: Feature matrix
             y: Target variable (consumed_parts_count)
             cv_folds: Number of cross-validation folds
+            progress: optional callback(fraction, message) reporting training progress
         """
+        if progress is None:
+            progress = _no_progress
+
+        # scikit-learn is only needed to train; the served model is compiled to NumPy arrays
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.model_selection import cross_val_score
+        from sklearn.preprocessing import StandardScaler
+
         # Scale features
         self.scaler = StandardScaler()
         X_scaled = self.scaler.fit_transform(X)
 
         # Train Random Forest
-        self.model = RandomForestRegressor(
-            n_estimators=100,
-            max_depth=10,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42,
-            n_jobs=-1
-        )
+        self.model = RandomForestRegressor(**MODEL_PARAMS, n_jobs=-1)
 
+        progress(0.05, 'Fitting the forest')
         self.model.fit(X_scaled, y)
 
+        # Flat trees, leaf predictions and training targets per leaf, for uncertainty and quantiles
+        self.forest_stats = build_forest_stats(self.model, X_scaled, y)
+
         # Cross-validation
+        progress(0.3, 'Cross-validating')
         cv_scores = cross_val_score(
             self.model, X_scaled, y,
             cv=min(cv_folds, len(X)),
@@ -66,121 +87,20 @@ class MaterialPredictor:
 
         # Store training stats
         self.training_stats = {
-            'n_samples': len(X),
+            **target_stats(y),
             'cv_mean_r2': cv_scores.mean(),
             'cv_std_r2': cv_scores.std(),
             'feature_importance': self.model.feature_importances_,
-            'training_mean': y.mean(),
-            'training_std': y.std(),
-            'training_min': y.min(),
-            'training_max': y.max(),
         }
 
         print(f"Model trained on {len(X)} samples")
         print(f"Cross-validation R²: {cv_scores.mean():.3f} (+/- {cv_scores.std():.3f})")
 
-    def predict(self, X_new):
-        """
-        Predict material needs for new C-check
-
-        Args:
-            X_new: Feature matrix for new observation(s)
-
-        Returns:
-            dict with prediction and confidence
-        """
-        if self.model is None or self.scaler is None:
-            return None
-
-        # Scale features
-        X_scaled = self.scaler.transform(X_new)
-
-        # Predict
-        prediction = self.model.predict(X_scaled)[0]
-
-        # Calculate confidence (based on prediction range from trees)
-        tree_predictions = np.array([tree.predict(X_scaled)[0] for tree in self.model.estimators_])
-        pred_std = tree_predictions.std()
-
-        # Confidence interval (95%)
-        ci_lower = max(0, prediction - 1.96 * pred_std)
-        ci_upper = prediction + 1.96 * pred_std
-
-        # Confidence score (based on std relative to mean)
-        confidence_score = max(0, min(100, 100 * (1 - pred_std / max(prediction, 1))))
-
-        return {
-            'prediction': round(prediction),
-            'confidence': round(confidence_score, 1),
-            'ci_lower': round(ci_lower),
-            'ci_upper': round(ci_upper),
-            'std': round(pred_std, 2)
-        }
-
-    def predict_with_fallback(self, input_data, planned_parts=None):
-        """
-        Predict with fallback to planned material
-
-        Args:
-            input_data: dict with input features
-            planned_parts: Number of planned parts (if available)
-
-        Returns:
-            dict with prediction, method used, and confidence
-        """
-        # Try ML prediction first
-        if self.model is not None and self.encoders is not None:
-            X_new = prepare_prediction_features(input_data, self.encoders, self.feature_names)
-            ml_result = self.predict(X_new)
-
-            # If confidence is reasonable, use ML prediction
-            if ml_result and ml_result['confidence'] > 30:
-                ml_result['method'] = 'ML Model'
-                ml_result['explanation'] = f"Prediction based on Random Forest model trained on {self.training_stats['n_samples']} C-checks"
-                return ml_result
-
-        # Fallback to planned material with adjustment
-        if planned_parts is not None and planned_parts > 0:
-            # Apply planning accuracy factor (learned from training data)
-            adjusted_prediction = round(planned_parts * self.planning_accuracy_factor)
-
-            return {
-                'prediction': adjusted_prediction,
-                'confidence': 60.0,
-                'ci_lower': round(adjusted_prediction * 0.8),
-                'ci_upper': round(adjusted_prediction * 1.2),
-                'method': 'Adjusted Planned Material',
-                'explanation': f"Based on planned material ({planned_parts} parts) adjusted by historical accuracy factor ({self.planning_accuracy_factor:.2f})"
-            }
-
-        # Last resort: use training mean
-        if 'training_mean' in self.training_stats:
-            mean_prediction = round(self.training_stats['training_mean'])
-
-            return {
-                'prediction': mean_prediction,
-                'confidence': 40.0,
-                'ci_lower': round(self.training_stats['training_mean'] - self.training_stats['training_std']),
-                'ci_upper': round(self.training_stats['training_mean'] + self.training_stats['training_std']),
-                'method': 'Historical Average',
-                'explanation': f"Based on average material usage from {self.training_stats['n_samples']} historical C-checks"
-            }
-
-        return None
-
-    def get_feature_importance(self):
+    def scale(self, X):
         """
-        Get feature importance from trained model
+        Standardize features with the fitted scaler
         """
-        if self.model is None:
-            return None
-
-        importance_df = pd.DataFrame({
-            'feature': get_feature_importance_names(self.feature_names, self.encoders),
-            'importance': self.training_stats['feature_importance']
-        }).sort_values('importance', ascending=False)
-
-        return importance_df
+        return self.scaler.transform(X)
 
     def save(self, path=None):
         """
@@ -215,55 +135,186 @@ class MaterialPredictor:
         return model
 
 
-@st.cache_resource
 def get_trained_model():
     """
-    Get or train the material prediction model (cached)
+    Get the material prediction model for the current data
+
+    Serves the registry's active version if a rollback pinned it, else the
+    newest registered version trained on the current training data (reused
+    only on a matching fingerprint). Otherwise a model is trained in the
+    background (see get_training_status) and, until it is registered, the
+    previous version is served, or the planned material fallback if there is
+    none: the page never waits on a fit.
+
+    Resolving the model never moves the active version, which is shared by all
+    sessions whatever their data. The registry index is read once per call.
     """
-    # Try to load existing model
-    model = MaterialPredictor.load()
+    st.session_state.pop(TRAINING_JOB_KEY, None)
+    versions = list_versions()
+    active = get_active_version(versions=versions)
 
-    if model is not None:
-        return model
+    # A rolled back version is served whatever the data
+    if active is not None and active['pinned']:
+        model = _load_registered_model(active['version'], active['fingerprint'])
+        if model is not None:
+            return model
 
-    # Train new model
-    print("Training new model...")
     master_df = get_master_view()
 
     if master_df is None:
         st.error("Could not load data for model training")
         return None
 
-    # Create features
-    X, y, feature_names, encoders, training_df = create_ml_features(master_df)
+    training_set = _build_training_set(get_data_version(), st.session_state.get(EXCLUSIVE_MATCHING_KEY, False),
+                                       master_df)
 
-    if X is None or len(X) < 10:
+    if training_set is None:
         st.error("Insufficient data for model training (need at least 10 samples)")
         return None
 
+    # Reuse a version trained on exactly this data (compiled arrays, no scikit-learn import)
+    record = find_version(training_set['fingerprint'], training_set['feature_names'], MODEL_PARAMS,
+                          versions=versions)
+
+    if record is not None:
+        model = _load_registered_model(record['version'], record['fingerprint'])
+        if model is not None:
+            return model
+
+    # Train in the background; the registered model is picked up by a later rerun
+    _get_trainer().submit(training_set['fingerprint'], train_and_register, training_set,
+                          retry=st.session_state.pop(RETRY_TRAINING_KEY, False))
+    st.session_state[TRAINING_JOB_KEY] = training_set['fingerprint']
+
+    if active is not None:
+        model = _load_registered_model(active['version'], active['fingerprint'])
+        if model is not None:
+            return model
+
+    return _build_baseline_model(training_set['fingerprint'], training_set)
+
+
+def get_training_status():
+    """
+    Status of the background training started by this session's last
+    get_trained_model call: dict with state ('queued', 'running', 'done' or
+    'failed'), progress (0 - 1), message and error, or None if the served
+    model is already trained on the current data
+    """
+    fingerprint = st.session_state.get(TRAINING_JOB_KEY)
+
+    if fingerprint is None:
+        return None
+
+    return _get_trainer().status(fingerprint)
+
+
+def retry_training():
+    """
+    Train this session's failed model again on the next get_trained_model call
+    (a widget callback: it runs before the page script reruns)
+    """
+    st.session_state[RETRY_TRAINING_KEY] = True
+
+
+def train_and_register(training_set, progress=None):
+    """
+    Train a model on a training set (from _build_training_set) and register it
+    (as the active version unless a rollback is pinned); runs on the background
+    training thread
+
+    Args:
+        training_set: dict with X, y, feature_names, encoders, training_df and fingerprint
+        progress: optional callback(fraction, message) reporting training progress
+
+    Returns:
+        the trained MaterialPredictor
+    """
+    print("Training new model...")
+
     # Initialize and train model
     model = MaterialPredictor()
-    model.feature_names = feature_names
-    model.encoders = encoders
+    model.feature_names = training_set['feature_names']
+    model.encoders = training_set['encoders']
+    model.planning_accuracy_factor = _planning_accuracy_factor(training_set['training_df'])
+
+    # Train
+    model.train(training_set['X'], training_set['y'], progress=progress)
+
+    # Register the model and its compiled arrays: the registry index is
+    # replaced atomically, so readers see the old or the new model
+    if progress is not None:
+        progress(0.95, 'Saving the model')
+    register_model(model, training_set['fingerprint'], MODEL_PARAMS)
+
+    return model
 
-    # Calculate planning accuracy factor
-    # (ratio of actual to planned for available data)
+
+def _no_progress(fraction, message):
+    """Progress callback that ignores progress"""
+
+
+def _planning_accuracy_factor(training_df):
+    """
+    Calculate planning accuracy factor
+    (ratio of actual to planned for available data)
+    """
     valid_accuracy = training_df[
         (training_df['planned_parts_count'] > 0) &
         (training_df['consumed_parts_count'].notna())
     ]
 
-    if len(valid_accuracy) > 0:
-        accuracy_ratios = valid_accuracy['consumed_parts_count'] / valid_accuracy['planned_parts_count']
-        model.planning_accuracy_factor = accuracy_ratios.median()
+    if len(valid_accuracy) == 0:
+        return 1.0
 
-    # Train
-    model.train(X, y)
+    accuracy_ratios = valid_accuracy['consumed_parts_count'] / valid_accuracy['planned_parts_count']
+    return accuracy_ratios.median()
 
-    # Save model
-    model.save()
 
-    return model
+@st.cache_resource
+def _get_trainer():
+    """Background trainer shared by all sessions of the process"""
+    return BackgroundTrainer()
+
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def _build_training_set(version, exclusive, _master_df):
+    """
+    Training features and the fingerprint of the training data, computed once
+    per data version and matching mode
+
+    Returns:
+        dict with X, y, feature_names, encoders, training_df and fingerprint,
+        or None if there are fewer than 10 training samples
+    """
+    X, y, feature_names, encoders, training_df = create_ml_features(_master_df)
+
+    if X is None or len(X) < 10:
+        return None
+
+    return {
+        'X': X,
+        'y': y,
+        'feature_names': feature_names,
+        'encoders': encoders,
+        'training_df': training_df,
+        'fingerprint': training_fingerprint(X, y),
+    }
+
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def _load_registered_model(version, fingerprint):
+    """Load a registered version's compiled model once per process"""
+    return load_version(version)
+
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def _build_baseline_model(fingerprint, _training_set):
+    """Planned material / historical average predictor for a training set, served while no model exists"""
+    return BaselinePredictor(
+        target_stats(_training_set['y']),
+        _planning_accuracy_factor(_training_set['training_df'])
+    )
 
 
 def find_similar_checks(input_data, master_df, n_similar=5):
@@ -282,7 +333,7 @@ def find_similar_checks(input_data, master_df, n_similar=5):
     similar_df = master_df[
         (master_df['is_c_check'] == 1) &
         (master_df['consumed_parts_count'].notna())
-    ].copy()
+    ]
 
     if len(similar_df) == 0:
         return None
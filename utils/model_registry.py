@@ -0,0 +1,276 @@
+"""
+SAS Material Supply Analysis - Model Registry Module
+Local registry of trained material prediction models: every version is stored
+with the fingerprint of its training data, feature list, hyperparameters and
+cross-validation metrics, the last few are kept, and the served (active)
+version can be rolled back instantly
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from .compiled_model import CompiledPredictor, export_compiled
+
+# Registry directory: one subdirectory per version plus the index
+REGISTRY_PATH = Path(__file__).parent.parent / 'models' / 'registry'
+INDEX_FILE = 'registry.json'
+
+# Lock held while the index is read, changed and written; older locks are stale
+LOCK_FILE = 'registry.lock'
+LOCK_STALE_SECONDS = 30
+
+# Versions kept besides the active one; older ones are deleted
+KEEP_VERSIONS = 5
+
+# Artifacts per version: the trained scikit-learn model and its compiled arrays
+MODEL_FILE = 'material_predictor.pkl'
+COMPILED_DIR = 'compiled'
+
+
+def training_fingerprint(X, y):
+    """
+    Content hash of a training set: feature names and values and the target
+
+    Args:
+        X: Feature matrix
+        y: Target variable
+
+    Returns:
+        hex digest (SHA-256)
+    """
+    digest = hashlib.sha256()
+    digest.update(','.join(map(str, X.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    digest.update(pd.util.hash_pandas_object(pd.Series(y), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _read_index(path):
+    """Registry index: {'next_version', 'active', 'pinned', 'versions': [record, ...]}"""
+    try:
+        with open(path / INDEX_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'next_version': 1, 'active': None, 'pinned': False, 'versions': []}
+
+
+def _write_index(path, index):
+    """Replace the index atomically, so readers see the old or the new one"""
+    path.mkdir(parents=True, exist_ok=True)
+    temp = path / f'{INDEX_FILE}.{os.getpid()}.tmp'
+    with open(temp, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(temp, path / INDEX_FILE)
+
+
+@contextmanager
+def _index_lock(path):
+    """
+    Hold the registry's lock file, so read-index -> write-index sequences of
+    processes sharing the registry do not overwrite each other's changes
+
+    A lock older than LOCK_STALE_SECONDS (left by a crashed process) is taken over.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    lock = path / LOCK_FILE
+
+    while True:
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock.stat().st_mtime > LOCK_STALE_SECONDS:
+                    lock.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.05)
+
+    try:
+        yield
+    finally:
+        lock.unlink(missing_ok=True)
+
+
+def _reserve_version(path):
+    """
+    Claim the next free version number by creating its directory exclusively:
+    a directory that exists belongs to another writer (or a crashed one) and is
+    skipped, never reused
+
+    Returns:
+        (version, version directory)
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    version = _read_index(path)['next_version']
+
+    while True:
+        version_dir = path / f'v{version}'
+        try:
+            os.mkdir(version_dir)
+            return version, version_dir
+        except FileExistsError:
+            version += 1
+
+
+def list_versions(path=None):
+    """
+    Registered versions, newest first
+
+    Returns:
+        list of version records (dicts with version, created, fingerprint,
+        feature_names, hyperparameters, metrics, active and pinned)
+    """
+    index = _read_index(path or REGISTRY_PATH)
+    return [
+        dict(record, active=record['version'] == index['active'],
+             pinned=record['version'] == index['active'] and index['pinned'])
+        for record in reversed(index['versions'])
+    ]
+
+
+def get_active_version(path=None, versions=None):
+    """
+    The active version's record (see list_versions), or None if nothing is
+    registered; versions, a list_versions result, is searched instead of
+    reading the index again
+    """
+    for record in versions if versions is not None else list_versions(path):
+        if record['active']:
+            return record
+    return None
+
+
+def find_version(fingerprint, feature_names, hyperparameters, path=None, versions=None):
+    """
+    Newest version trained on the same data, features and hyperparameters, or
+    None; versions as in get_active_version
+    """
+    for record in versions if versions is not None else list_versions(path):
+        if (record['fingerprint'] == fingerprint and record['feature_names'] == list(feature_names)
+                and record['hyperparameters'] == hyperparameters):
+            return record
+    return None
+
+
+def register_model(model, fingerprint, hyperparameters, path=None):
+    """
+    Store a trained model as a new version and make it the active one, unless
+    a rollback pinned the active version: the new version is then only
+    registered (and served to matching data once the pin is released)
+
+    Args:
+        model: trained MaterialPredictor
+        fingerprint: training_fingerprint of its training data
+        hyperparameters: dict of RandomForestRegressor parameters it was trained with
+        path: registry directory (default REGISTRY_PATH)
+
+    Returns:
+        the new version's record
+    """
+    path = path or REGISTRY_PATH
+    version, version_dir = _reserve_version(path)
+
+    model.save(version_dir / MODEL_FILE)
+    export_compiled(model, version_dir / COMPILED_DIR)
+
+    record = {
+        'version': version,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'fingerprint': fingerprint,
+        'feature_names': list(model.feature_names),
+        'hyperparameters': hyperparameters,
+        'metrics': {
+            'n_samples': int(model.training_stats['n_samples']),
+            'cv_mean_r2': float(model.training_stats['cv_mean_r2']),
+            'cv_std_r2': float(model.training_stats['cv_std_r2']),
+        },
+    }
+
+    # Re-read under the lock: another process may have registered meanwhile
+    with _index_lock(path):
+        index = _read_index(path)
+        index['next_version'] = max(index['next_version'], version) + 1
+        index['versions'].append(record)
+        index['versions'].sort(key=lambda r: r['version'])
+        if not index['pinned']:
+            index['active'] = version
+        _prune(path, index)
+        _write_index(path, index)
+
+    print(f"Model version {version} registered in {path}")
+    return record
+
+
+def activate_version(version, pinned=False, path=None):
+    """
+    Serve a registered version
+
+    Args:
+        version: version number
+        pinned: keep serving it even when the training data no longer matches
+            (a rollback); unpinned, get_trained_model serves each session the
+            version matching its data, and the active one only while that trains
+        path: registry directory (default REGISTRY_PATH)
+
+    Returns:
+        the version's record, or None if it is not registered
+    """
+    path = path or REGISTRY_PATH
+
+    with _index_lock(path):
+        index = _read_index(path)
+
+        if not any(record['version'] == version for record in index['versions']):
+            return None
+
+        index['active'] = version
+        index['pinned'] = pinned
+        _write_index(path, index)
+
+    return get_active_version(path)
+
+
+def rollback(path=None):
+    """
+    Serve the version registered before the active one, pinned
+
+    Returns:
+        the version's record, or None if there is no earlier version
+    """
+    path = path or REGISTRY_PATH
+    index = _read_index(path)
+    earlier = [record['version'] for record in index['versions']
+               if index['active'] is None or record['version'] < index['active']]
+
+    if not earlier:
+        return None
+
+    return activate_version(max(earlier), pinned=True, path=path)
+
+
+def load_version(version, path=None):
+    """Load a registered version's compiled model (CompiledPredictor), or None"""
+    path = path or REGISTRY_PATH
+    return CompiledPredictor.load(path / f'v{version}' / COMPILED_DIR)
+
+
+def _prune(path, index):
+    """Keep the active version and the KEEP_VERSIONS newest others; delete the rest"""
+    others = [record for record in index['versions'] if record['version'] != index['active']]
+    removed = others[:-KEEP_VERSIONS] if len(others) > KEEP_VERSIONS else []
+
+    for record in removed:
+        shutil.rmtree(path / f"v{record['version']}", ignore_errors=True)
+
+    removed_versions = {record['version'] for record in removed}
+    index['versions'] = [record for record in index['versions'] if record['version'] not in removed_versions]
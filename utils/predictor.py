@@ -0,0 +1,268 @@
+"""
+SAS Material Supply Analysis - Forest Predictor Module
+Prediction from a trained Random Forest's flat arrays (utils.uncertainty), with
+fallback to planned material; shared by the scikit-learn model that is trained
+and the compiled model that is served, and needing only NumPy and pandas
+"""
+
+import pandas as pd
+import numpy as np
+
+from .feature_engineering import prepare_batch_features, get_feature_importance_names
+from .uncertainty import forest_leaves, forest_quantiles, tree_predictions
+
+
+class ForestPredictor:
+    """
+    Material prediction from a trained Random Forest
+
+    Subclasses set feature_names, encoders (fitted classes_ per categorical
+    feature), training_stats, planning_accuracy_factor and forest_stats
+    (output of build_forest_stats), and override scale with the training
+    standardization
+    """
+
+    def __init__(self):
+        self.feature_names = []
+        self.encoders = None
+        self.training_stats = {}
+        self.planning_accuracy_factor = 1.0
+        self.forest_stats = None
+
+    def scale(self, X):
+        """
+        Standardize features as in training; unscaled here, for a forest
+        trained on raw features
+
+        Args:
+            X: Feature matrix, one row per C-check
+
+        Returns:
+            (n_rows, n_features) array
+        """
+        return np.asarray(X, dtype=float)
+
+    def predict(self, X_new):
+        """
+        Predict material needs for new C-check
+
+        Args:
+            X_new: Feature matrix for new observation(s)
+
+        Returns:
+            dict with prediction and confidence (of the first observation)
+        """
+        predictions = self.predict_batch(X_new)
+
+        if predictions is None:
+            return None
+
+        row = predictions.iloc[0]
+        return {
+            'prediction': int(row['prediction']),
+            'confidence': float(row['confidence']),
+            'ci_lower': int(row['ci_lower']),
+            'ci_upper': int(row['ci_upper']),
+            'p10': float(row['p10']),
+            'p50': float(row['p50']),
+            'p90': float(row['p90']),
+            'std': float(row['std'])
+        }
+
+    def predict_batch(self, X):
+        """
+        Predict material needs for many C-checks at once
+
+        Args:
+            X: Feature matrix, one row per C-check
+
+        Returns:
+            DataFrame indexed like X with prediction, confidence, ci_lower /
+            ci_upper (the P10 - P90 interval), the quantile regression forest
+            quantiles p10 / p50 / p90 and std (spread of the individual trees'
+            predictions)
+        """
+        if self.forest_stats is None:
+            return None
+
+        # Scale features
+        X_scaled = self.scale(X)
+
+        # Leaf of every row in every tree in one stacked pass, then all trees' predictions
+        leaves = forest_leaves(self.forest_stats, X_scaled)
+        trees = tree_predictions(self.forest_stats, leaves)
+
+        # Predict
+        prediction = trees.mean(axis=1)
+
+        # Calculate confidence (based on prediction range from trees)
+        pred_std = trees.std(axis=1)
+
+        # Interval from the training targets sharing leaves with each row: bounded by
+        # the observed counts, and skewed where they are
+        p10, p50, p90 = forest_quantiles(self.forest_stats, leaves).T
+
+        # Confidence score (based on std relative to mean)
+        confidence_score = np.clip(100 * (1 - pred_std / np.maximum(prediction, 1)), 0, 100)
+
+        return pd.DataFrame({
+            'prediction': np.round(prediction).astype(int),
+            'confidence': np.round(confidence_score, 1),
+            'ci_lower': np.round(p10).astype(int),
+            'ci_upper': np.round(p90).astype(int),
+            'p10': p10,
+            'p50': p50,
+            'p90': p90,
+            'std': np.round(pred_std, 2)
+        }, index=X.index)
+
+    def predict_with_fallback(self, input_data, planned_parts=None):
+        """
+        Predict with fallback to planned material
+
+        Args:
+            input_data: dict with input features
+            planned_parts: Number of planned parts (if available)
+
+        Returns:
+            dict with prediction, method used, and confidence
+        """
+        predictions = self.predict_fleet(pd.DataFrame([input_data]), planned_parts=[planned_parts])
+        row = predictions.iloc[0]
+
+        if pd.isna(row['method']):
+            return None
+
+        result = {
+            'prediction': int(row['prediction']),
+            'confidence': float(row['confidence']),
+            'ci_lower': int(row['ci_lower']),
+            'ci_upper': int(row['ci_upper'])
+        }
+        if row['method'] == 'ML Model':
+            for column in ('p10', 'p50', 'p90', 'std'):
+                result[column] = float(row[column])
+        result['method'] = row['method']
+        result['explanation'] = row['explanation']
+        return result
+
+    def predict_fleet(self, checks, planned_parts=None):
+        """
+        Predict with fallback to planned material for many C-checks at once,
+        e.g. all C-checks planned for the coming quarter
+
+        Each row takes the first method that applies, as predict_with_fallback:
+        the ML model if its confidence is above 30%, else the planned parts
+        adjusted by the planning accuracy factor, else the historical average.
+
+        Args:
+            checks: DataFrame with one row per C-check and the input columns of
+                prepare_batch_features
+            planned_parts: planned parts per row (array-like aligned with checks);
+                defaults to the planned_parts_count column
+
+        Returns:
+            DataFrame indexed like checks with prediction, confidence, ci_lower,
+            ci_upper, p10 / p50 / p90 and std (ML rows only), method and
+            explanation; rows no method applies to have method None and
+            missing values
+        """
+        n = len(checks)
+        result = pd.DataFrame({
+            'prediction': np.full(n, np.nan),
+            'confidence': np.full(n, np.nan),
+            'ci_lower': np.full(n, np.nan),
+            'ci_upper': np.full(n, np.nan),
+            'p10': np.full(n, np.nan),
+            'p50': np.full(n, np.nan),
+            'p90': np.full(n, np.nan),
+            'std': np.full(n, np.nan),
+            'method': pd.Series([None] * n, dtype=object),
+            'explanation': pd.Series([None] * n, dtype=object),
+        })
+        pending = np.ones(n, dtype=bool)
+
+        # Try ML prediction first
+        if self.forest_stats is not None and self.encoders is not None:
+            X_new = prepare_batch_features(checks, self.encoders, self.feature_names)
+            ml_result = self.predict_batch(X_new)
+
+            # If confidence is reasonable, use ML prediction
+            if ml_result is not None:
+                use_ml = ml_result['confidence'].to_numpy() > 30
+                for column in ml_result.columns:
+                    result.loc[use_ml, column] = ml_result[column].to_numpy()[use_ml]
+                result.loc[use_ml, 'method'] = 'ML Model'
+                result.loc[use_ml, 'explanation'] = f"Prediction based on Random Forest model trained on {self.training_stats['n_samples']} C-checks"
+                pending &= ~use_ml
+
+        # Fallback to planned material with adjustment
+        if planned_parts is None:
+            planned_parts = checks['planned_parts_count'] if 'planned_parts_count' in checks.columns else np.full(n, np.nan)
+        planned_parts = pd.Series(np.asarray(planned_parts, dtype=float))
+
+        use_planned = pending & (planned_parts.to_numpy() > 0)
+        if use_planned.any():
+            # Apply planning accuracy factor (learned from training data)
+            adjusted_prediction = np.round(planned_parts[use_planned].to_numpy() * self.planning_accuracy_factor)
+
+            result.loc[use_planned, 'prediction'] = adjusted_prediction
+            result.loc[use_planned, 'confidence'] = 60.0
+            result.loc[use_planned, 'ci_lower'] = np.round(adjusted_prediction * 0.8)
+            result.loc[use_planned, 'ci_upper'] = np.round(adjusted_prediction * 1.2)
+            result.loc[use_planned, 'method'] = 'Adjusted Planned Material'
+            result.loc[use_planned, 'explanation'] = (
+                "Based on planned material (" + planned_parts[use_planned].map('{:g}'.format)
+                + f" parts) adjusted by historical accuracy factor ({self.planning_accuracy_factor:.2f})"
+            )
+            pending &= ~use_planned
+
+        # Last resort: use training mean
+        if 'training_mean' in self.training_stats and pending.any():
+            result.loc[pending, 'prediction'] = round(self.training_stats['training_mean'])
+            result.loc[pending, 'confidence'] = 40.0
+            result.loc[pending, 'ci_lower'] = round(self.training_stats['training_mean'] - self.training_stats['training_std'])
+            result.loc[pending, 'ci_upper'] = round(self.training_stats['training_mean'] + self.training_stats['training_std'])
+            result.loc[pending, 'method'] = 'Historical Average'
+            result.loc[pending, 'explanation'] = f"Based on average material usage from {self.training_stats['n_samples']} historical C-checks"
+
+        result = result.astype({'prediction': 'Int64', 'ci_lower': 'Int64', 'ci_upper': 'Int64'})
+        result.index = checks.index
+        return result
+
+    def get_feature_importance(self):
+        """
+        Get feature importance from trained model
+        """
+        if self.forest_stats is None:
+            return None
+
+        importance_df = pd.DataFrame({
+            'feature': get_feature_importance_names(self.feature_names, self.encoders),
+            'importance': self.training_stats['feature_importance']
+        }).sort_values('importance', ascending=False)
+
+        return importance_df
+
+
+class BaselinePredictor(ForestPredictor):
+    """
+    Planned material and historical average predictions only (the fallbacks of
+    predict_fleet), served while no trained model is available
+    """
+
+    def __init__(self, training_stats, planning_accuracy_factor):
+        super().__init__()
+        self.training_stats = training_stats
+        self.planning_accuracy_factor = planning_accuracy_factor
+
+
+def target_stats(y):
+    """Training target summary kept in training_stats"""
+    return {
+        'n_samples': len(y),
+        'training_mean': y.mean(),
+        'training_std': y.std(),
+        'training_min': y.min(),
+        'training_max': y.max(),
+    }
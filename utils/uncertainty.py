@@ -0,0 +1,175 @@
+"""
+SAS Material Supply Analysis - Forest Uncertainty Module
+Flat arrays of a trained random forest's trees and leaf statistics, precomputed
+once at training time, from which the leaves, per-tree spread and quantile
+regression forest intervals (Meinshausen, 2006) of many rows are evaluated in
+stacked array operations over all trees at once
+"""
+
+import numpy as np
+
+# Quantiles reported per prediction: P10 / P50 / P90
+QUANTILES = (0.1, 0.5, 0.9)
+
+# Bound on rows x training samples weighed at once in forest_quantiles
+_CHUNK_CELLS = 4_000_000
+
+
+def build_forest_stats(forest, X_train, y_train):
+    """
+    Flatten a fitted forest and precompute its leaf statistics
+
+    Args:
+        forest: fitted RandomForestRegressor
+        X_train: (scaled) training features the forest was fitted on
+        y_train: training targets
+
+    Returns:
+        dict of arrays, nodes padded to the largest tree:
+            'feature', 'threshold', 'left', 'right': (n_trees, max_nodes) split
+                of every node (feature < 0 marks a leaf)
+            'values': (n_trees, max_nodes) prediction of every node
+            'depth': depth of the deepest tree
+            'leaf_offsets': (n_trees * max_nodes + 1,) start of every node's
+                training samples in leaf_samples (node t * max_nodes + n of
+                tree t), CSR style
+            'leaf_samples': (n_samples * n_trees,) training samples of every
+                leaf, as positions in targets
+            'inv_sizes': (n_trees, max_nodes) 1 / training samples in the leaf
+            'targets': (n_samples,) training targets in ascending order
+    """
+    trees = [estimator.tree_ for estimator in forest.estimators_]
+    n_trees = len(trees)
+    max_nodes = max(tree.node_count for tree in trees)
+
+    stats = {
+        'feature': np.full((n_trees, max_nodes), -1, dtype=np.int32),
+        'threshold': np.zeros((n_trees, max_nodes)),
+        'left': np.zeros((n_trees, max_nodes), dtype=np.int32),
+        'right': np.zeros((n_trees, max_nodes), dtype=np.int32),
+        'values': np.zeros((n_trees, max_nodes)),
+        'depth': max(tree.max_depth for tree in trees),
+    }
+    for t, tree in enumerate(trees):
+        nodes = slice(0, tree.node_count)
+        split = tree.children_left >= 0
+        stats['feature'][t, nodes] = np.where(split, tree.feature, -1)
+        stats['threshold'][t, nodes] = tree.threshold
+        stats['left'][t, nodes] = np.where(split, tree.children_left, 0)
+        stats['right'][t, nodes] = np.where(split, tree.children_right, 0)
+        stats['values'][t, nodes] = tree.value[:, 0, 0]
+
+    y_train = np.asarray(y_train, dtype=float)
+    order = np.argsort(y_train, kind='stable')
+    train_leaves = forest_leaves(stats, np.asarray(X_train)[order])
+
+    # Every training sample (not only the tree's bootstrap sample) counts towards its leaf
+    leaf_ids = (train_leaves + np.arange(n_trees) * max_nodes).ravel()
+    sizes = np.bincount(leaf_ids, minlength=n_trees * max_nodes)
+
+    # Samples grouped by leaf; the stable sort keeps them in target order within a leaf
+    stats['leaf_offsets'] = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    stats['leaf_samples'] = (np.argsort(leaf_ids, kind='stable') // n_trees).astype(np.int32)
+
+    sizes = sizes.reshape(n_trees, max_nodes)
+    stats['inv_sizes'] = np.divide(1.0, sizes, out=np.zeros((n_trees, max_nodes)), where=sizes > 0)
+    stats['targets'] = y_train[order]
+    return stats
+
+
+def forest_leaves(stats, X):
+    """
+    Leaf reached by every row in every tree, descending all trees one level
+    per step (as many steps as the deepest tree, however many trees)
+
+    Args:
+        stats: output of build_forest_stats
+        X: (n_rows, n_features) features, scaled as in training
+
+    Returns:
+        (n_rows, n_trees) int32 array of node indices
+    """
+    # Splits compare float32 features against float64 thresholds, as scikit-learn does
+    X = np.asarray(X, dtype=np.float32)
+    n_trees = stats['feature'].shape[0]
+    trees = np.arange(n_trees)
+    rows = np.arange(len(X))[:, None]
+
+    nodes = np.zeros((len(X), n_trees), dtype=np.int32)
+    for _ in range(stats['depth']):
+        feature = stats['feature'][trees, nodes]
+        is_split = feature >= 0
+        if not is_split.any():
+            break
+        go_left = X[rows, np.maximum(feature, 0)] <= stats['threshold'][trees, nodes]
+        children = np.where(go_left, stats['left'][trees, nodes], stats['right'][trees, nodes])
+        nodes = np.where(is_split, children, nodes)
+
+    return nodes
+
+
+def tree_predictions(stats, leaves):
+    """
+    Prediction of every tree for every row
+
+    Args:
+        stats: output of build_forest_stats
+        leaves: (n_rows, n_trees) output of forest_leaves
+
+    Returns:
+        (n_rows, n_trees) array
+    """
+    return stats['values'][np.arange(leaves.shape[1]), leaves]
+
+
+def forest_quantiles(stats, leaves, quantiles=QUANTILES):
+    """
+    Quantile regression forest: quantiles of the training targets weighted by
+    how often, and in how small a leaf, each training sample shares a leaf
+    with the row
+
+    Args:
+        stats: output of build_forest_stats
+        leaves: (n_rows, n_trees) output of forest_leaves
+        quantiles: quantile levels in [0, 1]
+
+    Returns:
+        (n_rows, len(quantiles)) array of training target values
+    """
+    targets = stats['targets']
+    offsets = stats['leaf_offsets']
+    samples = stats['leaf_samples']
+    n_trees, max_nodes = stats['inv_sizes'].shape
+    n_samples = len(targets)
+    levels = np.asarray(quantiles, dtype=float)
+
+    # Weight of a row's leaf in each tree
+    leaf_weights = stats['inv_sizes'][np.arange(n_trees), leaves] / n_trees
+    leaf_ids = leaves + np.arange(n_trees) * max_nodes
+
+    result = np.empty((len(leaves), len(levels)))
+    chunk = max(1, _CHUNK_CELLS // max(n_samples, 1))
+
+    for start in range(0, len(leaves), chunk):
+        rows = slice(start, start + chunk)
+        n_rows = len(leaf_ids[rows])
+
+        # Only the training samples in each row's leaves: one CSR range per row and tree
+        starts = offsets[leaf_ids[rows]].ravel()
+        sizes = offsets[leaf_ids[rows] + 1].ravel() - starts
+        run_starts = np.cumsum(sizes) - sizes
+        positions = np.arange(sizes.sum()) + np.repeat(starts - run_starts, sizes)
+        row_ids = np.repeat(np.arange(n_rows), sizes.reshape(n_rows, n_trees).sum(axis=1))
+
+        weights = np.bincount(
+            row_ids * n_samples + samples[positions],
+            weights=np.repeat(leaf_weights[rows].ravel(), sizes),
+            minlength=n_rows * n_samples
+        ).reshape(n_rows, n_samples)
+
+        # First target whose cumulative weight reaches the level
+        cumulative = np.cumsum(weights, axis=1)
+        quantile_positions = (cumulative[:, :, None] < levels - 1e-9).sum(axis=1)
+        result[rows] = targets[np.minimum(quantile_positions, n_samples - 1)]
+
+    return result
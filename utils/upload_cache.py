@@ -0,0 +1,191 @@
+"""
+SAS Material Supply Analysis - Upload Cache Module
+Persists parsed uploads as Parquet, keyed by the file's content fingerprint
+"""
+
+import json
+import os
+import re
+import secrets
+
+import pandas as pd
+
+# Parquet support is optional: without pyarrow every upload is parsed from Excel
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Local cache directory (gitignored) and its size bound
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'uploads')
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Bump when the parsed schema in utils/ingest.py changes so stale entries are not loaded
+CACHE_VERSION = 4
+
+# Restore points: fingerprints of the dataset a browser session loaded, one file per
+# session token (the token lives in that session's URL, so no other user can see it)
+SESSIONS_DIR = os.path.join(CACHE_DIR, 'sessions')
+SESSIONS_MAX = 100
+_TOKEN_PATTERN = re.compile(r'[A-Za-z0-9_-]{16,64}')
+
+
+def _cache_suffix():
+    return f".v{CACHE_VERSION}.parquet"
+
+
+def _find_cached_file(fingerprint):
+    """Return (path, file_type) of the cache entry for a fingerprint, or None"""
+    if not os.path.isdir(CACHE_DIR):
+        return None
+
+    suffix = _cache_suffix()
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.startswith(fingerprint + '.') and entry.name.endswith(suffix):
+            file_type = entry.name[len(fingerprint) + 1:-len(suffix)]
+            return entry.path, file_type
+    return None
+
+
+def load_cached_upload(fingerprint):
+    """
+    Load a previously parsed upload from the cache
+
+    Returns:
+        (file_type, DataFrame) or None if the file is not cached
+    """
+    if not PARQUET_AVAILABLE:
+        return None
+
+    found = _find_cached_file(fingerprint)
+    if found is None:
+        return None
+
+    path, file_type = found
+    try:
+        df = pd.read_parquet(path)
+    except Exception:
+        # Corrupt or unreadable entry: drop it and fall back to parsing
+        _remove(path)
+        return None
+
+    # Mark as recently used for LRU eviction
+    os.utime(path)
+    return file_type, df
+
+
+def save_cached_upload(fingerprint, file_type, df):
+    """
+    Persist a parsed upload to the cache, then enforce the size bound
+
+    Caching is best effort: any failure leaves the upload unaffected.
+    """
+    if not PARQUET_AVAILABLE:
+        return
+
+    path = os.path.join(CACHE_DIR, f"{fingerprint}.{file_type}{_cache_suffix()}")
+    tmp_path = path + '.tmp'
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write then rename so readers never see a partial file
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        _remove(tmp_path)
+        return
+
+    evict_cached_uploads()
+
+
+def evict_cached_uploads(max_bytes=CACHE_MAX_BYTES):
+    """Delete least recently used cache entries until the cache fits in max_bytes"""
+    if not os.path.isdir(CACHE_DIR):
+        return
+
+    entries = [entry for entry in os.scandir(CACHE_DIR) if entry.name.endswith('.parquet')]
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+
+    total = 0
+    for entry in entries:
+        total += entry.stat().st_size
+        if total > max_bytes:
+            _remove(entry.path)
+
+
+def new_session_token():
+    """Random, unguessable token identifying one browser session's restore point"""
+    return secrets.token_urlsafe(16)
+
+
+def _session_path(token):
+    """Restore point file of a token, or None if the token is malformed"""
+    if not isinstance(token, str) or not _TOKEN_PATTERN.fullmatch(token):
+        return None
+    return os.path.join(SESSIONS_DIR, f"{token}.json")
+
+
+def save_session(token, fingerprints):
+    """
+    Record the fingerprints of the dataset loaded by a browser session
+    (session key -> fingerprint), keeping the SESSIONS_MAX newest restore points
+    """
+    path = _session_path(token)
+    if not PARQUET_AVAILABLE or path is None:
+        return
+
+    try:
+        os.makedirs(SESSIONS_DIR, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(fingerprints, f)
+
+        entries = sorted(os.scandir(SESSIONS_DIR), key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[SESSIONS_MAX:]:
+            _remove(entry.path)
+    except OSError:
+        pass
+
+
+def find_session(token):
+    """
+    Entries of a session's restore point that are still cached, checked by
+    file name only (nothing is read, the LRU order is left untouched)
+
+    Returns:
+        dict of session key -> fingerprint
+    """
+    path = _session_path(token)
+    if not PARQUET_AVAILABLE or path is None:
+        return {}
+
+    try:
+        with open(path) as f:
+            fingerprints = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return {session_key: fingerprint for session_key, fingerprint in fingerprints.items()
+            if _find_cached_file(fingerprint) is not None}
+
+
+def load_session(token):
+    """
+    Load the dataset of a session's restore point from the cache
+
+    Returns:
+        dict of session key -> (DataFrame, fingerprint) for every entry still cached
+    """
+    restored = {}
+    for session_key, fingerprint in find_session(token).items():
+        cached = load_cached_upload(fingerprint)
+        if cached is not None:
+            restored[session_key] = (cached[1], fingerprint)
+    return restored
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass